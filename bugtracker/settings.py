@@ -129,6 +129,34 @@ LOGIN_URL = "/login"
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 
+# Severity prediction
+# the local classifier is trained with `manage.py train_severity_model`
+SEVERITY_MODEL_PATH = BASE_DIR / "ml_models" / "severity_nb.json"
+# only call the remote predictor when no local model has been trained
+SEVERITY_REMOTE_FALLBACK = False
+# running processes check this often (seconds) for a model saved by another
+# process, e.g. after learning from severity corrections
+SEVERITY_MODEL_RELOAD_INTERVAL = 10
+SEVERITY_PREDICTOR_URL = "http://pratiklondhe4.pythonanywhere.com"
+PREDICTOR_CONNECT_TIMEOUT = 2
+PREDICTOR_READ_TIMEOUT = 5
+PREDICTOR_RETRIES = 2
+# after this many failed calls the remote predictor is skipped (severity
+# falls back to normal) for PREDICTOR_BREAKER_RESET seconds
+PREDICTOR_BREAKER_THRESHOLD = 5
+PREDICTOR_BREAKER_RESET = 30
+# "async" saves new bugs with a pending severity and predicts it in
+# `manage.py prediction_worker`; "sync" predicts inside the request
+SEVERITY_PREDICTION_MODE = "sync"
+PREDICTION_TASK_MAX_ATTEMPTS = 5
+PREDICTION_TASK_BACKOFF = 2
+# predictions are cached per normalized description, in process and in
+# the Django cache; bump the version after changing the remote model
+PREDICTION_CACHE_SIZE = 1024
+PREDICTION_CACHE_TTL = 60 * 60 * 24
+PREDICTION_CACHE_VERSION = 1
+
+
 GRAPH_MODELS = {
     "all_applications": True,
     "graph_models": True,
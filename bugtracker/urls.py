@@ -2,8 +2,6 @@ from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.views import LogoutView, TemplateView
 from django.urls import path
-from django.conf.urls.static import static
-from django.conf import settings
 
 from core.forms import AddBugForm
 from core.views import (
@@ -16,15 +14,23 @@ from core.views import (
     CustomPasswordResetView,
     DeleteBugView,
     DeleteTeamMemberView,
+    ExportBugsView,
     GenericDashboardView,
+    MediaDerivativeView,
+    MediaFileView,
+    MediaLogView,
     TeamMembersListView,
     UpdateBug,
     UpdateTeamMember,
     UserLoginView,
     UserProfileView,
     CustomPasswordResetCompleteView,
+    BugCommentsView,
     BugDetailView,
     ProjectOwnerRegistrationView,
+    ReportDownloadView,
+    ReportStatusView,
+    RequestReportView,
 )
 
 urlpatterns = [
@@ -53,7 +59,29 @@ urlpatterns = [
     ),
     path("dashboard/add_bug/", AddBugView.as_view(), name="add_bug"),
     path("dashboard/bugs/", BugsListView.as_view(), name="bugs_list"),
+    path("dashboard/bugs/export", ExportBugsView.as_view(), name="export_bugs"),
     path("dashboard/bugs/<pk>", BugDetailView.as_view(), name="bug_detail"),
+    path(
+        "dashboard/bugs/<int:pk>/comments",
+        BugCommentsView.as_view(),
+        name="bug_comments",
+    ),
+    path("dashboard/media/<int:pk>", MediaFileView.as_view(), name="media_file"),
+    path("dashboard/media/<int:pk>/log", MediaLogView.as_view(), name="media_log"),
+    path(
+        "dashboard/media/<int:pk>/<str:kind>",
+        MediaDerivativeView.as_view(),
+        name="media_derivative",
+    ),
+    path("dashboard/reports/", RequestReportView.as_view(), name="request_report"),
+    path(
+        "dashboard/reports/<int:pk>", ReportStatusView.as_view(), name="report_status"
+    ),
+    path(
+        "dashboard/reports/<int:pk>/download",
+        ReportDownloadView.as_view(),
+        name="report_download",
+    ),
     path("dashboard/update_bug/<pk>", UpdateBug.as_view(), name="update_bug"),
     path("dashboard/delete_bug/<pk>", DeleteBugView.as_view(), name="delete_bug"),
     path(
@@ -78,4 +106,4 @@ urlpatterns = [
         CustomPasswordResetCompleteView.as_view(),
         name="password_reset_complete",
     ),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
@@ -1,9 +1,20 @@
 from django.contrib import admin
 
-from core.models import Bug, Project, User, BugMedia
+from core.models import (
+    Bug,
+    BugMedia,
+    BugReport,
+    PredictionTask,
+    Project,
+    SeverityCorrection,
+    User,
+)
 
 # Register your models here.
 admin.sites.site.register(Project)
 admin.sites.site.register(User)
 admin.sites.site.register(Bug)
 admin.sites.site.register(BugMedia)
+admin.sites.site.register(PredictionTask)
+admin.sites.site.register(SeverityCorrection)
+admin.sites.site.register(BugReport)
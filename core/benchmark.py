@@ -0,0 +1,32 @@
+import json
+import math
+import os
+
+# helpers shared by the benchmark_* management commands
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low, high = math.floor(k), math.ceil(k)
+    if low == high:
+        return values[int(k)]
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def latency_summary(latencies):
+    """Latencies in seconds -> p50/p95/p99/max in milliseconds."""
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0) * 1000,
+    }
+
+
+def write_results(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=str)
@@ -0,0 +1,167 @@
+import json
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+
+# local replacement for the remote "nb" model: multinomial naive bayes over
+# sublinear term frequencies, with idf weighting applied when scoring
+
+TOKEN_RE = re.compile(r"[a-z0-9_]{2,}")
+
+LABELS = ["minor", "normal", "major", "critical", "blocker"]
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def term_weights(text):
+    return {t: 1.0 + math.log(n) for t, n in Counter(tokenize(text)).items()}
+
+
+class NaiveBayesModel:
+    def __init__(self, labels=None, alpha=1.0, version=0):
+        self.labels = list(labels or LABELS)
+        self.alpha = alpha
+        self.version = version
+        self.n_docs = 0
+        self.class_docs = {c: 0 for c in self.labels}
+        self.class_totals = {c: 0.0 for c in self.labels}
+        self.feature_counts = {c: {} for c in self.labels}
+        self.doc_freq = {}
+        self._table = None
+
+    def fit(self, texts, labels):
+        self.partial_fit(texts, labels)
+        return self
+
+    def partial_fit(self, texts, labels):
+        touched = set()
+        for text, label in zip(texts, labels):
+            label = (label or "").lower()
+            if label not in self.class_docs:
+                continue
+            weights = term_weights(text)
+            self.n_docs += 1
+            self.class_docs[label] += 1
+            counts = self.feature_counts[label]
+            for token, weight in weights.items():
+                counts[token] = counts.get(token, 0.0) + weight
+                self.class_totals[label] += weight
+                self.doc_freq[token] = self.doc_freq.get(token, 0) + 1
+            touched.update(weights)
+        if self._table is not None:
+            # only the rows of the tokens seen here change, everything else
+            # is folded into the per-class scalars
+            for token in touched:
+                self._table[token] = self._token_row(token)
+            self._refresh_scalars()
+        return self
+
+    def copy(self):
+        model = NaiveBayesModel(self.labels, self.alpha, self.version)
+        model.n_docs = self.n_docs
+        model.class_docs = dict(self.class_docs)
+        model.class_totals = dict(self.class_totals)
+        model.feature_counts = {c: dict(f) for c, f in self.feature_counts.items()}
+        model.doc_freq = dict(self.doc_freq)
+        if self._table is not None:
+            model._table = dict(self._table)
+            model._refresh_scalars()
+        return model
+
+    def _token_row(self, token):
+        # idf is log(1 + n_docs) - log(1 + df) + 1, so only the df part is
+        # stored per token
+        return (
+            math.log(1 + self.doc_freq[token]),
+            tuple(
+                math.log(self.feature_counts[c].get(token, 0.0) + self.alpha)
+                for c in self.labels
+            ),
+        )
+
+    def _refresh_scalars(self):
+        vocab_size = max(len(self.doc_freq), 1)
+        total_docs = sum(self.class_docs.values())
+        self._log_n = math.log(1 + self.n_docs)
+        self._denominators = [
+            math.log(self.class_totals[c] + self.alpha * vocab_size)
+            for c in self.labels
+        ]
+        self._priors = [
+            math.log((self.class_docs[c] + 1) / (total_docs + len(self.labels)))
+            for c in self.labels
+        ]
+
+    def _build_table(self):
+        # precompute one row of per-class log counts per token so that scoring
+        # a description is a dict lookup and a few adds per token
+        self._table = {token: self._token_row(token) for token in self.doc_freq}
+        self._refresh_scalars()
+        return self._table
+
+    def scores(self, text):
+        table = self._table if self._table is not None else self._build_table()
+        scores = [0.0] * len(self.labels)
+        total_weight = 0.0
+        for token, weight in term_weights(text).items():
+            entry = table.get(token)
+            if entry is None:
+                continue
+            log_df, row = entry
+            weight *= self._log_n - log_df + 1.0
+            total_weight += weight
+            for i, log_count in enumerate(row):
+                scores[i] += weight * log_count
+        return [
+            prior + score - total_weight * denominator
+            for prior, score, denominator in zip(
+                self._priors, scores, self._denominators
+            )
+        ]
+
+    def predict(self, text):
+        scores = self.scores(text)
+        return self.labels[scores.index(max(scores))]
+
+    def predict_many(self, texts):
+        return [self.predict(text) for text in texts]
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "labels": self.labels,
+            "alpha": self.alpha,
+            "n_docs": self.n_docs,
+            "class_docs": self.class_docs,
+            "class_totals": self.class_totals,
+            "feature_counts": self.feature_counts,
+            "doc_freq": self.doc_freq,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["labels"], data["alpha"], data["version"])
+        model.n_docs = data["n_docs"]
+        model.class_docs = data["class_docs"]
+        model.class_totals = data["class_totals"]
+        model.feature_counts = data["feature_counts"]
+        model.doc_freq = data["doc_freq"]
+        return model
+
+    def save(self, path):
+        path = os.fspath(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # write to a temp file and rename so readers never see half a model
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import PRIORITY_CHOICES, SEVERITY_CHOICES, Bug, User
+from .stats import project_counts
+from .versions import get_versions, scope_version_names
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+
+def dashboard_versions(user):
+    # the stamps bumped by signals whenever something this scope counts changes
+    return scope_version_names(user)
+
+
+def compute_dashboard_stats(user):
+    if user.is_superuser or user.role == "O":
+        counts = project_counts(None if user.is_superuser else user.assigned_to_id)
+        stats = {"bug_count": counts[("total", "")]}
+        for severity, _ in SEVERITY_CHOICES:
+            stats[f"severity_{severity}"] = counts[("severity", severity)]
+        for priority, _ in PRIORITY_CHOICES:
+            stats[f"priority_{priority}"] = counts[("priority", priority)]
+    else:
+        # a team member only sees their own bugs, which have no counters:
+        # compute every number in one conditional aggregation instead
+        aggregates = {"bug_count": Count("id")}
+        for severity, _ in SEVERITY_CHOICES:
+            aggregates[f"severity_{severity}"] = Count(
+                "id", filter=Q(severity=severity)
+            )
+        for priority, _ in PRIORITY_CHOICES:
+            aggregates[f"priority_{priority}"] = Count(
+                "id", filter=Q(priority=priority)
+            )
+        stats = Bug.objects.for_user(user).aggregate(**aggregates)
+    stats["tm_count"] = User.objects.for_user(user).count()
+    return stats
+
+
+def get_dashboard_stats(user):
+    names = dashboard_versions(user)
+    versions = get_versions(names)
+    key = "dashboard:" + ":".join(f"{n}={v}" for n, v in zip(names, versions))
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(user)
+        cache.set(key, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,158 @@
+from collections import Counter
+
+from django.db.models import Count, Q
+
+from .models import BUG_STATUS_CHOICES, PRIORITY_CHOICES, SEVERITY_CHOICES, User
+from .search import search
+from .stats import DIMENSIONS
+
+# The query parameters that narrow down the bug list. Every view showing or
+# exporting "the bugs on the list" goes through filter_bugs, so they agree.
+
+# facet parameter -> Bug field; the same dimensions ProjectStats counts
+FACETS = DIMENSIONS
+FACET_LABELS = {
+    "status": "Status",
+    "priority": "Priority",
+    "severity": "Severity",
+    "assignee": "Assigned to",
+}
+FACET_CHOICES = {
+    "status": BUG_STATUS_CHOICES,
+    "priority": PRIORITY_CHOICES,
+    "severity": SEVERITY_CHOICES,
+}
+# the facet value standing for an empty field
+NONE = "none"
+NONE_LABELS = {"severity": "PENDING", "assignee": "Unassigned"}
+
+FILTER_PARAMS = ["search"] + list(FACETS)
+
+
+def _values(params, name):
+    if hasattr(params, "getlist"):
+        values = params.getlist(name)
+    else:
+        values = params.get(name) or []
+        if isinstance(values, str):
+            values = [values]
+    values = {value for value in values if value}
+    if name == "assignee":
+        values = {value for value in values if value == NONE or value.isdigit()}
+    return sorted(values)
+
+
+def filter_params(params):
+    """The filter parameters set in `params`, as a plain dict."""
+    filters = {}
+    if params.get("search"):
+        filters["search"] = params.get("search")
+    for name in FACETS:
+        values = _values(params, name)
+        if values:
+            filters[name] = values
+    return filters
+
+
+def is_searching(params):
+    return bool(params.get("search"))
+
+
+def facet_condition(name, values):
+    field = FACETS[name]
+    condition = Q(**{f"{field}__in": [value for value in values if value != NONE]})
+    if NONE in values:
+        condition |= Q(**{f"{field}__isnull": True})
+    return condition
+
+
+def filter_bugs(bugs, params):
+    """Narrow `bugs`, already scoped with for_user, by the list view's filters."""
+    filters = filter_params(params)
+    for name in FACETS:
+        if name in filters:
+            bugs = bugs.filter(facet_condition(name, filters[name]))
+    if "search" in filters:
+        bugs = search(bugs, filters["search"])
+    return bugs
+
+
+def _key(value):
+    return NONE if value is None else str(value)
+
+
+def grouped_counts(bugs):
+    """{(status, priority, severity, assignee): n} from one GROUP BY query."""
+    fields = list(FACETS.values())
+    rows = bugs.order_by().values(*fields).annotate(n=Count("id"))
+    return {tuple(_key(row[field]) for field in fields): row["n"] for row in rows}
+
+
+def facet_counts(bugs, params, counts=None):
+    """Counts for every facet value, plus the total of bugs on the list.
+
+    A facet is counted with the filters of the other facets applied but not
+    its own, so the counts say what choosing another value would give.
+    `counts` can be the ProjectStats counters of the scope when nothing is
+    filtered; otherwise the bugs are grouped by all facets in one query and
+    the counts are added up from the groups.
+    """
+    filters = filter_params(params)
+    names = list(FACETS)
+    result = {name: Counter() for name in names}
+    if counts is not None and not filters:
+        for (dimension, value), n in counts.items():
+            if dimension in result and n:
+                result[dimension][value or NONE] += n
+        return result, counts[("total", "")]
+
+    selected = {name: set(filters.get(name, [])) for name in names}
+    if "search" in filters:
+        bugs = search(bugs, filters["search"])
+    total = 0
+    for key, n in grouped_counts(bugs).items():
+        matches = {
+            name: not selected[name] or key[i] in selected[name]
+            for i, name in enumerate(names)
+        }
+        if all(matches.values()):
+            total += n
+        for i, name in enumerate(names):
+            if all(match for other, match in matches.items() if other != name):
+                result[name][key[i]] += n
+    return result, total
+
+
+def facet_options(facets, params):
+    """The facets as template-friendly lists of options."""
+    filters = filter_params(params)
+    assignees = dict(
+        User.objects.filter(
+            pk__in=[value for value in facets["assignee"] if value != NONE]
+        ).values_list("id", "username")
+    )
+    options = []
+    for name, counts in facets.items():
+        if name == "assignee":
+            labels = {str(pk): username for pk, username in assignees.items()}
+        else:
+            labels = dict(FACET_CHOICES[name])
+        labels[NONE] = NONE_LABELS.get(name, "None")
+        selected = set(filters.get(name, []))
+        values = [value for value in labels if value in counts or value in selected]
+        options.append(
+            {
+                "name": name,
+                "label": FACET_LABELS[name],
+                "options": [
+                    {
+                        "value": value,
+                        "label": labels[value],
+                        "count": counts[value],
+                        "selected": value in selected,
+                    }
+                    for value in values
+                ],
+            }
+        )
+    return options
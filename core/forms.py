@@ -2,7 +2,11 @@ from turtle import width
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django import forms
 from .models import Bug, Project, User, Comments, SEVERITY_CHOICES, SEVERITY_MAP
-from .prediction import get_severity
+from .prediction import get_severity, record_correction
+from . import thumbnails
+from .tasks import async_prediction_enabled, enqueue_prediction
+from .uploads import SNIFF_BYTES, max_file_size, size_error, type_error
+from .versions import bug_detail_version_name, bump_versions
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.forms import ModelMultipleChoiceField, ValidationError
@@ -174,32 +178,46 @@ class AddBugForm(forms.ModelForm):
             self.fields["assigned_to"].widget.attrs["class"] = "disabled"
 
     def clean(self):
-        allowed_extensions = ["jpg", "jpeg", "png", "gif", "bmp", "log"]
         cleaned_data = super().clean()
+        # uploads through AddBugView were checked while streaming already;
+        # this covers files handed to the form any other way
         files = self.files.getlist("files")
         for f in files:
-            extension = f.name.split(".")[-1].lower()
-            if extension not in allowed_extensions:
-                raise ValidationError(
-                    f"File type not supported. Allowed types: {', '.join(allowed_extensions)}"
-                )
+            if f.size > max_file_size():
+                raise ValidationError(size_error(f.name, max_file_size()))
+            head = f.read(SNIFF_BYTES)
+            f.seek(0)
+            error = type_error(f.name, head)
+            if error:
+                raise ValidationError(error)
 
         return cleaned_data
 
     def save(self, commit=True):
         instance = super().save(commit=False)
-        if(instance.is_predicted):
+        predict_later = instance.is_predicted and async_prediction_enabled()
+        if predict_later:
+            # severity stays empty (shown as pending) until a worker fills it in
+            instance.severity = None
+        elif(instance.is_predicted):
             instance.severity = SEVERITY_MAP.get(get_severity(instance.description))
-            print(SEVERITY_MAP.get(get_severity(instance.description)))
         else:
             instance.severity = SEVERITY_MAP.get("normal")
         if commit:
             instance.save()
+            if predict_later:
+                enqueue_prediction(instance)
 
-        # link uploaded files to this Bug instance
+        # link uploaded files to this Bug instance; the content is stored
+        # (once per distinct file) first, then the rows in one query
         files = self.files.getlist("files")
-        for f in files:
-            BugMedia.objects.create(bug=instance, file=f)
+        media = BugMedia.objects.bulk_create(
+            BugMedia.for_upload(instance, f) for f in files
+        )
+        if media:
+            # bulk_create sends no signals
+            bump_versions([bug_detail_version_name(instance.pk)])
+            thumbnails.schedule(media)
 
         return instance
     
@@ -219,6 +237,7 @@ class UpdateBugForm(forms.ModelForm):
 
     def __init__(self, user, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.user = user
         self.fields["assigned_to"].queryset = User.objects.filter(role="TM")
         self.fields["severity"].queryset = SEVERITY_CHOICES
         self.fields["severity"].initial = self.instance.severity
@@ -227,6 +246,23 @@ class UpdateBugForm(forms.ModelForm):
         if not user.is_project_owner:
             del self.fields["assigned_to"]
 
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        # a project owner overriding the severity is a labeled example for
+        # the local model
+        corrected = (
+            "severity" in self.changed_data
+            and self.user.is_project_owner
+            and instance.severity
+        )
+        if corrected:
+            instance.is_predicted = False
+        if commit:
+            instance.save()
+            if corrected:
+                record_correction(instance, self.initial.get("severity"), self.user)
+        return instance
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Bug
+
+# Rendered rows of the bug list, cached per bug. A row is stored under the
+# bug's row_version, which Bug.save bumps, so an edited bug is rendered again
+# and its old row simply expires.
+ROW_TEMPLATE = "bug_row.html"
+ROW_CACHE_TIMEOUT = 60 * 60 * 24
+# bump when bug_row.html changes, so rows rendered by the old one are not used
+ROW_CACHE_VERSION = 2
+# what bug_row.html renders; {{f.assigned_to}} shows the username
+ROW_FIELDS = [
+    "id",
+    "row_version",
+    "title",
+    "added_date",
+    "description_excerpt",
+    "priority",
+    "status",
+    "severity",
+    "assigned_to__username",
+]
+
+
+def row_key(bug_id, row_version):
+    return f"bugrow:{bug_id}:{row_version}"
+
+
+def render_row(bug):
+    return render_to_string(ROW_TEMPLATE, {"f": bug})
+
+
+def bug_rows(bugs):
+    """The rendered rows of `bugs`, which only need id and row_version loaded.
+
+    Cached rows come from one get_many; the missing ones are loaded in one
+    query, rendered and cached.
+    """
+    bugs = list(bugs)
+    keys = {bug.pk: row_key(bug.pk, bug.row_version) for bug in bugs}
+    found = cache.get_many(list(keys.values()), version=ROW_CACHE_VERSION)
+    rows = {pk: found[key] for pk, key in keys.items() if key in found}
+
+    missing = [pk for pk in keys if pk not in rows]
+    if missing:
+        rendered = {}
+        fresh = (
+            Bug.objects.filter(pk__in=missing)
+            .select_related("assigned_to")
+            .only(*ROW_FIELDS)
+        )
+        for bug in fresh:
+            # stored under the version just read, which may be newer than
+            # the one on the list if the bug was saved in between
+            rows[bug.pk] = rendered[row_key(bug.pk, bug.row_version)] = render_row(bug)
+        cache.set_many(rendered, ROW_CACHE_TIMEOUT, version=ROW_CACHE_VERSION)
+    # a bug deleted since the list was read has no row
+    return [mark_safe(rows[bug.pk]) for bug in bugs if bug.pk in rows]
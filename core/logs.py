@@ -0,0 +1,192 @@
+import bisect
+import json
+import mmap
+import os
+import zlib
+
+# Log attachments are stored gzip compressed as a series of independent
+# blocks, each a complete gzip member holding whole lines. Concatenated
+# members are still a valid .gz file, so the stored file can be downloaded
+# and gunzipped as is. A sidecar index records where each block starts and
+# which lines it holds, so a range of lines is read by decompressing only the
+# blocks that hold it. Logs stored before compression are read through mmap.
+
+# uncompressed bytes per block; a longer line makes a longer block
+BLOCK_SIZE = 256 * 1024
+COMPRESS_LEVEL = 6
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+# gzip header and trailer, for zlib
+GZIP_WBITS = 31
+
+
+def index_name(name):
+    return name + INDEX_SUFFIX
+
+
+def is_compressed(name):
+    return name.endswith(".gz")
+
+
+def split_lines(data):
+    """The lines of `data` with their ends; unlike splitlines, a lone CR is kept."""
+    lines = data.split(b"\n")
+    for line in lines[:-1]:
+        yield line + b"\n"
+    if lines[-1]:
+        yield lines[-1]
+
+
+def count_lines(data):
+    lines = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        lines += 1
+    return lines
+
+
+class BlockWriter:
+    """Write data to `f` as gzip blocks of whole lines, recording the index."""
+
+    def __init__(self, f, block_size=None):
+        self.f = f
+        self.block_size = block_size or BLOCK_SIZE
+        self.buffer = bytearray()
+        self.offset = 0
+        self.lines = 0
+        # [offset, compressed length, first line, line count], lines from 1
+        self.blocks = []
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            end = self.buffer.rfind(b"\n", 0, self.block_size)
+            if end == -1:
+                # one line longer than a block: take it whole
+                end = self.buffer.find(b"\n", self.block_size)
+                if end == -1:
+                    return
+            self.write_block(bytes(self.buffer[: end + 1]))
+            del self.buffer[: end + 1]
+
+    def close(self):
+        if self.buffer:
+            self.write_block(bytes(self.buffer))
+            self.buffer.clear()
+        return self.index()
+
+    def write_block(self, data):
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+        block = compressor.compress(data) + compressor.flush()
+        self.f.write(block)
+        lines = count_lines(data)
+        self.blocks.append([self.offset, len(block), self.lines + 1, lines])
+        self.offset += len(block)
+        self.lines += lines
+
+    def index(self):
+        return {"version": INDEX_VERSION, "lines": self.lines, "blocks": self.blocks}
+
+
+def build_index(f, chunk_size=1024 * 1024):
+    """The index of a block compressed file, found by reading all of it."""
+    writer = BlockWriter(None)
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    block_start = position = newlines = 0
+    last = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return writer.index()
+        while chunk:
+            data = decompressor.decompress(chunk)
+            newlines += data.count(b"\n")
+            last = data[-1:] or last
+            if not decompressor.eof:
+                position += len(chunk)
+                break
+            # the end of a block; the rest of the chunk starts the next one
+            position += len(chunk) - len(decompressor.unused_data)
+            lines = newlines + (1 if last not in (b"", b"\n") else 0)
+            writer.blocks.append(
+                [block_start, position - block_start, writer.lines + 1, lines]
+            )
+            writer.lines += lines
+            block_start, newlines, last = position, 0, b""
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+
+
+def load_index(storage, name):
+    """The block index of the stored log `name`, rebuilt if it is missing."""
+    try:
+        with storage.open(index_name(name), "rb") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    with storage.open(name, "rb") as f:
+        index = build_index(f)
+    write_index(storage.path(name), index)
+    return index
+
+
+def write_index(path, index):
+    temp_path = index_name(path) + ".part"
+    with open(temp_path, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(temp_path, index_name(path))
+
+
+def compressed_lines(storage, name, start=1):
+    """The lines of the stored log `name` from line `start`, with numbers."""
+    index = load_index(storage, name)
+    blocks = index["blocks"]
+    first = max(bisect.bisect_right([b[2] for b in blocks], start) - 1, 0)
+    with storage.open(name, "rb") as f:
+        for offset, length, first_line, _ in blocks[first:]:
+            f.seek(offset)
+            data = zlib.decompress(f.read(length), GZIP_WBITS)
+            for number, line in enumerate(split_lines(data), first_line):
+                if number >= start:
+                    yield number, line
+
+
+def plain_lines(storage, name, start=1):
+    """The lines of a log stored uncompressed, read through mmap."""
+    with storage.open(name, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for number, line in enumerate(iter(mapped.readline, b""), 1):
+                if number >= start:
+                    yield number, line
+
+
+def log_lines(storage, name, start=1):
+    if is_compressed(name):
+        return compressed_lines(storage, name, start)
+    return plain_lines(storage, name, start)
+
+
+def line_range(storage, name, start, count):
+    """Up to `count` lines of a stored log from line `start`."""
+    for number, line in log_lines(storage, name, start):
+        if number >= start + count:
+            break
+        yield number, line
+
+
+def grep(storage, name, pattern, start=1, limit=1000):
+    """The lines from `start` containing `pattern`, at most `limit` of them.
+
+    The lines are read block by block, and reading stops at the limit, so
+    later matches are found by calling again from after the last one.
+    """
+    found = 0
+    for number, line in log_lines(storage, name, start):
+        if pattern in line:
+            yield number, line
+            found += 1
+            if found >= limit:
+                break
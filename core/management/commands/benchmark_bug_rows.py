@@ -0,0 +1,128 @@
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import fragments
+from core.benchmark import latency_summary, write_results
+from core.models import Bug, Project, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long the rows of a bug list page take to render, without "
+        "the row cache and with a cold and a warm one. Generated bugs are "
+        "created in a transaction that is rolled back at the end"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", default="10,50,100", help="comma separated page sizes"
+        )
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument(
+            "--description-words",
+            type=int,
+            default=200,
+            help="length of the generated descriptions",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["rows"].split(","))
+        rng = random.Random(options["seed"])
+        results = {
+            "created": timezone.now(),
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "rows": {},
+        }
+
+        with transaction.atomic():
+            project = Project.objects.create(name="row cache benchmark")
+            member = User.objects.create(
+                username=f"row-benchmark-{rng.random()}",
+                email="row-benchmark@example.com",
+                role="TM",
+                assigned_to=project,
+            )
+            self.generate(
+                project, member, sizes[-1], options["description_words"], rng
+            )
+            page = Bug.objects.filter(project=project).order_by("-added_date", "-id")
+
+            for size in sizes:
+                # a new queryset on every run, so the page query is measured too
+                def bugs():
+                    return page.only("id", "row_version", "added_date")[:size]
+
+                keys = [fragments.row_key(bug.pk, bug.row_version) for bug in bugs()]
+                result = {
+                    "uncached": self.measure(
+                        lambda: [
+                            fragments.render_row(bug)
+                            for bug in page.select_related("assigned_to").only(
+                                *fragments.ROW_FIELDS
+                            )[:size]
+                        ],
+                        options["repeat"],
+                    ),
+                    "cold": self.measure(
+                        lambda: fragments.bug_rows(bugs()),
+                        options["repeat"],
+                        before=lambda: cache.delete_many(keys),
+                    ),
+                    "warm": self.measure(
+                        lambda: fragments.bug_rows(bugs()), options["repeat"]
+                    ),
+                }
+                cache.delete_many(keys)
+                results["rows"][size] = result
+                self.report(size, result)
+            transaction.set_rollback(True)
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"bug-rows-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def generate(self, project, member, count, description_words, rng):
+        words = ["crash", "login", "page", "button", "error", "slow", "report"]
+        Bug.objects.bulk_create(
+            Bug(
+                title=f"Generated bug {i}",
+                description=" ".join(rng.choices(words, k=description_words)),
+                project=project,
+                priority="LOW",
+                severity="NORMAL",
+                status="NEW",
+                assigned_to=member,
+            )
+            for i in range(count)
+        )
+
+    def measure(self, run, repeat, before=None):
+        latencies = []
+        for _ in range(repeat + 1):
+            if before is not None:
+                before()
+            t = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - t)
+        # the first run warms up the templates and the connection
+        return latency_summary(latencies[1:])
+
+    def report(self, size, result):
+        line = ", ".join(
+            f"{name} p50 {latency['p50_ms']:.2f}ms p95 {latency['p95_ms']:.2f}ms"
+            for name, latency in result.items()
+        )
+        self.stdout.write(f"{size} rows: {line}")
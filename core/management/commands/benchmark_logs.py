@@ -0,0 +1,147 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import logs
+from core.benchmark import latency_summary, write_results
+from core.storage import ContentAddressedStorage
+
+LEVELS = ["DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR"]
+WORDS = ["request", "user", "session", "cache", "query", "timeout", "retry", "ok"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Store a synthetic log raw and block compressed in a temporary "
+        "directory and compare disk usage, the time to read a range of lines "
+        "by loading the whole file, through mmap and through the block index, "
+        "and the time to grep it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=200, help="log size in MB")
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--lines", type=int, default=500, help="lines per range")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        root = tempfile.mkdtemp()
+        try:
+            upload, line_count = self.generate(rng, options["size"] * 1000 * 1000)
+            t = time.perf_counter()
+            raw_name = FileSystemStorage(location=root).save("raw/app.log", upload)
+            raw_seconds = time.perf_counter() - t
+            storage = ContentAddressedStorage(location=root)
+            t = time.perf_counter()
+            compressed_name = storage.save("media/app.log", upload)
+            compressed_seconds = time.perf_counter() - t
+            upload.close()
+
+            results = {
+                "created": timezone.now(),
+                "size": options["size"],
+                "lines": line_count,
+                "range_lines": options["lines"],
+                "disk_bytes": {
+                    "raw": os.path.getsize(storage.path(raw_name)),
+                    "compressed": os.path.getsize(storage.path(compressed_name))
+                    + os.path.getsize(storage.path(logs.index_name(compressed_name))),
+                },
+                "store_seconds": {
+                    "raw": raw_seconds,
+                    "compressed": compressed_seconds,
+                },
+            }
+            starts = [
+                rng.randint(1, max(line_count - options["lines"], 1))
+                for _ in range(options["requests"])
+            ]
+            results["line_range"] = {
+                "whole_file": self.time_ranges(
+                    starts,
+                    options["lines"],
+                    lambda start, count: self.whole_file(
+                        storage.path(raw_name), start, count
+                    ),
+                ),
+                "mmap": self.time_ranges(
+                    starts,
+                    options["lines"],
+                    lambda start, count: list(
+                        logs.line_range(storage, raw_name, start, count)
+                    ),
+                ),
+                "block_index": self.time_ranges(
+                    starts,
+                    options["lines"],
+                    lambda start, count: list(
+                        logs.line_range(storage, compressed_name, start, count)
+                    ),
+                ),
+            }
+            results["grep_seconds"] = {}
+            for name, stored in [("mmap", raw_name), ("block_index", compressed_name)]:
+                t = time.perf_counter()
+                list(logs.grep(storage, stored, b"ERROR timeout", limit=line_count))
+                results["grep_seconds"][name] = time.perf_counter() - t
+        finally:
+            shutil.rmtree(root)
+
+        disk = results["disk_bytes"]
+        self.stdout.write(
+            f"{line_count} lines, {disk['raw'] / 1e6:.1f} MB raw, "
+            f"{disk['compressed'] / 1e6:.1f} MB compressed"
+        )
+        for name, latency in results["line_range"].items():
+            self.stdout.write(
+                f"line range, {name}: p50 {latency['p50_ms']:.1f} ms, "
+                f"p95 {latency['p95_ms']:.1f} ms"
+            )
+        for name, seconds in results["grep_seconds"].items():
+            self.stdout.write(f"grep, {name}: {seconds:.2f} s")
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"logs-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def generate(self, rng, size):
+        upload = TemporaryUploadedFile("app.log", "text/plain", size, None)
+        written = lines = 0
+        while written < size:
+            line = (
+                f"2023-05-01 12:{lines // 60 % 60:02d}:{lines % 60:02d} "
+                f"{rng.choice(LEVELS)} {' '.join(rng.choices(WORDS, k=8))} "
+                f"id={rng.randrange(10**6)}\n"
+            ).encode()
+            upload.write(line)
+            written += len(line)
+            lines += 1
+        upload.seek(0)
+        return upload, lines
+
+    def whole_file(self, path, start, count):
+        # what serving the raw attachment amounts to
+        with open(path, "rb") as f:
+            return f.read().split(b"\n")[start - 1 : start - 1 + count]
+
+    def time_ranges(self, starts, count, read):
+        latencies = []
+        for start in starts:
+            t = time.perf_counter()
+            read(start, count)
+            latencies.append(time.perf_counter() - t)
+        return latency_summary(latencies)
@@ -0,0 +1,97 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.benchmark import write_results
+from core.storage import ContentAddressedStorage
+
+
+def disk_usage(root):
+    total = 0
+    files = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(directory, filename))
+            files += 1
+    return total, files
+
+
+class Command(BaseCommand):
+    help = (
+        "Store a synthetic corpus of attachments with heavy duplication in "
+        "temporary directories, one file per upload and content-addressed, "
+        "and compare disk usage and upload throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--uploads", type=int, default=1000)
+        parser.add_argument(
+            "--distinct", type=int, default=50, help="distinct files in the corpus"
+        )
+        parser.add_argument(
+            "--size", type=int, default=256 * 1024, help="bytes per file"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        blobs = [
+            (f"shot{i}.png", rng.randbytes(options["size"]))
+            for i in range(options["distinct"])
+        ]
+        # a few files are attached far more often than the rest
+        weights = [1 / (i + 1) for i in range(len(blobs))]
+        uploads = rng.choices(blobs, weights=weights, k=options["uploads"])
+
+        results = {
+            "created": timezone.now(),
+            "uploads": options["uploads"],
+            "distinct": options["distinct"],
+            "size": options["size"],
+            "storages": {},
+        }
+        for name, storage_class in [
+            ("one_file_per_upload", FileSystemStorage),
+            ("content_addressed", ContentAddressedStorage),
+        ]:
+            root = tempfile.mkdtemp()
+            try:
+                storage = storage_class(location=root)
+                t = time.perf_counter()
+                for filename, data in uploads:
+                    storage.save(f"media/{filename}", SimpleUploadedFile(filename, data))
+                elapsed = time.perf_counter() - t
+                used, files = disk_usage(root)
+            finally:
+                shutil.rmtree(root)
+            uploaded = len(uploads) * options["size"]
+            result = {
+                "seconds": elapsed,
+                "uploads_per_second": len(uploads) / elapsed,
+                "mb_per_second": uploaded / elapsed / 1e6,
+                "files": files,
+                "disk_bytes": used,
+            }
+            results["storages"][name] = result
+            self.stdout.write(
+                f"{name}: {result['uploads_per_second']:.0f} uploads/s, "
+                f"{result['mb_per_second']:.1f} MB/s, {files} files, "
+                f"{used / 1e6:.1f} MB on disk"
+            )
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"media-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
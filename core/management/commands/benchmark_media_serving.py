@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from django.views.static import serve
+
+from core import serving
+from core.benchmark import latency_summary, write_results
+
+
+def consume(response):
+    """Send a response the way a WSGI server without sendfile() would."""
+    sent = 0
+    for chunk in response:
+        sent += len(chunk)
+    response.close()
+    return sent
+
+
+def consume_with_sendfile(response, sink):
+    """Send a file response the way gunicorn's wsgi.file_wrapper does."""
+    f = response.file_to_stream
+    offset = os.lseek(f.fileno(), 0, os.SEEK_CUR)
+    remaining = int(response["Content-Length"])
+    while remaining:
+        sent = os.sendfile(sink, f.fileno(), offset, remaining)
+        if not sent:
+            break
+        offset += sent
+        remaining -= sent
+    response.close()
+    return int(response["Content-Length"]) - remaining
+
+
+class Command(BaseCommand):
+    help = (
+        "Download a large file from a temporary directory the way the static() "
+        "view did and through the protected media view in each MEDIA_SERVER "
+        "mode, and compare the wall and CPU time a worker spends per download"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=256, help="file size in MB")
+        parser.add_argument("--downloads", type=int, default=5)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        root = tempfile.mkdtemp()
+        sink = os.open(os.devnull, os.O_WRONLY)
+        try:
+            storage = FileSystemStorage(location=root)
+            name = "media/large.log"
+            os.makedirs(os.path.join(root, "media"))
+            with open(storage.path(name), "wb") as f:
+                chunk = os.urandom(1024 * 1024)
+                for _ in range(options["size"]):
+                    f.write(chunk)
+
+            factory = RequestFactory()
+            request = factory.get("/")
+            ranged = factory.get("/", HTTP_RANGE="bytes=0-1048575")
+
+            def protected(mode, request=request):
+                with override_settings(MEDIA_SERVER=mode):
+                    return serving.serve_file(request, storage, name)
+
+            runs = {
+                "static_serve": lambda: consume(serve(request, name, root)),
+                "django": lambda: consume(protected("django")),
+                "django_sendfile": lambda: consume_with_sendfile(
+                    protected("django"), sink
+                ),
+                "django_range_1mb": lambda: consume(protected("django", ranged)),
+                "x-accel-redirect": lambda: consume(protected("x-accel-redirect")),
+                "x-sendfile": lambda: consume(protected("x-sendfile")),
+            }
+            results = {
+                "created": timezone.now(),
+                "size": options["size"],
+                "downloads": options["downloads"],
+                "modes": {},
+            }
+            for mode, download in runs.items():
+                results["modes"][mode] = self.measure(download, options["downloads"])
+        finally:
+            os.close(sink)
+            shutil.rmtree(root)
+
+        for mode, result in results["modes"].items():
+            self.stdout.write(
+                f"{mode}: {result['wall']['p50_ms']:.1f} ms wall, "
+                f"{result['cpu']['p50_ms']:.1f} ms CPU, "
+                f"{result['bytes_sent'] / 1e6:.1f} MB sent by the worker"
+            )
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"media-serving-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def measure(self, download, downloads):
+        wall, cpu = [], []
+        for _ in range(downloads):
+            t, c = time.perf_counter(), time.process_time()
+            sent = download()
+            wall.append(time.perf_counter() - t)
+            cpu.append(time.process_time() - c)
+        return {
+            "wall": latency_summary(wall),
+            "cpu": latency_summary(cpu),
+            "bytes_sent": sent,
+        }
@@ -0,0 +1,185 @@
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import prediction
+from core.benchmark import latency_summary, write_results
+from core.classifier import NaiveBayesModel
+from core.models import SEVERITY_CHOICES, SEVERITY_MAP, Bug
+
+LABELS = [choice[0] for choice in SEVERITY_CHOICES]
+
+# phrases used to give generated bug reports a learnable severity signal
+SEVERITY_PHRASES = {
+    "MINOR": ["typo in the label", "icon slightly misaligned", "wrong font color"],
+    "NORMAL": ["tooltip shows wrong text", "sorting ignores case", "slow to refresh"],
+    "MAJOR": ["export fails for large files", "search returns wrong results"],
+    "CRITICAL": ["payment throws an exception", "login fails for all users"],
+    "BLOCKER": ["application crashes on startup", "all user data is lost"],
+}
+
+
+def faker_corpus(size, seed):
+    from faker import Faker
+
+    fake = Faker()
+    Faker.seed(seed)
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(size):
+        severity = rng.choice(LABELS)
+        phrase = rng.choice(SEVERITY_PHRASES[severity])
+        rows.append((f"{fake.sentence()} {phrase}. {fake.sentence()}", severity))
+    return rows
+
+
+def db_corpus(size):
+    bugs = Bug.objects.exclude(severity=None).exclude(description=None)
+    if size:
+        bugs = bugs.order_by("?")[:size]
+    return list(bugs.values_list("description", "severity"))
+
+
+def classification_report(expected, predicted):
+    matrix = {label: Counter() for label in LABELS}
+    for truth, guess in zip(expected, predicted):
+        matrix[truth][guess] += 1
+
+    per_class = {}
+    for label in LABELS:
+        tp = matrix[label][label]
+        fp = sum(matrix[other][label] for other in LABELS if other != label)
+        fn = sum(matrix[label].values()) - tp
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_class[label] = {"precision": precision, "recall": recall, "f1": f1}
+
+    correct = sum(1 for truth, guess in zip(expected, predicted) if truth == guess)
+    return {
+        "accuracy": correct / len(expected) if expected else 0.0,
+        "macro_f1": sum(c["f1"] for c in per_class.values()) / len(LABELS),
+        "per_class": per_class,
+        "confusion_matrix": {
+            label: [matrix[label][other] for other in LABELS] for label in LABELS
+        },
+    }
+
+
+def current_predictor(train_rows):
+    # only this process's copies; the shared cache is never cleared, the run
+    # uses keys of its own instead (see handle)
+    prediction.clear_prediction_cache()
+    return prediction.get_severity
+
+
+def local_nb_predictor(train_rows):
+    return NaiveBayesModel().fit(*zip(*train_rows)).predict
+
+
+def majority_predictor(train_rows):
+    label = Counter(severity for _, severity in train_rows).most_common(1)[0][0]
+    return lambda desc: label
+
+
+MODELS = {
+    "get_severity": current_predictor,
+    "local-nb": local_nb_predictor,
+    "majority": majority_predictor,
+}
+
+
+class Command(BaseCommand):
+    help = "Measure accuracy and latency of the severity predictors"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=["db", "faker"], default="db")
+        parser.add_argument(
+            "--size", type=int, default=1000, help="number of labeled bugs to use"
+        )
+        parser.add_argument("--models", default=",".join(MODELS))
+        parser.add_argument("--train-fraction", type=float, default=0.8)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        names = options["models"].split(",")
+        unknown = set(names) - set(MODELS)
+        if unknown:
+            raise CommandError(f"unknown models: {', '.join(sorted(unknown))}")
+
+        if options["source"] == "faker":
+            rows = faker_corpus(options["size"], options["seed"])
+        else:
+            rows = db_corpus(options["size"])
+        if len(rows) < 2:
+            raise CommandError("need at least two labeled bugs")
+        random.Random(options["seed"]).shuffle(rows)
+        split = max(1, int(len(rows) * options["train_fraction"]))
+        train_rows, test_rows = rows[:split], rows[split:] or rows[:1]
+
+        results = {
+            "created": timezone.now(),
+            "source": options["source"],
+            "train_size": len(train_rows),
+            "test_size": len(test_rows),
+            "labels": LABELS,
+            "models": {},
+        }
+        # cache keys no live entry uses, so the first pass starts cold without
+        # flushing the shared cache; they expire with PREDICTION_CACHE_TTL
+        prefix = f"severity-benchmark-{uuid.uuid4().hex}:"
+        for name in names:
+            predict = MODELS[name](train_rows)
+            if name == "get_severity":
+                predict = partial(predict, cache_prefix=prefix)
+            results["models"][name] = self.evaluate(predict, test_rows)
+            self.report(name, results["models"][name])
+            if name == "get_severity":
+                results["models"][name]["cache"] = prediction.cache_info()
+                # again with only the shared cache warm: its cost alone
+                warm = "get_severity_shared_cache"
+                predict = partial(MODELS[name](train_rows), cache_prefix=prefix)
+                results["models"][warm] = self.evaluate(predict, test_rows)
+                results["models"][warm]["cache"] = prediction.cache_info()
+                self.report(warm, results["models"][warm])
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"predictor-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def evaluate(self, predict, rows):
+        expected, predicted, latencies = [], [], []
+        start = time.perf_counter()
+        for description, severity in rows:
+            t = time.perf_counter()
+            label = predict(description)
+            latencies.append(time.perf_counter() - t)
+            expected.append(severity)
+            predicted.append(SEVERITY_MAP.get(label, label))
+        elapsed = time.perf_counter() - start
+        report = classification_report(expected, predicted)
+        report["latency"] = latency_summary(latencies)
+        report["throughput_per_s"] = len(rows) / elapsed if elapsed else 0.0
+        return report
+
+    def report(self, name, result):
+        latency = result["latency"]
+        self.stdout.write(
+            f"{name}: macro-F1 {result['macro_f1']:.3f}, "
+            f"accuracy {result['accuracy']:.3f}, "
+            f"p50 {latency['p50_ms']:.3f}ms p95 {latency['p95_ms']:.3f}ms "
+            f"p99 {latency['p99_ms']:.3f}ms, "
+            f"{result['throughput_per_s']:.0f}/s"
+        )
@@ -0,0 +1,126 @@
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import search
+from core.benchmark import latency_summary, write_results
+from core.models import Bug, Project
+
+# a word planted in a fixed number of bugs, so its result set does not grow
+NEEDLE = "zanzibar"
+NEEDLE_BUGS = 20
+
+
+def word_list(rng, size=5000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    for _ in range(size):
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 9))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure search latency as the bug table grows. Generated bugs are "
+        "created in a transaction that is rolled back at the end"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000",
+            help="comma separated bug counts to measure at, e.g. 1000,1000000",
+        )
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument(
+            "--skip-icontains",
+            action="store_true",
+            help="do not measure the old title__icontains search",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        rng = random.Random(options["seed"])
+        words = word_list(rng)
+        results = {"created": timezone.now(), "needle_bugs": NEEDLE_BUGS, "sizes": {}}
+
+        with transaction.atomic():
+            project = Project.objects.create(name="search benchmark")
+            bugs = Bug.objects.filter(project=project)
+            needles = set(rng.sample(range(sizes[-1]), NEEDLE_BUGS))
+            created = 0
+            for size in sizes:
+                self.stdout.write(f"Generating bugs up to {size}...")
+                created = self.generate(project, words, rng, needles, created, size)
+                result = {}
+                result["fts_needle"] = self.measure(
+                    lambda: list(search.search(bugs, NEEDLE)[:10]), options["repeat"]
+                )
+                common = words[0]
+                result["fts_common_word"] = self.measure(
+                    lambda: list(search.search(bugs, common)[:10]), options["repeat"]
+                )
+                if not options["skip_icontains"]:
+                    result["icontains_needle"] = self.measure(
+                        lambda: list(bugs.filter(title__icontains=NEEDLE)[:10]),
+                        options["repeat"],
+                    )
+                results["sizes"][size] = result
+                self.report(size, result)
+            transaction.set_rollback(True)
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"search-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def generate(self, project, words, rng, needles, start, end, batch_size=5000):
+        for offset in range(start, end, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, end)):
+                title = " ".join(rng.choices(words, k=6))
+                if i in needles:
+                    title += f" {NEEDLE}"
+                rows.append(
+                    Bug(
+                        title=title,
+                        description=" ".join(rng.choices(words, k=30)),
+                        project=project,
+                        priority="LOW",
+                        severity="NORMAL",
+                    )
+                )
+            last_id = Bug.objects.order_by("-id").values_list("id", flat=True).first()
+            # bulk_create skips the signals, so index the new rows directly
+            Bug.objects.bulk_create(rows)
+            new_ids = Bug.objects.filter(
+                project=project, id__gt=last_id or 0
+            ).values_list("id", flat=True)
+            search.index_rows(search.documents(list(new_ids)))
+        return end
+
+    def measure(self, run, repeat):
+        run()
+        latencies = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - t)
+        return latency_summary(latencies)
+
+    def report(self, size, result):
+        line = ", ".join(
+            f"{name} p50 {latency['p50_ms']:.2f}ms p95 {latency['p95_ms']:.2f}ms"
+            for name, latency in result.items()
+        )
+        self.stdout.write(f"{size} bugs: {line}")
@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import BugMedia
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete deduplicated media files that no BugMedia row refers to any "
+        "more. Recent files are kept: their rows may not be committed yet"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="only delete files older than this many hours",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        field = BugMedia._meta.get_field("file")
+        storage = field.storage
+        root = storage.path(field.upload_to)
+        cutoff = time.time() - options["min_age"] * 3600
+
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if filename.endswith(".upload"):
+                    # left behind by an upload that was interrupted
+                    files.setdefault("", []).append(path)
+                elif storage.digest(filename):
+                    files.setdefault(storage.digest(filename), []).append(path)
+
+        referenced = set()
+        digests = [digest for digest in files if digest]
+        for i in range(0, len(digests), 1000):
+            referenced.update(
+                BugMedia.objects.filter(digest__in=digests[i : i + 1000])
+                .values_list("digest", flat=True)
+                .distinct()
+            )
+
+        deleted = freed = 0
+        for digest, paths in files.items():
+            if digest in referenced:
+                continue
+            # an upload of the same content may have reused the file since
+            # the scan: it touches the file, then commits its row
+            if digest and BugMedia.objects.filter(digest=digest).exists():
+                continue
+            for path in paths:
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                freed += os.path.getsize(path)
+                deleted += 1
+                if options["dry_run"]:
+                    self.stdout.write(f"would delete {path}")
+                else:
+                    os.remove(path)
+
+        verb = "would delete" if options["dry_run"] else "deleted"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {deleted} files, {freed} bytes")
+        )
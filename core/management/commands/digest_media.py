@@ -0,0 +1,55 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+
+from core import thumbnails
+from core.models import BugMedia
+
+
+def file_digest(media):
+    digest = hashlib.sha256()
+    with media.file.open("rb") as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in the digest of media uploaded before content addressing, so "
+        "their images get thumbnails. The files stay where they are"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        rows = BugMedia.objects.filter(digest="").order_by("id")
+        filled = missing = 0
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[: options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            hashed = []
+            for media in batch:
+                try:
+                    media.digest = file_digest(media)
+                except FileNotFoundError:
+                    self.stderr.write(f"#{media.id}: {media.file.name} is missing")
+                    missing += 1
+                    continue
+                hashed.append(media)
+            filled += len(hashed)
+            if options["dry_run"] or not hashed:
+                continue
+            BugMedia.objects.bulk_update(hashed, ["digest"])
+            # bulk_update sends no signals
+            thumbnails.schedule(hashed)
+
+        verb = "would fill in" if options["dry_run"] else "filled in"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {filled} digests, {missing} files missing")
+        )
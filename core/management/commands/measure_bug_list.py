@@ -0,0 +1,119 @@
+import os
+import random
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import fragments
+from core.benchmark import write_results
+from core.models import Bug, Project, excerpt
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the bytes read from the database, the HTML bytes sent and "
+        "the peak memory for one page of bug list rows, printing the whole "
+        "description as the list used to and printing the stored excerpt. "
+        "Generated bugs are created in a transaction that is rolled back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10, help="rows per page")
+        parser.add_argument(
+            "--description-sizes",
+            default="1000,100000,1000000",
+            help="comma separated description lengths in characters",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["description_sizes"].split(",")]
+        rng = random.Random(options["seed"])
+        results = {"created": timezone.now(), "rows": options["rows"], "sizes": {}}
+
+        with transaction.atomic():
+            for size in sizes:
+                project = Project.objects.create(name=f"list measurement {size}")
+                self.generate(project, options["rows"], size, rng)
+                page = Bug.objects.filter(project=project).order_by(
+                    "-added_date", "-id"
+                )
+                result = {
+                    "full_description": self.measure(
+                        page, ["description"], full_description=True
+                    ),
+                    "excerpt": self.measure(page, ["description_excerpt"]),
+                }
+                results["sizes"][size] = result
+                self.report(size, result)
+            transaction.set_rollback(True)
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR,
+            "benchmark_results",
+            f"bug-list-bytes-{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_results(output, results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def generate(self, project, count, size, rng):
+        words = ["crash", "login", "page", "button", "error", "slow", "report"]
+        bugs = []
+        for i in range(count):
+            description = " ".join(rng.choices(words, k=size // 5))[:size]
+            bugs.append(
+                Bug(
+                    title=f"Generated bug {i}",
+                    description=description,
+                    description_excerpt=excerpt(description),
+                    project=project,
+                    priority="LOW",
+                    severity="NORMAL",
+                    status="NEW",
+                )
+            )
+        Bug.objects.bulk_create(bugs)
+
+    def measure(self, page, text_fields, full_description=False):
+        # the row fields, with the description column given by `text_fields`
+        fields = [
+            field
+            for field in fragments.ROW_FIELDS
+            if "__" not in field and field != "description_excerpt"
+        ] + text_fields
+        database_bytes = sum(
+            len(str(value).encode())
+            for row in page.values_list(*fields)
+            for value in row
+            if value is not None
+        )
+
+        tracemalloc.start()
+        bugs = page.select_related("assigned_to").only(
+            *fields, "assigned_to__username"
+        )
+        rows = []
+        for bug in bugs:
+            if full_description:
+                # what the list printed before the excerpt was stored
+                bug.description_excerpt = bug.description
+            rows.append(fragments.render_row(bug))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "database_bytes": database_bytes,
+            "html_bytes": sum(len(row.encode()) for row in rows),
+            "peak_memory_bytes": peak,
+        }
+
+    def report(self, size, result):
+        line = ", ".join(
+            f"{name}: {m['database_bytes']} bytes read, {m['html_bytes']} bytes "
+            f"of HTML, {m['peak_memory_bytes'] / 1024:.0f} KiB peak"
+            for name, m in result.items()
+        )
+        self.stdout.write(f"descriptions of {size} characters: {line}")
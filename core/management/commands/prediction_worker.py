@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.tasks import backlog, requeue_stale_tasks, run_pending
+
+
+class Command(BaseCommand):
+    help = "Process queued severity predictions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="process one batch and exit"
+        )
+        parser.add_argument(
+            "--stats", action="store_true", help="print the queue backlog and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.print_backlog()
+            return
+
+        while True:
+            requeue_stale_tasks()
+            results = run_pending(options["batch_size"], options["workers"])
+            if results:
+                self.stdout.write(
+                    f"processed {len(results)} tasks, {results.count(False)} failed"
+                )
+            if options["once"]:
+                self.print_backlog()
+                return
+            if not results:
+                time.sleep(options["poll_interval"])
+
+    def print_backlog(self):
+        stats = backlog()
+        self.stdout.write(
+            f"queued={stats['queued']} running={stats['running']} "
+            f"failed={stats['failed']} oldest_age={stats['oldest_age']:.1f}s"
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.stats import check_stats, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-project bug counters, or check them with --check"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project", type=int, action="append", help="only this project id"
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="only compare the counters with the bug table",
+        )
+
+    def handle(self, *args, **options):
+        project_ids = options["project"]
+        if options["check"]:
+            mismatches = check_stats(project_ids)
+            for (project_id, dimension, value), (stored, actual) in sorted(
+                mismatches.items(), key=str
+            ):
+                self.stdout.write(
+                    f"project {project_id} {dimension}={value!r}: "
+                    f"stored {stored}, actual {actual}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} counters are out of date")
+            self.stdout.write(self.style.SUCCESS("All counters are consistent"))
+            return
+
+        counts = rebuild_stats(project_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(counts)} counters"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.reports import requeue_stale_reports, run_pending_reports
+
+
+class Command(BaseCommand):
+    help = "Render queued PDF bug reports"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="process one batch and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeue_stale_reports()
+            results = run_pending_reports(options["batch_size"])
+            if results:
+                self.stdout.write(
+                    f"rendered {len(results)} reports, {results.count(False)} failed"
+                )
+            if options["once"]:
+                return
+            if not results:
+                time.sleep(options["poll_interval"])
@@ -0,0 +1,149 @@
+import json
+import os
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from core.models import SEVERITY_MAP, Bug, BugEvent, Project
+from core.prediction import get_severities
+from core.predictor_client import PredictorError
+from core.rollups import bug_event
+from core.stats import apply_deltas, bug_deltas, counted_values
+from core.versions import bug_version_names, bump_versions
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Recompute the predicted severity of existing bugs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project", type=int, action="append", help="only this project id"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="print the severity changes without saving them",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="continue after the last bug saved by an interrupted run",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(settings.BASE_DIR, ".repredict_checkpoint.json"),
+        )
+
+    def handle(self, *args, **options):
+        self.checkpoint_path = options["checkpoint"]
+        checkpoint = self.load_checkpoint() if options["resume"] else {}
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+
+        projects = Project.objects.order_by("id")
+        if options["project"]:
+            projects = projects.filter(id__in=options["project"])
+
+        changes = Counter()
+        for project in projects:
+            bugs = Bug.objects.filter(
+                project=project,
+                is_predicted=True,
+                id__gt=checkpoint.get(str(project.id), 0),
+            ).order_by("id")
+            total = bugs.count()
+            done = 0
+            rows = bugs.only(
+                "id",
+                "description",
+                "severity",
+                "status",
+                "priority",
+                "row_version",
+                "project_id",
+                "assigned_to_id",
+                "submitted_by_id",
+            ).iterator(chunk_size=batch_size)
+            for batch in batched(rows, batch_size):
+                changed = []
+                events = []
+                deltas = Counter()
+                try:
+                    labels = get_severities([bug.description for bug in batch])
+                except PredictorError as e:
+                    # the batches before this one are saved and checkpointed
+                    raise CommandError(
+                        f"the severity predictor failed: {e}; "
+                        "run again with --resume once it is back"
+                    )
+                for bug, label in zip(batch, labels):
+                    severity = SEVERITY_MAP.get(label)
+                    if severity is None or severity == bug.severity:
+                        continue
+                    changes[(bug.severity, severity)] += 1
+                    if dry_run:
+                        self.stdout.write(f"  #{bug.id}: {bug.severity} -> {severity}")
+                    old_values = counted_values(bug)
+                    bug.severity = severity
+                    # by the database, as in Bug.save
+                    bug.row_version = F("row_version") + 1
+                    new_values = counted_values(bug)
+                    deltas.update(bug_deltas(old_values, new_values))
+                    events.append(
+                        bug_event(
+                            "CHANGED", bug.id, bug.project_id, old_values, new_values
+                        )
+                    )
+                    changed.append(bug)
+
+                if not dry_run:
+                    if changed:
+                        with transaction.atomic():
+                            Bug.objects.bulk_update(changed, ["severity", "row_version"])
+                            apply_deltas(deltas)
+                            # the backlog by severity is rolled up from these
+                            BugEvent.objects.bulk_create(events)
+                        # bulk_update sends no signals
+                        bump_versions(set().union(*map(bug_version_names, changed)))
+                    checkpoint[str(project.id)] = batch[-1].id
+                    self.save_checkpoint(checkpoint)
+
+                done += len(batch)
+                self.stdout.write(f"{project}: {done}/{total} bugs")
+
+        if not dry_run and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        verb = "would change" if dry_run else "changed"
+        self.stdout.write(
+            self.style.SUCCESS(f"{sum(changes.values())} severities {verb}")
+        )
+        for (old, new), count in sorted(changes.items(), key=str):
+            self.stdout.write(f"  {old} -> {new}: {count}")
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_checkpoint(self, checkpoint):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
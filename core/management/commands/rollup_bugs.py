@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold new bug events into the daily rollup table. "
+        "Meant to run on a schedule, e.g. every few minutes from cron"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="recompute every project from its first event",
+        )
+
+    def handle(self, *args, **options):
+        projects = update_rollups(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"Updated rollups of {projects} projects"))
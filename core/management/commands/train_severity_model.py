@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Bug
+from core.prediction import model_path, train_model
+
+
+class Command(BaseCommand):
+    help = "Train the local severity classifier from existing bugs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--manual-only",
+            action="store_true",
+            help="only use bugs whose severity was set by a person",
+        )
+
+    def handle(self, *args, **options):
+        bugs = Bug.objects.exclude(severity=None).exclude(description=None)
+        if options["manual_only"]:
+            bugs = bugs.filter(is_predicted=False)
+        rows = bugs.values_list("description", "severity").iterator()
+        model = train_model(rows)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Trained model v{model.version} on {model.n_docs} bugs, "
+                f"saved to {model_path()}"
+            )
+        )
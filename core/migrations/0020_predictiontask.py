@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_bug_is_predicted_alter_bug_severity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'QUEUED'), ('RUNNING', 'RUNNING'), ('DONE', 'DONE'), ('FAILED', 'FAILED')], default='QUEUED', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.bug')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='predictiontask',
+            index=models.Index(fields=['status', 'run_after'], name='core_predic_status_5be91a_idx'),
+        ),
+    ]
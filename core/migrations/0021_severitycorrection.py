@@ -0,0 +1,28 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_predictiontask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeverityCorrection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(blank=True, default='')),
+                ('predicted_severity', models.CharField(choices=[('MINOR', 'MINOR'), ('NORMAL', 'NORMAL'), ('MAJOR', 'MAJOR'), ('CRITICAL', 'CRITICAL'), ('BLOCKER', 'BLOCKER')], max_length=20, null=True)),
+                ('severity', models.CharField(choices=[('MINOR', 'MINOR'), ('NORMAL', 'NORMAL'), ('MAJOR', 'MAJOR'), ('CRITICAL', 'CRITICAL'), ('BLOCKER', 'BLOCKER')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('model_version', models.PositiveIntegerField(blank=True, null=True)),
+                ('bug', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.bug')),
+                ('corrected_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
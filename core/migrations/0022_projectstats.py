@@ -0,0 +1,59 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    Bug = apps.get_model("core", "Bug")
+    ProjectStats = apps.get_model("core", "ProjectStats")
+    dimensions = {
+        "status": "status",
+        "priority": "priority",
+        "severity": "severity",
+        "assignee": "assigned_to_id",
+    }
+    stats = []
+    for row in Bug.objects.values("project_id").annotate(n=Count("id")):
+        stats.append(
+            ProjectStats(
+                project_id=row["project_id"], dimension="total", value="", count=row["n"]
+            )
+        )
+    for dimension, field in dimensions.items():
+        for row in Bug.objects.values("project_id", field).annotate(n=Count("id")):
+            value = "" if row[field] is None else str(row[field])
+            stats.append(
+                ProjectStats(
+                    project_id=row["project_id"],
+                    dimension=dimension,
+                    value=value,
+                    count=row["n"],
+                )
+            )
+    ProjectStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_severitycorrection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('value', models.CharField(blank=True, default='', max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.project')),
+            ],
+            options={
+                'unique_together': {('project', 'dimension', 'value')},
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
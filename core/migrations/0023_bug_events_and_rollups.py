@@ -0,0 +1,82 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:16
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_events(apps, schema_editor):
+    # the only history older bugs have is their last modification date
+    Bug = apps.get_model("core", "Bug")
+    BugEvent = apps.get_model("core", "BugEvent")
+    events = []
+    for bug in Bug.objects.order_by("id").iterator():
+        created_at = datetime.datetime.combine(
+            bug.added_date, datetime.time(), tzinfo=datetime.timezone.utc
+        )
+        events.append(
+            BugEvent(
+                bug_id=bug.id,
+                project_id=bug.project_id,
+                kind="CREATED",
+                new_status=bug.status,
+                new_severity=bug.severity,
+                created_at=created_at,
+            )
+        )
+    BugEvent.objects.bulk_create(events, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_projectstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BugEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bug_id', models.BigIntegerField(db_index=True)),
+                ('kind', models.CharField(choices=[('CREATED', 'CREATED'), ('CHANGED', 'CHANGED'), ('DELETED', 'DELETED')], max_length=10)),
+                ('old_status', models.CharField(blank=True, max_length=15, null=True)),
+                ('new_status', models.CharField(blank=True, max_length=15, null=True)),
+                ('old_severity', models.CharField(blank=True, max_length=20, null=True)),
+                ('new_severity', models.CharField(blank=True, max_length=20, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BugDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('severity', models.CharField(blank=True, default='', max_length=20)),
+                ('opened', models.PositiveIntegerField(default=0)),
+                ('fixed', models.PositiveIntegerField(default=0)),
+                ('backlog', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.project')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bugevent',
+            index=models.Index(fields=['project', 'created_at'], name='core_bugeve_project_96af3e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bugdailyrollup',
+            unique_together={('project', 'day', 'severity')},
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
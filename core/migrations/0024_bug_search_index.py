@@ -0,0 +1,72 @@
+from django.db import migrations
+
+TABLE = "core_bugsearch"
+
+
+def create_index(apps, schema_editor, batch_size=1000):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} "
+            "USING fts5(title, body, tokenize='porter unicode61')"
+        )
+        id_column = "rowid"
+    elif vendor == "mysql":
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "bug_id bigint NOT NULL PRIMARY KEY, "
+            "title varchar(200) NOT NULL, "
+            "body longtext NOT NULL, "
+            f"FULLTEXT KEY {TABLE}_text (title, body)"
+            ") ENGINE=InnoDB"
+        )
+        id_column = "bug_id"
+    else:
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "bug_id bigint NOT NULL PRIMARY KEY, "
+            "title varchar(200) NOT NULL, "
+            "body text NOT NULL)"
+        )
+        id_column = "bug_id"
+
+    Bug = apps.get_model("core", "Bug")
+    Comments = apps.get_model("core", "Comments")
+    bugs = Bug.objects.order_by("id").values_list("id", "title", "description")
+    last_id = 0
+    while True:
+        batch = list(bugs.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        comments = {}
+        for bug_id, text in (
+            Comments.objects.filter(bug_id__in=[row[0] for row in batch])
+            .order_by("id")
+            .values_list("bug_id", "text")
+        ):
+            comments.setdefault(bug_id, []).append(text)
+        rows = [
+            (bug_id, title, "\n".join([description or ""] + comments.get(bug_id, [])))
+            for bug_id, title, description in batch
+        ]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} ({id_column}, title, body) VALUES (%s, %s, %s)",
+                rows,
+            )
+        last_id = batch[-1][0]
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0023_bug_events_and_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
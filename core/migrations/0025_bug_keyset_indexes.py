@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_bug_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'added_date', 'id'], name='core_bug_project_eb02be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['added_date', 'id'], name='core_bug_added_d_108273_idx'),
+        ),
+    ]
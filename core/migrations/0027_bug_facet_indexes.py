@@ -0,0 +1,33 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_bug_reports'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'status', 'added_date', 'id'], name='bug_project_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'priority', 'added_date', 'id'], name='bug_project_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'severity', 'added_date', 'id'], name='bug_project_severity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'assigned_to', 'added_date', 'id'], name='bug_project_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'submitted_by', 'added_date', 'id'], name='bug_project_submitter_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_bug_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bug',
+            name='row_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:43
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+EXCERPT_LENGTH = 200
+
+
+def excerpt(text, length=EXCERPT_LENGTH):
+    text = " ".join((text or "")[: length * 4].split())
+    if len(text) > length:
+        return text[: length - 3] + "..."
+    return text
+
+
+def fill_excerpts(apps, schema_editor, batch_size=1000):
+    Bug = apps.get_model("core", "Bug")
+    # only the head of each description is read from the database
+    heads = (
+        Bug.objects.annotate(head=Substr("description", 1, EXCERPT_LENGTH * 4))
+        .order_by("id")
+        .values_list("id", "head")
+    )
+    last_id = 0
+    while True:
+        batch = list(heads.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        Bug.objects.bulk_update(
+            [Bug(id=bug_id, description_excerpt=excerpt(head)) for bug_id, head in batch],
+            ["description_excerpt"],
+        )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_bug_row_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bug',
+            name='description_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:46
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_bug_description_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bugmedia',
+            name='digest',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='bugmedia',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='bugmedia',
+            name='file',
+            field=models.FileField(storage=core.storage.ContentAddressedStorage(), upload_to='media', validators=[core.models.FileExtensionValidator(['jpg', 'jpeg', 'png', 'gif', 'bmp', 'log'])]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_bugmedia_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bugmedia',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bugmedia',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
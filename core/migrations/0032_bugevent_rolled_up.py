@@ -0,0 +1,30 @@
+# Generated by Django 4.0.4 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+def mark_rolled_up(apps, schema_editor):
+    # events up to the old high-water mark have been counted
+    RollupState = apps.get_model("core", "RollupState")
+    BugEvent = apps.get_model("core", "BugEvent")
+    for state in RollupState.objects.all():
+        BugEvent.objects.filter(id__lte=state.last_event_id).update(rolled_up=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_bugmedia_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bugevent',
+            name='rolled_up',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(mark_rolled_up, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='RollupState',
+        ),
+    ]
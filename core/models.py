@@ -7,13 +7,16 @@ from pydoc import describe
 from django.contrib.auth.models import UserManager
 from statistics import mode
 from turtle import title
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import base64
-from django.db.models import Q
+import os
+from django.db.models import F, Q
 from django.contrib.auth.models import AbstractUser
-from .prediction import get_severity
 from django.core.files.base import ContentFile
 
+from .storage import ContentAddressedStorage
+
 # Create your models here.
 ROLE_CHOICES = [("TL", "Team Lead"), ("TM", "Team Member"), ("O", "Project Owner")]
 
@@ -32,9 +35,9 @@ class CustomUserManager(UserManager):
         if user.is_superuser:
             return self.all()
         elif user.role == "O":
-            return self.filter(assigned_to=user.assigned_to)
+            return self.filter(assigned_to_id=user.assigned_to_id)
         else:
-            return self.filter(assigned_to=user.assigned_to, role="TM")
+            return self.filter(assigned_to_id=user.assigned_to_id, role="TM")
 
 
 class User(AbstractUser):
@@ -52,6 +55,13 @@ class User(AbstractUser):
     def is_project_owner(self):
         return self.role == "O"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # remember the loaded values so signal handlers can see what changed
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 BUG_STATUS_CHOICES = [
     ("NEW", "NEW"),
@@ -79,22 +89,38 @@ SEVERITY_MAP = {
 }
 
 
+# the list shows this much of a description; descriptions can be whole logs
+EXCERPT_LENGTH = 200
+
+
+def excerpt(text, length=EXCERPT_LENGTH):
+    # only the head is looked at: the rest could be megabytes
+    text = " ".join((text or "")[: length * 4].split())
+    if len(text) > length:
+        return text[: length - 3] + "..."
+    return text
+
+
 class BugManager(models.Manager):
     def for_user(self, user):
         if user.is_superuser:
             return self.all()
         elif user.role == "O":
-            return self.filter(project=user.assigned_to)
+            return self.filter(project_id=user.assigned_to_id)
         else:
             return self.filter(
-                Q(project=user.assigned_to)
-                and Q(assigned_to=user) | Q(submitted_by=user)
+                Q(project_id=user.assigned_to_id)
+                & (Q(assigned_to=user) | Q(submitted_by=user))
             )
 
 
 class Bug(models.Model):
     title = models.CharField(max_length=200, null=False)
     description = models.TextField(null=True)
+    # kept up to date by save(), so lists never need to load the description
+    description_excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH, blank=True, default="", editable=False
+    )
     status = models.CharField(max_length=15, null=True, choices=BUG_STATUS_CHOICES)
     added_date = models.DateField(auto_now=True)
     assigned_to = models.ForeignKey(
@@ -115,13 +141,72 @@ class Bug(models.Model):
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES)
     severity = models.CharField(max_length=20, null=True,choices=SEVERITY_CHOICES)
     is_predicted = models.BooleanField(default=True)
+    # bumped on every save; cached list rows are keyed on it
+    row_version = models.PositiveIntegerField(default=1, editable=False)
 
     objects = BugManager()
 
+    class Meta:
+        # keyset pagination walks (added_date, id), usually within a project;
+        # the list is filtered by project and then by one of the facets, and
+        # a team member's scope ORs the assignee and submitter indexes
+        indexes = [
+            models.Index(fields=["project", "added_date", "id"]),
+            models.Index(fields=["added_date", "id"]),
+            models.Index(
+                fields=["project", "status", "added_date", "id"],
+                name="bug_project_status_idx",
+            ),
+            models.Index(
+                fields=["project", "priority", "added_date", "id"],
+                name="bug_project_priority_idx",
+            ),
+            models.Index(
+                fields=["project", "severity", "added_date", "id"],
+                name="bug_project_severity_idx",
+            ),
+            models.Index(
+                fields=["project", "assigned_to", "added_date", "id"],
+                name="bug_project_assignee_idx",
+            ),
+            models.Index(
+                fields=["project", "submitted_by", "added_date", "id"],
+                name="bug_project_submitter_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if "description" not in self.get_deferred_fields():
+            self.description_excerpt = excerpt(self.description)
+            if update_fields is not None and "description" in update_fields:
+                update_fields = {*update_fields, "description_excerpt"}
+        bump_row_version = not self._state.adding
+        if bump_row_version:
+            # incremented by the database, so concurrent saves of one loaded
+            # version each get their own and never share a cached row
+            self.row_version = F("row_version") + 1
+            if update_fields is not None:
+                update_fields = {*update_fields, "row_version"}
+        if update_fields is not None:
+            kwargs["update_fields"] = update_fields
+        # ProjectStats counters are updated by the post_save handler and must
+        # commit or roll back together with the bug itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if bump_row_version:
+                self.refresh_from_db(fields=["row_version"])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # remember the loaded values so signal handlers can see what changed
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 @deconstructible
 class FileExtensionValidator:
@@ -132,7 +217,6 @@ class FileExtensionValidator:
         self.allowed_extensions = allowed_extensions
 
     def __call__(self, value):
-        print("validaiton is called")
         extension = value.name.split(".")[-1].lower()
         if extension not in self.allowed_extensions:
             raise ValidationError(
@@ -144,13 +228,170 @@ class FileExtensionValidator:
 class BugMedia(models.Model):
     allowed_extensions = ["jpg", "jpeg", "png", "gif", "bmp", "log"]
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE)
+    # stored under the digest of its content; identical uploads share a file
     file = models.FileField(
-        upload_to="media", validators=[FileExtensionValidator(allowed_extensions)]
+        upload_to="media",
+        storage=ContentAddressedStorage(),
+        validators=[FileExtensionValidator(allowed_extensions)],
     )
+    # SHA-256 of the content; empty for files stored before deduplication
+    # until the digest_media command fills it in
+    digest = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # the name the file was uploaded as
+    name = models.CharField(max_length=255, blank=True, default="")
+    # size of images, filled in when their thumbnails are made
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # stored before the row is written, so the row gets its digest
+            self.name = self.name or os.path.basename(self.file.name)[:255]
+            self.file.save(self.file.name, self.file.file, save=False)
+        self.digest = self.digest or self.file.storage.digest(self.file.name)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def for_upload(cls, bug, upload):
+        """An unsaved BugMedia for `upload`, whose content is stored already.
+
+        Nothing is left for save() to do, so the rows can be bulk_created.
+        """
+        field = cls._meta.get_field("file")
+        name = field.storage.save(field.generate_filename(None, upload.name), upload)
+        return cls(
+            bug=bug,
+            file=name,
+            digest=field.storage.digest(name),
+            name=os.path.basename(upload.name)[:255],
+        )
+
+    def __str__(self):
+        return self.name or self.file.name
 
 
 class Comments(models.Model):
     by = models.ForeignKey(User, on_delete=models.CASCADE)
     bug = models.ForeignKey(Bug, models.CASCADE)
     text = models.TextField(null=False, default="", max_length=500)
-    date_added = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    date_added = models.DateTimeField(auto_now_add=True)
+
+
+PREDICTION_TASK_STATUS_CHOICES = [
+    ("QUEUED", "QUEUED"),
+    ("RUNNING", "RUNNING"),
+    ("DONE", "DONE"),
+    ("FAILED", "FAILED"),
+]
+
+
+class PredictionTask(models.Model):
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=10, choices=PREDICTION_TASK_STATUS_CHOICES, default="QUEUED"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"{self.bug_id} {self.status}"
+
+
+class SeverityCorrection(models.Model):
+    bug = models.ForeignKey(Bug, on_delete=models.SET_NULL, null=True)
+    description = models.TextField(blank=True, default="")
+    predicted_severity = models.CharField(
+        max_length=20, null=True, choices=SEVERITY_CHOICES
+    )
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
+    corrected_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # version of the local model that learned this correction, null until then
+    model_version = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.bug_id}: {self.predicted_severity} -> {self.severity}"
+
+
+class ProjectStats(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    dimension = models.CharField(max_length=20)
+    value = models.CharField(max_length=20, blank=True, default="")
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = [("project", "dimension", "value")]
+
+    def __str__(self):
+        return f"{self.project_id} {self.dimension}={self.value}: {self.count}"
+
+
+BUG_EVENT_CHOICES = [
+    ("CREATED", "CREATED"),
+    ("CHANGED", "CHANGED"),
+    ("DELETED", "DELETED"),
+]
+
+
+class BugEvent(models.Model):
+    # kept after the bug is deleted, so no foreign key to it
+    bug_id = models.BigIntegerField(db_index=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=BUG_EVENT_CHOICES)
+    old_status = models.CharField(max_length=15, null=True, blank=True)
+    new_status = models.CharField(max_length=15, null=True, blank=True)
+    old_severity = models.CharField(max_length=20, null=True, blank=True)
+    new_severity = models.CharField(max_length=20, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # counted by rollups.update_rollups
+    rolled_up = models.BooleanField(default=False, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["project", "created_at"])]
+
+
+class BugDailyRollup(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    day = models.DateField()
+    severity = models.CharField(max_length=20, blank=True, default="")
+    opened = models.PositiveIntegerField(default=0)
+    fixed = models.PositiveIntegerField(default=0)
+    # bugs not FIXED at the end of the day
+    backlog = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("project", "day", "severity")]
+
+
+REPORT_STATUS_CHOICES = [
+    ("QUEUED", "QUEUED"),
+    ("RUNNING", "RUNNING"),
+    ("DONE", "DONE"),
+    ("FAILED", "FAILED"),
+]
+
+
+class BugReport(models.Model):
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    # the list view query parameters the report was made for
+    filters = models.JSONField(default=dict)
+    # identifies the data the report shows; see reports.data_key
+    data_key = models.CharField(max_length=255, db_index=True)
+    status = models.CharField(
+        max_length=10, choices=REPORT_STATUS_CHOICES, default="QUEUED"
+    )
+    file = models.FileField(upload_to="reports", blank=True)
+    rows = models.PositiveIntegerField(default=0)
+    pages = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"report {self.pk} {self.status}"
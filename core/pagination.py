@@ -0,0 +1,181 @@
+import datetime
+import json
+
+from django.core import signing
+from django.db.models import Q
+
+# Keyset pagination: a page is fetched with a WHERE on the ordering key of
+# the row it starts after instead of an OFFSET, so every page costs the
+# same as the first one and no COUNT(*) is needed.
+
+CURSOR_SALT = "core.pagination.cursor"
+
+
+def _json_default(value):
+    # full precision: DjangoJSONEncoder would cut datetimes to milliseconds
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"cannot put {type(value).__name__} in a cursor")
+
+
+class CursorSerializer(signing.JSONSerializer):
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), default=_json_default).encode(
+            "latin-1"
+        )
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    def __init__(self, queryset, per_page, ordering=("-added_date", "-id")):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip("-") for field in self.ordering]
+
+    def encode(self, direction, obj):
+        values = [getattr(obj, field) for field in self.fields]
+        return signing.dumps(
+            [direction, values], salt=CURSOR_SALT, serializer=CursorSerializer
+        )
+
+    def decode(self, cursor):
+        """(direction, key values) of `cursor`; the first page if it is invalid."""
+        if cursor:
+            try:
+                direction, values = signing.loads(
+                    cursor, salt=CURSOR_SALT, serializer=CursorSerializer
+                )
+            except (signing.BadSignature, ValueError, TypeError):
+                pass
+            else:
+                if direction in ("next", "previous") and isinstance(values, list):
+                    if len(values) == len(self.fields):
+                        return direction, values
+        return "next", None
+
+    def _beyond(self, values, ordering):
+        # rows after `values` in `ordering`: (a, b) > (x, y) is
+        # a > x OR (a = x AND b > y), spelled out for any number of fields
+        condition = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {self.fields[j]: values[j] for j in range(i)}
+            condition |= Q(**equal, **{f"{name}__{lookup}": values[i]})
+        return condition
+
+    def page(self, cursor=None):
+        direction, values = self.decode(cursor)
+        ordering = self.ordering
+        if direction == "previous":
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+        rows = self.queryset.order_by(*ordering)
+        if values is not None:
+            rows = rows.filter(self._beyond(values, ordering))
+        rows = list(rows[: self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if direction == "previous":
+            rows.reverse()
+
+        # a cursor can only have been made from a page next to this one
+        if direction == "next":
+            has_next, has_previous = more, values is not None
+        else:
+            has_next, has_previous = values is not None, more
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode("next", rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode("previous", rows[0])
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def keyset_rows(rows, batch_size):
+    """The rows of a values_list() queryset starting with "id", in id order.
+
+    Each batch is a query of its own starting after the last id, so memory
+    stays bounded on every backend: iterator() only streams where the
+    driver has server-side cursors, and mysqlclient reads whole results.
+    """
+    last_id = None
+    while True:
+        batch = rows.order_by("id")
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        batch = list(batch[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0]
+
+
+class CursorPaginationMixin:
+    """Paginate a ListView by cursor whenever its ordering allows it.
+
+    Offset paging is still used when `use_cursor()` says no, e.g. for
+    search results ordered by relevance. Either way the context gets
+    `next_url` and `previous_url` for the template.
+    """
+
+    cursor_ordering = ("-added_date", "-id")
+    cursor_param = "cursor"
+
+    def use_cursor(self):
+        return True
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        page = paginator.page(self.request.GET.get(self.cursor_param))
+        is_paginated = page.has_next() or page.has_previous()
+        return paginator, page, page.object_list, is_paginated
+
+    def page_url(self, **params):
+        query = self.request.GET.copy()
+        for name in ("page", self.cursor_param):
+            query.pop(name, None)
+        for name, value in params.items():
+            query[name] = value
+        return "?" + query.urlencode()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get("page_obj")
+        context["next_url"] = context["previous_url"] = None
+        if isinstance(page, CursorPage):
+            if page.has_next():
+                context["next_url"] = self.page_url(cursor=page.next_cursor)
+            if page.has_previous():
+                context["previous_url"] = self.page_url(cursor=page.previous_cursor)
+        elif page is not None:
+            if page.has_next():
+                context["next_url"] = self.page_url(page=page.next_page_number())
+            if page.has_previous():
+                context["previous_url"] = self.page_url(
+                    page=page.previous_page_number()
+                )
+        return context
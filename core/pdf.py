@@ -0,0 +1,146 @@
+import zlib
+
+# A minimal PDF writer for plain text tables: no dependencies, standard
+# Courier font only. Pages are written to the file as soon as they are
+# full, so only the object offsets are kept in memory.
+
+PAGE_WIDTH = 842  # A4 landscape, in points
+PAGE_HEIGHT = 595
+MARGIN = 36
+FONT_SIZE = 8
+LEADING = 10
+# Courier is monospaced: every character is 0.6 em wide
+CHARS_PER_LINE = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+LINES_PER_PAGE = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+
+CATALOG_ID = 1
+PAGES_ID = 2
+FONT_ID = 3
+FIRST_FREE_ID = 4
+
+
+def escape(text):
+    # PDF strings are bytes; the standard fonts use WinAnsiEncoding
+    data = text.encode("cp1252", "replace")
+    return (
+        data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    )
+
+
+def fit(text, width):
+    text = " ".join(str(text).split())
+    if len(text) > width:
+        return text[: width - 3] + "..."
+    return text.ljust(width)
+
+
+class PdfWriter:
+    def __init__(self, file):
+        self.file = file
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = FIRST_FREE_ID
+        self.position = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def _object(self, object_id, body):
+        self.offsets[object_id] = self.position
+        self._write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+
+    def _new_id(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def add_page(self, lines):
+        """Write one page holding at most LINES_PER_PAGE lines of text."""
+        content = [
+            b"BT /F1 %d Tf %d TL %d %d Td"
+            % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN - FONT_SIZE)
+        ]
+        for line in lines[:LINES_PER_PAGE]:
+            content.append(b"(" + escape(line) + b") Tj T*")
+        content.append(b"ET")
+        stream = zlib.compress(b"\n".join(content))
+
+        content_id, page_id = self._new_id(), self._new_id()
+        self._object(
+            content_id,
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+            + stream
+            + b"\nendstream",
+        )
+        self._object(
+            page_id,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (PAGES_ID, PAGE_WIDTH, PAGE_HEIGHT, FONT_ID, content_id),
+        )
+        self.page_ids.append(page_id)
+
+    def close(self, title=""):
+        if not self.page_ids:
+            self.add_page([])
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self._object(
+            PAGES_ID,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)),
+        )
+        self._object(
+            FONT_ID,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier "
+            b"/Encoding /WinAnsiEncoding >>",
+        )
+        self._object(CATALOG_ID, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGES_ID)
+        info_id = self._new_id()
+        self._object(info_id, b"<< /Title (" + escape(title) + b") >>")
+
+        xref = self.position
+        lines = [b"xref", b"0 %d" % self.next_id, b"0000000000 65535 f "]
+        for object_id in range(1, self.next_id):
+            lines.append(b"%010d 00000 n " % self.offsets[object_id])
+        self._write(b"\n".join(lines) + b"\n")
+        self._write(
+            b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\n"
+            % (self.next_id, CATALOG_ID, info_id)
+            + b"startxref\n%d\n%%%%EOF\n" % xref
+        )
+
+
+class TableWriter:
+    """Lay out rows as fixed-width columns, repeating the header on every page."""
+
+    def __init__(self, pdf, title, columns):
+        self.pdf = pdf
+        self.title = title
+        # columns: [(heading, width)]; the last one takes what is left
+        fixed = sum(width + 1 for _, width in columns[:-1])
+        self.widths = [width for _, width in columns[:-1]] + [CHARS_PER_LINE - fixed]
+        self.header = self.format([heading for heading, _ in columns])
+        self.lines = []
+        self.rows = 0
+
+    def format(self, values):
+        return " ".join(fit(value, width) for value, width in zip(values, self.widths))
+
+    def add_row(self, values):
+        if not self.lines:
+            page = len(self.pdf.page_ids) + 1
+            self.lines = [f"{self.title} - page {page}", "", self.header, ""]
+        self.lines.append(self.format(values))
+        self.rows += 1
+        if len(self.lines) == LINES_PER_PAGE:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.pdf.add_page(self.lines)
+            self.lines = []
+
+    def close(self):
+        self.flush()
+        self.pdf.close(self.title)
@@ -1,14 +1,392 @@
-import requests
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-base_url = "http://pratiklondhe4.pythonanywhere.com"
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
 
+from .classifier import NaiveBayesModel
+from .models import SeverityCorrection
+from .predictor_client import CircuitBreaker, PredictorClient, PredictorError
 
-def get_severity(desc):
-    req = base_url+"/predict"
-    data = {
-        "bug_description": desc,
-        "model_choice": "nb"}
-    r = requests.post(url=req, json=data)
-    print(r)
-    # Remove quotes from the response text
-    return r.text.strip('"').rstrip('"')[0:-2]
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEVERITY = "normal"
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+_learn_lock = threading.Lock()
+_learner = ThreadPoolExecutor(max_workers=1)
+_next_reload_check = 0.0
+_reloading = False
+_client = None
+# model_version of corrections being learned, until the learner commits
+LEARNING = 0
+
+
+def model_path():
+    return getattr(settings, "SEVERITY_MODEL_PATH", None)
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except (FileNotFoundError, TypeError):
+        return None
+
+
+def get_model():
+    # the model is loaded on first use and then kept for the process lifetime
+    global _model, _model_mtime
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                path = model_path()
+                mtime = _file_mtime(path)
+                if mtime is not None:
+                    _model_mtime = mtime
+                    _model = NaiveBayesModel.load(path)
+    else:
+        _check_for_new_model()
+    return _model
+
+
+def _check_for_new_model():
+    # another process may have saved a newer model (e.g. after a correction):
+    # load it in the background and keep predicting with the current one
+    global _next_reload_check, _reloading
+    now = time.monotonic()
+    if now < _next_reload_check or _reloading:
+        return
+    _next_reload_check = now + getattr(settings, "SEVERITY_MODEL_RELOAD_INTERVAL", 10)
+    mtime = _file_mtime(model_path())
+    if mtime is None or mtime == _model_mtime:
+        return
+    _reloading = True
+    threading.Thread(target=_reload_model, daemon=True).start()
+
+
+def _reload_model():
+    global _reloading
+    try:
+        path = model_path()
+        mtime = _file_mtime(path)
+        model = NaiveBayesModel.load(path)
+        model.predict("")  # build the scoring table before swapping it in
+        with _model_lock:
+            if _model is None or model.version >= _model.version:
+                set_model(model, mtime)
+    except (OSError, ValueError) as e:
+        logger.warning("could not reload severity model: %s", e)
+    finally:
+        _reloading = False
+
+
+def set_model(model, mtime=None):
+    # swapping the module reference is atomic: running predictions finish on
+    # the old model, new ones use the new one
+    global _model, _model_mtime
+    _model_mtime = mtime
+    _model = model
+
+
+def save_and_swap(model):
+    path = model_path()
+    if path:
+        model.save(path)
+    set_model(model, _file_mtime(path))
+
+
+def train_model(rows, save=True):
+    texts, labels = [], []
+    for description, severity in rows:
+        texts.append(description)
+        labels.append(severity)
+    model = NaiveBayesModel().fit(texts, labels)
+    current = get_model()
+    model.version = (current.version if current else 0) + 1
+    if save:
+        save_and_swap(model)
+        # the bugs already carry their corrected severity
+        SeverityCorrection.objects.filter(model_version=None).update(
+            model_version=model.version
+        )
+    else:
+        set_model(model)
+    return model
+
+
+def record_correction(bug, predicted_severity, user):
+    correction = SeverityCorrection.objects.create(
+        bug=bug,
+        description=bug.description or "",
+        predicted_severity=predicted_severity,
+        severity=bug.severity,
+        corrected_by=user,
+    )
+    transaction.on_commit(lambda: _learner.submit(_apply_in_background))
+    return correction
+
+
+def _apply_in_background():
+    close_old_connections()
+    try:
+        apply_corrections()
+    except Exception:
+        logger.exception("could not learn from severity corrections")
+    finally:
+        close_old_connections()
+
+
+def min_corrections():
+    # one example is not a model: without a trained model, wait for enough
+    # corrections and keep using the remote predictor meanwhile
+    return getattr(settings, "SEVERITY_MIN_CORRECTIONS", 50)
+
+
+def claim_corrections(limit=500):
+    candidates = (
+        SeverityCorrection.objects.filter(model_version=None)
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+    claimed = []
+    for correction_id in list(candidates):
+        # the conditional update is the lock: a correction is learned by one
+        # process only, as in tasks.claim_tasks
+        updated = SeverityCorrection.objects.filter(
+            pk=correction_id, model_version=None
+        ).update(model_version=LEARNING)
+        if updated:
+            claimed.append(correction_id)
+    return claimed
+
+
+@contextmanager
+def _model_file_lock():
+    # other processes save to the same model file; learn from its newest
+    # version, one process at a time
+    with _learn_lock:
+        path = model_path()
+        if not path:
+            yield
+            return
+        # the default path is a pathlib.Path in a directory made on first save
+        path = os.fspath(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _newest_model():
+    current = get_model()
+    path = model_path()
+    if _file_mtime(path) is not None and _file_mtime(path) != _model_mtime:
+        saved = NaiveBayesModel.load(path)
+        if current is None or saved.version > current.version:
+            return saved
+    return current
+
+
+def apply_corrections():
+    """Update the local model with corrections it has not seen yet."""
+    with _model_file_lock():
+        current = _newest_model()
+        # claims are only ever committed by a learner that died before they
+        # were made in a transaction: learn them again
+        SeverityCorrection.objects.filter(model_version=LEARNING).update(
+            model_version=None
+        )
+        pending = SeverityCorrection.objects.filter(model_version=None)
+        if current is None and pending.count() < min_corrections():
+            return None
+        # the claims are made and settled in one transaction, so a process
+        # that dies while learning leaves nothing claimed
+        with transaction.atomic():
+            claimed = claim_corrections()
+            if not claimed:
+                return current
+            corrections = list(
+                SeverityCorrection.objects.filter(pk__in=claimed).order_by("id")
+            )
+            # learn on a copy so predictions never see a half-updated model
+            model = current.copy() if current else NaiveBayesModel()
+            model.partial_fit(
+                [c.description for c in corrections], [c.severity for c in corrections]
+            )
+            model.version += 1
+            save_and_swap(model)
+            SeverityCorrection.objects.filter(pk__in=claimed).update(
+                model_version=model.version
+            )
+        return model
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _model_lock:
+            if _client is None:
+                _client = PredictorClient(
+                    getattr(
+                        settings,
+                        "SEVERITY_PREDICTOR_URL",
+                        "http://pratiklondhe4.pythonanywhere.com",
+                    ),
+                    connect_timeout=getattr(settings, "PREDICTOR_CONNECT_TIMEOUT", 2.0),
+                    read_timeout=getattr(settings, "PREDICTOR_READ_TIMEOUT", 5.0),
+                    retries=getattr(settings, "PREDICTOR_RETRIES", 2),
+                    breaker=CircuitBreaker(
+                        getattr(settings, "PREDICTOR_BREAKER_THRESHOLD", 5),
+                        getattr(settings, "PREDICTOR_BREAKER_RESET", 30),
+                    ),
+                )
+    return _client
+
+
+def set_client(client):
+    global _client
+    _client = client
+
+
+def remote_severity(desc):
+    return get_client().predict(desc)
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (time.monotonic() + ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+_local_cache = LRUCache(getattr(settings, "PREDICTION_CACHE_SIZE", 1024))
+_stats_lock = threading.Lock()
+cache_stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        cache_stats[name] += 1
+
+
+def cache_info():
+    with _stats_lock:
+        return dict(cache_stats)
+
+
+def clear_prediction_cache():
+    _local_cache.clear()
+    with _stats_lock:
+        for name in cache_stats:
+            cache_stats[name] = 0
+
+
+def normalize_description(desc):
+    return " ".join((desc or "").lower().split())
+
+
+def cache_key(desc, model_choice, prefix=None):
+    text = f"{model_choice}:{normalize_description(desc)}"
+    if prefix is None:
+        prefix = getattr(settings, "PREDICTION_CACHE_PREFIX", "severity:")
+    return prefix + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_version(model):
+    # a retrained model gets a new version, so older entries are never read
+    if model is not None:
+        return f"nb-local-{model.version}"
+    return f"nb-remote-{getattr(settings, 'PREDICTION_CACHE_VERSION', 1)}"
+
+
+def predict_uncached(desc, model):
+    if model is not None:
+        return model.predict(desc)
+    return remote_severity(desc)
+
+
+def get_severity(desc, raise_errors=False, cache_prefix=None):
+    """The predicted severity of `desc`.
+
+    When the remote predictor fails, a request answers DEFAULT_SEVERITY; a
+    caller that can try again later passes raise_errors=True to get the
+    PredictorError instead of a label nobody predicted. `cache_prefix`
+    replaces PREDICTION_CACHE_PREFIX for callers that must not share entries.
+    """
+    model = get_model()
+    if model is None and not getattr(settings, "SEVERITY_REMOTE_FALLBACK", False):
+        return DEFAULT_SEVERITY
+
+    key = cache_key(desc, "nb", cache_prefix)
+    version = cache_version(model)
+    local_key = (version, key)
+
+    severity = _local_cache.get(local_key)
+    if severity is not None:
+        _count("local_hits")
+        return severity
+
+    ttl = getattr(settings, "PREDICTION_CACHE_TTL", 60 * 60 * 24)
+    severity = cache.get(key, version=version)
+    if severity is not None:
+        _count("shared_hits")
+    else:
+        _count("misses")
+        try:
+            severity = predict_uncached(desc, model)
+        except PredictorError:
+            # the predictor failed, or is known to be down and was not asked:
+            # the breaker has counted it; answer the default, don't cache it
+            if raise_errors:
+                raise
+            return DEFAULT_SEVERITY
+        cache.set(key, severity, ttl, version=version)
+    _local_cache.set(local_key, severity, ttl)
+    return severity
+
+
+def get_severities(descs):
+    """Predict a batch of descriptions, used by bulk re-triage."""
+    model = get_model()
+    if model is not None:
+        return model.predict_many(descs)
+    # the remote service has no batch endpoint: reuse the pooled client and
+    # the cache so duplicate descriptions cost one call. An outage raises
+    # PredictorError rather than relabelling the batch with the default.
+    return [get_severity(desc, raise_errors=True) for desc in descs]
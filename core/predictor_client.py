@@ -0,0 +1,134 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .classifier import LABELS
+
+logger = logging.getLogger(__name__)
+
+
+class PredictorError(Exception):
+    pass
+
+
+class CircuitOpenError(PredictorError):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calling the predictor after repeated failures.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    calls are refused for `reset_timeout` seconds; then a single trial call
+    is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def parse_severity(response):
+    # the service answers with a JSON string such as "major\n"
+    try:
+        text = response.json()
+    except ValueError:
+        text = response.text
+    if not isinstance(text, str):
+        raise PredictorError(f"unexpected predictor response {text!r}")
+    label = text.strip().strip('"').strip()
+    if label.endswith("\\n"):
+        label = label[:-2]
+    label = label.strip().lower()
+    if label not in LABELS:
+        raise PredictorError(f"unexpected predictor response {text!r}")
+    return label
+
+
+class PredictorClient:
+    def __init__(
+        self,
+        base_url,
+        connect_timeout=2.0,
+        read_timeout=5.0,
+        retries=2,
+        backoff=0.2,
+        pool_size=10,
+        breaker=None,
+    ):
+        self.url = base_url.rstrip("/") + "/predict"
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        # one keep-alive connection pool shared by every thread of the worker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def predict(self, desc, model_choice="nb"):
+        if not self.breaker.allow():
+            raise CircuitOpenError("remote predictor is unavailable")
+
+        data = {"bug_description": desc, "model_choice": model_choice}
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # full jitter keeps many workers from retrying in lockstep
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            try:
+                r = self.session.post(self.url, json=data, timeout=self.timeout)
+                r.raise_for_status()
+                severity = parse_severity(r)
+            except (requests.RequestException, PredictorError) as e:
+                error = e
+                continue
+            self.breaker.record_success()
+            return severity
+
+        self.breaker.record_failure()
+        logger.warning("remote predictor failed after %s attempts: %s", attempt + 1, error)
+        raise PredictorError(str(error))
+
+    def close(self):
+        self.session.close()
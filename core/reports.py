@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .filters import filter_bugs, filter_params
+from .models import Bug, BugReport
+from .pagination import keyset_rows
+from .pdf import PdfWriter, TableWriter
+from .versions import get_versions, scope_version_names
+
+logger = logging.getLogger(__name__)
+
+# bump when the layout changes, so cached reports are not served any more
+REPORT_LAYOUT_VERSION = 1
+COLUMNS = [
+    ("ID", "id", 7),
+    ("Title", "title", 45),
+    ("Status", "status", 10),
+    ("Priority", "priority", 8),
+    ("Severity", "severity", 9),
+    ("Assigned to", "assigned_to__username", 16),
+    ("Added", "added_date", 10),
+    ("Description", "description_excerpt", 0),
+]
+
+
+def chunk_size():
+    return getattr(settings, "BUG_REPORT_CHUNK_SIZE", 2000)
+
+
+def data_key(user, filters):
+    """Changes whenever the data a report for `user` and `filters` shows does."""
+    names = scope_version_names(user)
+    payload = {
+        "layout": REPORT_LAYOUT_VERSION,
+        "user": user.pk,
+        "project": user.assigned_to_id,
+        "filters": filters,
+        "versions": dict(zip(names, get_versions(names))),
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def request_report(user, params):
+    """A report of the bugs on `user`'s list, reusing one of unchanged data."""
+    filters = filter_params(params)
+    key = data_key(user, filters)
+    existing = (
+        BugReport.objects.filter(requested_by=user, data_key=key)
+        .exclude(status="FAILED")
+        .order_by("-id")
+        .first()
+    )
+    if existing is not None:
+        if existing.status != "DONE" or existing.file.storage.exists(
+            existing.file.name
+        ):
+            return existing
+    return BugReport.objects.create(requested_by=user, filters=filters, data_key=key)
+
+
+def requeue_stale_reports():
+    # reports left RUNNING by a worker that died are picked up again
+    timeout = getattr(settings, "BUG_REPORT_TIMEOUT", 1800)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return BugReport.objects.filter(status="RUNNING", updated_at__lt=cutoff).update(
+        status="QUEUED", updated_at=timezone.now()
+    )
+
+
+def claim_reports(limit):
+    candidates = BugReport.objects.filter(status="QUEUED").order_by("id")
+    claimed = []
+    for report_id in list(candidates.values_list("id", flat=True)[:limit]):
+        # the conditional update is the lock, as for prediction tasks
+        updated = BugReport.objects.filter(pk=report_id, status="QUEUED").update(
+            status="RUNNING", updated_at=timezone.now()
+        )
+        if updated:
+            claimed.append(report_id)
+    return claimed
+
+
+def render_report(report):
+    user = report.requested_by
+    bugs = filter_bugs(Bug.objects.for_user(user), report.filters)
+    fields = [field for _, field, _ in COLUMNS]
+    severity = fields.index("severity")
+    # keyset batches keep memory bounded on MySQL too, see export
+    rows = keyset_rows(bugs.values_list(*fields), chunk_size())
+
+    title = f"Bug report for {user.get_username()}, {timezone.localdate():%Y-%m-%d}"
+    with tempfile.TemporaryFile() as f:
+        pdf = PdfWriter(f)
+        table = TableWriter(pdf, title, [(name, width) for name, _, width in COLUMNS])
+        # rows are streamed into pages; a page is written out once it is full
+        for row in rows:
+            values = ["" if value is None else value for value in row]
+            if row[severity] is None:
+                values[severity] = "PENDING"
+            table.add_row(values)
+        table.close()
+        f.seek(0)
+        report.file.save(f"bugs-{report.pk}.pdf", File(f), save=False)
+    report.rows = table.rows
+    report.pages = len(pdf.page_ids)
+
+
+def run_report(report_id):
+    report = BugReport.objects.select_related("requested_by").get(pk=report_id)
+    try:
+        render_report(report)
+    except Exception as e:
+        logger.exception("report %s failed", report.pk)
+        report.status = "FAILED"
+        report.last_error = str(e)
+        report.save()
+        return False
+    report.status = "DONE"
+    report.last_error = ""
+    report.save()
+    return True
+
+
+def run_pending_reports(limit=5):
+    return [run_report(report_id) for report_id in claim_reports(limit)]
@@ -0,0 +1,183 @@
+import datetime
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import BugDailyRollup, BugEvent
+
+
+def bug_event(kind, bug_id, project_id, old=None, new=None):
+    """An unsaved BugEvent, or None for a change the rollups do not count."""
+    old, new = old or {}, new or {}
+    changed = (
+        kind != "CHANGED"
+        or old.get("status") != new.get("status")
+        or old.get("severity") != new.get("severity")
+    )
+    if not changed:
+        return None
+    return BugEvent(
+        bug_id=bug_id,
+        project_id=project_id,
+        kind=kind,
+        old_status=old.get("status"),
+        new_status=new.get("status"),
+        old_severity=old.get("severity"),
+        new_severity=new.get("severity"),
+    )
+
+
+def record_event(kind, bug_id, project_id, old=None, new=None):
+    event = bug_event(kind, bug_id, project_id, old, new)
+    if event is not None:
+        event.save()
+    return event
+
+
+def _is_open(status):
+    return status != "FIXED"
+
+
+def _apply(event, day_counts, backlog):
+    """Add one event to the day's opened/fixed counts and the running backlog."""
+    old_severity = event.old_severity or ""
+    new_severity = event.new_severity or ""
+    if event.kind == "CREATED":
+        day_counts[new_severity, "opened"] += 1
+    if event.kind != "DELETED" and event.new_status == "FIXED":
+        if event.kind == "CREATED" or event.old_status != "FIXED":
+            day_counts[new_severity, "fixed"] += 1
+    if event.kind != "CREATED" and _is_open(event.old_status):
+        backlog[old_severity] -= 1
+    if event.kind != "DELETED" and _is_open(event.new_status):
+        backlog[new_severity] += 1
+
+
+def _day(dt):
+    return timezone.localtime(dt).date()
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+def rebuild_project(project_id, start_day, end_day=None):
+    """Recompute the rollup rows of one project from `start_day` onwards."""
+    end_day = end_day or timezone.localdate()
+    previous = BugDailyRollup.objects.filter(
+        project_id=project_id, day=start_day - datetime.timedelta(days=1)
+    )
+    backlog = Counter()
+    if previous.exists():
+        for row in previous:
+            backlog[row.severity] = row.backlog
+    else:
+        # no rollup for the day before: replay the whole history up to it
+        earlier = BugEvent.objects.filter(
+            project_id=project_id, created_at__lt=_day_start(start_day)
+        )
+        for event in earlier.order_by("created_at", "id").iterator():
+            _apply(event, Counter(), backlog)
+
+    events = (
+        BugEvent.objects.filter(
+            project_id=project_id, created_at__gte=_day_start(start_day)
+        )
+        .order_by("created_at", "id")
+        .iterator()
+    )
+    event = next(events, None)
+    rows = []
+    day = start_day
+    while day <= end_day:
+        counts = Counter()
+        while event is not None and _day(event.created_at) <= day:
+            _apply(event, counts, backlog)
+            event = next(events, None)
+        severities = {s for s, n in backlog.items() if n} | {s for s, _ in counts}
+        for severity in sorted(severities):
+            rows.append(
+                BugDailyRollup(
+                    project_id=project_id,
+                    day=day,
+                    severity=severity,
+                    opened=counts[severity, "opened"],
+                    fixed=counts[severity, "fixed"],
+                    backlog=backlog[severity],
+                )
+            )
+        day += datetime.timedelta(days=1)
+
+    with transaction.atomic():
+        BugDailyRollup.objects.filter(
+            project_id=project_id, day__gte=start_day
+        ).delete()
+        BugDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def update_rollups(full=False, batch_size=1000):
+    """Fold new events into the rollup table, only touching changed days.
+
+    Events are marked rolled up once counted, so an event whose transaction
+    commits after later events were counted is still picked up next time.
+    Returns the number of projects that were recomputed.
+    """
+    # read before rebuilding: an event committed meanwhile stays pending
+    pending = list(
+        BugEvent.objects.filter(rolled_up=False).values_list(
+            "id", "project_id", "created_at"
+        )
+    )
+    if full:
+        changed = BugEvent.objects.values("project_id").annotate(
+            first=Min("created_at")
+        )
+        starts = {row["project_id"]: row["first"] for row in changed}
+    else:
+        starts = {}
+        for _, project_id, created_at in pending:
+            if project_id not in starts or created_at < starts[project_id]:
+                starts[project_id] = created_at
+    if not starts:
+        return 0
+
+    for project_id, first in starts.items():
+        if full:
+            BugDailyRollup.objects.filter(project_id=project_id).delete()
+        rebuild_project(project_id, _day(first))
+
+    event_ids = [event_id for event_id, _, _ in pending]
+    for i in range(0, len(event_ids), batch_size):
+        BugEvent.objects.filter(id__in=event_ids[i : i + batch_size]).update(
+            rolled_up=True
+        )
+    return len(starts)
+
+
+def trend(project_id=None, days=365):
+    """Daily opened/fixed totals and backlog per severity, oldest day first."""
+    end = timezone.localdate()
+    start = end - datetime.timedelta(days=days - 1)
+    rows = BugDailyRollup.objects.filter(day__gte=start, day__lte=end)
+    if project_id is not None:
+        rows = rows.filter(project_id=project_id)
+    labels = [start + datetime.timedelta(days=i) for i in range(days)]
+    index = {day: i for i, day in enumerate(labels)}
+    opened, fixed = [0] * days, [0] * days
+    backlog = {}
+    for day, severity, n_opened, n_fixed, n_backlog in rows.values_list(
+        "day", "severity", "opened", "fixed", "backlog"
+    ):
+        i = index[day]
+        opened[i] += n_opened
+        fixed[i] += n_fixed
+        backlog.setdefault(severity or "PENDING", [0] * days)[i] += n_backlog
+    return {
+        "labels": [day.isoformat() for day in labels],
+        "opened": opened,
+        "fixed": fixed,
+        "backlog": backlog,
+    }
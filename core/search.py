@@ -0,0 +1,154 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Bug, Comments
+
+# Full-text index over bug titles, descriptions and comments. It lives in its
+# own table, created by migration 0024: an FTS5 virtual table keyed by rowid
+# on SQLite, a table with a FULLTEXT index keyed by bug_id on MySQL. Other
+# databases get a plain table and search falls back to icontains.
+TABLE = "core_bugsearch"
+# how much more a match in the title counts than one in the body (SQLite)
+TITLE_WEIGHT = 10.0
+MAX_TERMS = 10
+INDEXED_FIELDS = ["title", "description"]
+
+WORD_RE = re.compile(r"\w+")
+# MySQL leaves words shorter than innodb_ft_min_token_size (ft_min_word_len
+# for MyISAM) and the default InnoDB stopwords out of its index
+MYSQL_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or "
+    "that the this to was what when where who will with und www".split()
+)
+
+
+def _id_column():
+    return "rowid" if connection.vendor == "sqlite" else "bug_id"
+
+
+def index_rows(rows):
+    """Add (bug_id, title, body) rows to the index."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {TABLE} ({_id_column()}, title, body) VALUES (%s, %s, %s)",
+            list(rows),
+        )
+
+
+def remove_bugs(bug_ids):
+    bug_ids = list(bug_ids)
+    if not bug_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(bug_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE {_id_column()} IN ({placeholders})", bug_ids
+        )
+
+
+def documents(bug_ids):
+    """The (bug_id, title, body) rows to index for `bug_ids`."""
+    bodies = {}
+    for bug_id, title, description in Bug.objects.filter(pk__in=bug_ids).values_list(
+        "id", "title", "description"
+    ):
+        bodies[bug_id] = (title, [description or ""])
+    comments = Comments.objects.filter(bug_id__in=bodies).order_by("id")
+    for bug_id, text in comments.values_list("bug_id", "text"):
+        bodies[bug_id][1].append(text)
+    return [
+        (bug_id, title, "\n".join(body)) for bug_id, (title, body) in bodies.items()
+    ]
+
+
+def index_bugs(bug_ids):
+    bug_ids = list(bug_ids)
+    remove_bugs(bug_ids)
+    index_rows(documents(bug_ids))
+
+
+def index_bug(bug_id):
+    index_bugs([bug_id])
+
+
+def rebuild_index(batch_size=1000):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    count = 0
+    ids = Bug.objects.order_by("id").values_list("id", flat=True)
+    batch = []
+    for bug_id in ids.iterator(chunk_size=batch_size):
+        batch.append(bug_id)
+        if len(batch) == batch_size:
+            index_rows(documents(batch))
+            count += len(batch)
+            batch = []
+    if batch:
+        index_rows(documents(batch))
+        count += len(batch)
+    return count
+
+
+def terms(query):
+    return WORD_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def mysql_indexed(word):
+    min_size = getattr(settings, "SEARCH_MYSQL_MIN_TOKEN_SIZE", 3)
+    return len(word) >= min_size and word not in MYSQL_STOPWORDS
+
+
+def match_expression(words):
+    # every word is required; the last one may be a prefix of a longer word.
+    # Quoting keeps user input from being parsed as query syntax.
+    if connection.vendor == "sqlite":
+        parts = [f'"{word}"' for word in words]
+    else:
+        # a word MySQL does not index would never match: it only adds to
+        # the rank if it can
+        parts = [f"+{word}" if mysql_indexed(word) else word for word in words]
+    parts[-1] += "*"
+    return " ".join(parts)
+
+
+def contains_all(bugs, words):
+    condition = Q()
+    for word in words:
+        condition &= Q(title__icontains=word) | Q(description__icontains=word)
+    return bugs.filter(condition)
+
+
+def search(bugs, query):
+    """Filter `bugs` down to matches of `query`, best match first."""
+    words = terms(query)
+    if not words:
+        return bugs.none()
+
+    vendor = connection.vendor
+    match = match_expression(words)
+    join = f"{TABLE}.{_id_column()} = {Bug._meta.db_table}.id"
+    # joined rather than filtered with a subquery, so the index is searched
+    # once per query and the rank comes from the same scan
+    if vendor == "sqlite":
+        condition = f"{TABLE} MATCH %s"
+        # bm25() is lower for better matches
+        rank = f"-bm25({TABLE}, {TITLE_WEIGHT}, 1.0)"
+        rank_params = []
+    elif vendor == "mysql" and any(mysql_indexed(word) for word in words):
+        condition = "MATCH (title, body) AGAINST (%s IN BOOLEAN MODE)"
+        rank = condition
+        rank_params = [match]
+    else:
+        # also for queries made only of words MySQL does not index
+        return contains_all(bugs, words)
+
+    return bugs.extra(
+        tables=[TABLE],
+        where=[join, condition],
+        params=[match],
+        select={"search_rank": rank},
+        select_params=rank_params,
+    ).order_by("-search_rank", "-id")
@@ -0,0 +1,170 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+
+from .storage import ContentAddressedStorage
+
+# Files under MEDIA_ROOT are only reachable through views that check access
+# first. Those views then hand the transfer to the front-end server, so no
+# Python worker is tied up by a large download:
+#
+#   MEDIA_SERVER = "x-accel-redirect"  nginx; MEDIA_ACCEL_REDIRECT_PREFIX
+#       (default "/protected/") must be an internal location aliased to
+#       MEDIA_ROOT
+#   MEDIA_SERVER = "x-sendfile"  Apache mod_xsendfile, lighttpd
+#   MEDIA_SERVER = "django"  the default: the view sends the file itself,
+#       honouring ETag and Range; WSGI servers with wsgi.file_wrapper
+#       (gunicorn, uWSGI) send it with sendfile()
+
+MODES = {"django", "x-accel-redirect", "x-sendfile"}
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def media_server():
+    mode = getattr(settings, "MEDIA_SERVER", "django")
+    if mode not in MODES:
+        raise ValueError(f"MEDIA_SERVER must be one of {sorted(MODES)}")
+    return mode
+
+
+def accel_redirect_prefix():
+    return getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected/")
+
+
+def file_etag(name, stat):
+    # content-addressed files never change; others are told apart by their
+    # size and modification time
+    digest = ContentAddressedStorage.digest(name)
+    if digest:
+        return f'"{digest}"'
+    return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def content_disposition(filename, as_attachment):
+    disposition = "attachment" if as_attachment else "inline"
+    try:
+        filename.encode("ascii")
+        return '{}; filename="{}"'.format(disposition, filename.replace('"', ""))
+    except UnicodeEncodeError:
+        return "{}; filename*=utf-8''{}".format(disposition, quote(filename))
+
+
+def byte_range(header, size):
+    """(first, last) of a single "bytes=" range, None to send everything,
+    or False if the range cannot be satisfied.
+
+    Several ranges in one request are answered with the whole file, which
+    the specification allows.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # the final `last` bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        return False
+    return first, last
+
+
+class FileRange:
+    """The bytes first..last of an open file, read like the file.
+
+    fileno() is the file's own and the file is positioned at `first`, so a
+    WSGI server that sends files with sendfile() sends the range with it.
+    """
+
+    def __init__(self, f, first, last):
+        self.f = f
+        self.f.seek(first)
+        self.remaining = last - first + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+
+def serve_file(
+    request, storage, name, content_type=None, filename=None, as_attachment=False
+):
+    """Send the stored file `name`, after the caller has checked access."""
+    filename = filename or os.path.basename(name)
+    content_type = (
+        content_type
+        or mimetypes.guess_type(filename)[0]
+        or "application/octet-stream"
+    )
+    disposition = content_disposition(filename, as_attachment)
+    mode = media_server()
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        # checked before a hand-off too, so the front-end server is never
+        # sent after a file that is gone
+        raise Http404("the file is missing")
+
+    if mode != "django":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Disposition"] = disposition
+        if mode == "x-accel-redirect":
+            response["X-Accel-Redirect"] = accel_redirect_prefix() + quote(name)
+        else:
+            response["X-Sendfile"] = path
+        return response
+
+    etag = file_etag(name, stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    requested = None
+    if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+        requested = byte_range(request.headers["Range"], stat.st_size)
+    if requested is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+
+    f = open(path, "rb")
+    if requested:
+        first, last = requested
+        response = FileResponse(FileRange(f, first, last), status=206)
+        response["Content-Range"] = f"bytes {first}-{last}/{stat.st_size}"
+        response["Content-Length"] = last - first + 1
+    else:
+        response = FileResponse(f)
+        response["Content-Length"] = stat.st_size
+    response["Content-Type"] = content_type
+    response["Content-Disposition"] = disposition
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,115 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import rollups, search, stats, thumbnails
+from .models import Bug, BugMedia, Comments, User
+from .versions import (
+    bug_detail_version_name,
+    bug_version_names,
+    bump_versions,
+    member_version_names,
+)
+
+
+@receiver(pre_save, sender=Bug)
+def bug_saving(sender, instance, **kwargs):
+    instance._stored_values = stats.stored_values(instance)
+
+
+@receiver(post_save, sender=Bug)
+def bug_saved(sender, instance, **kwargs):
+    old_values = instance._stored_values
+    bump_versions(bug_version_names(instance, old_values or {}))
+    new_values = stats.counted_values(instance)
+    stats.apply_deltas(stats.bug_deltas(old_values, new_values))
+    rollups.record_event(
+        "CHANGED" if old_values else "CREATED",
+        instance.pk,
+        instance.project_id,
+        old_values,
+        new_values,
+    )
+    loaded = getattr(instance, "_loaded_values", {})
+    # a deferred field was not changed, and loading it could mean megabytes
+    deferred = instance.get_deferred_fields()
+    text = {
+        field: getattr(instance, field)
+        for field in search.INDEXED_FIELDS
+        if field not in deferred
+    }
+    if old_values is None or any(
+        field not in loaded or loaded[field] != value for field, value in text.items()
+    ):
+        search.index_bug(instance.pk)
+    # later saves of this instance must diff against what is stored now
+    instance._loaded_values = {**loaded, **new_values, **text}
+
+
+@receiver(pre_delete, sender=Bug)
+def bug_deleting(sender, instance, **kwargs):
+    instance._stored_values = stats.stored_values(instance)
+
+
+@receiver(post_delete, sender=Bug)
+def bug_deleted(sender, instance, **kwargs):
+    old_values = instance._stored_values or stats.counted_values(instance)
+    bump_versions(bug_version_names(instance, old_values))
+    stats.apply_deltas(stats.bug_deltas(old_values, None))
+    rollups.record_event("DELETED", instance.pk, old_values["project_id"], old_values)
+    search.remove_bugs([instance.pk])
+    # its comments were deleted first; there is nothing left to reindex
+    commented_bug_ids().discard(instance.pk)
+
+
+# bugs whose comments changed in this thread, reindexed and their list stamps
+# bumped once when the transaction commits, however many comments changed
+_commented = threading.local()
+
+
+def commented_bug_ids():
+    if not hasattr(_commented, "bug_ids"):
+        _commented.bug_ids = set()
+    return _commented.bug_ids
+
+
+def index_commented_bugs():
+    bug_ids = commented_bug_ids()
+    if not bug_ids:
+        # already done by an earlier callback of the same transaction
+        return
+    _commented.bug_ids = set()
+    bugs = Bug.objects.filter(pk__in=bug_ids).only(
+        "project_id", "assigned_to_id", "submitted_by_id"
+    )
+    bump_versions(set().union(*(bug_version_names(bug, {}) for bug in bugs)))
+    search.index_bugs(bug_ids)
+
+
+@receiver(post_save, sender=Comments)
+@receiver(post_delete, sender=Comments)
+def comment_changed(sender, instance, **kwargs):
+    # comments are shown on the detail page and matched by the list's search
+    bump_versions([bug_detail_version_name(instance.bug_id)])
+    commented_bug_ids().add(instance.bug_id)
+    transaction.on_commit(index_commented_bugs)
+
+
+@receiver(post_save, sender=BugMedia)
+@receiver(post_delete, sender=BugMedia)
+def media_changed(sender, instance, **kwargs):
+    bump_versions([bug_detail_version_name(instance.bug_id)])
+
+
+@receiver(post_save, sender=BugMedia)
+def media_saved(sender, instance, created, **kwargs):
+    if created:
+        thumbnails.schedule([instance])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    bump_versions(member_version_names(instance))
@@ -0,0 +1,138 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Bug, ProjectStats
+
+# ProjectStats dimension -> Bug field it counts; "total" counts every bug
+DIMENSIONS = {
+    "status": "status",
+    "priority": "priority",
+    "severity": "severity",
+    "assignee": "assigned_to_id",
+}
+# submitted_by is not counted but the cache stamps need its old value too
+TRACKED_FIELDS = ["project_id", "submitted_by_id"] + list(DIMENSIONS.values())
+
+
+def counted_values(bug):
+    return {field: getattr(bug, field) for field in TRACKED_FIELDS}
+
+
+def stored_values(bug):
+    """The tracked values of `bug` as they are in the database, or None.
+
+    Called while the bug is saved or deleted, in that transaction: the row
+    is locked, so a concurrent change waits and then counts from this one's
+    values rather than from what both loaded.
+    """
+    if bug._state.adding:
+        return None
+    return (
+        Bug.objects.select_for_update()
+        .filter(pk=bug.pk)
+        .values(*TRACKED_FIELDS)
+        .first()
+    )
+
+
+def _keys(values):
+    project_id = values["project_id"]
+    yield project_id, "total", ""
+    for dimension, field in DIMENSIONS.items():
+        value = values[field]
+        yield project_id, dimension, "" if value is None else str(value)
+
+
+def bug_deltas(old, new):
+    deltas = Counter()
+    if old:
+        for key in _keys(old):
+            deltas[key] -= 1
+    if new:
+        for key in _keys(new):
+            deltas[key] += 1
+    return deltas
+
+
+def apply_deltas(deltas):
+    for (project_id, dimension, value), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        rows = ProjectStats.objects.filter(
+            project_id=project_id, dimension=dimension, value=value
+        )
+        if rows.update(count=F("count") + delta):
+            continue
+        try:
+            with transaction.atomic():
+                ProjectStats.objects.create(
+                    project_id=project_id, dimension=dimension, value=value, count=delta
+                )
+        except IntegrityError:
+            # somebody else created the row first
+            rows.update(count=F("count") + delta)
+
+
+def compute_stats(project_ids=None):
+    bugs = Bug.objects.all()
+    if project_ids is not None:
+        bugs = bugs.filter(project_id__in=project_ids)
+    counts = Counter()
+    for row in bugs.values("project_id").annotate(n=Count("id")):
+        counts[(row["project_id"], "total", "")] = row["n"]
+    for dimension, field in DIMENSIONS.items():
+        for row in bugs.values("project_id", field).annotate(n=Count("id")):
+            value = "" if row[field] is None else str(row[field])
+            counts[(row["project_id"], dimension, value)] = row["n"]
+    return counts
+
+
+def stored_stats(project_ids=None):
+    rows = ProjectStats.objects.all()
+    if project_ids is not None:
+        rows = rows.filter(project_id__in=project_ids)
+    return Counter(
+        {
+            (row.project_id, row.dimension, row.value): row.count
+            for row in rows
+            if row.count
+        }
+    )
+
+
+def rebuild_stats(project_ids=None):
+    with transaction.atomic():
+        rows = ProjectStats.objects.all()
+        if project_ids is not None:
+            rows = rows.filter(project_id__in=project_ids)
+        rows.delete()
+        counts = compute_stats(project_ids)
+        ProjectStats.objects.bulk_create(
+            ProjectStats(project_id=p, dimension=d, value=v, count=n)
+            for (p, d, v), n in counts.items()
+        )
+    return counts
+
+
+def check_stats(project_ids=None):
+    """Return {key: (stored, actual)} for every counter that is wrong."""
+    actual = compute_stats(project_ids)
+    stored = stored_stats(project_ids)
+    return {
+        key: (stored[key], actual[key])
+        for key in set(actual) | set(stored)
+        if stored[key] != actual[key]
+    }
+
+
+def project_counts(project_id=None):
+    """Counters of one project, or summed over all, as {(dimension, value): n}."""
+    rows = ProjectStats.objects.all()
+    if project_id is not None:
+        rows = rows.filter(project_id=project_id)
+    counts = Counter()
+    for dimension, value, count in rows.values_list("dimension", "value", "count"):
+        counts[(dimension, value)] += count
+    return counts
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+from . import logs
+
+# Content-addressed file storage: an upload is stored under the SHA-256 of its
+# content, so the same screenshot or log attached to many bugs is stored once.
+# The rows pointing at a file are its references; clean_media deletes the
+# files no row points at any more. Logs are stored block compressed, see
+# core/logs.py; their digest is still that of the uploaded content.
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+COMPRESSED_EXTENSIONS = {".log"}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # the name is only a hint for the directory and extension; _save
+        # picks the real one, and the same content may already be there
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        temp_directory = self.path(directory)
+        os.makedirs(temp_directory, exist_ok=True)
+
+        # hash (and compress) while writing, so the upload is read once
+        digest = hashlib.sha256()
+        compress = extension in COMPRESSED_EXTENSIONS
+        fd, temp_path = tempfile.mkstemp(dir=temp_directory, suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer = logs.BlockWriter(f) if compress else f
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    writer.write(chunk)
+                index = writer.close() if compress else None
+            if compress:
+                extension += ".gz"
+            name = self.digest_name(directory, digest.hexdigest(), extension)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                # clean_media keeps recent files: the row about to refer to
+                # this one may not be committed yet
+                touch = [path, logs.index_name(path)] if compress else [path]
+                for touched in touch:
+                    try:
+                        os.utime(touched)
+                    except FileNotFoundError:
+                        pass
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                if index is not None:
+                    logs.write_index(path, index)
+                # atomic; a concurrent upload of the same content writes the
+                # same bytes
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    @staticmethod
+    def digest_name(directory, digest, extension=""):
+        # fanned out over two levels so no directory gets too large
+        return "/".join(
+            part
+            for part in (directory, digest[:2], digest[2:4], digest + extension)
+            if part
+        )
+
+    @staticmethod
+    def digest(name):
+        """The digest a file was stored under, or "" for older files."""
+        # also for the .log.gz of a log and its .log.gz.idx
+        digest = os.path.basename(name or "").split(".")[0]
+        return digest if DIGEST_RE.match(digest) else ""
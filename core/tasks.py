@@ -0,0 +1,134 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Min
+from django.utils import timezone
+
+from .models import SEVERITY_MAP, PredictionTask
+from .prediction import DEFAULT_SEVERITY, get_severity
+
+logger = logging.getLogger(__name__)
+
+
+def max_attempts():
+    return getattr(settings, "PREDICTION_TASK_MAX_ATTEMPTS", 5)
+
+
+def backoff_delay(attempts):
+    # exponential backoff: base, 2*base, 4*base, ... capped at max
+    base = getattr(settings, "PREDICTION_TASK_BACKOFF", 2)
+    cap = getattr(settings, "PREDICTION_TASK_MAX_BACKOFF", 300)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+def async_prediction_enabled():
+    return getattr(settings, "SEVERITY_PREDICTION_MODE", "sync") == "async"
+
+
+def enqueue_prediction(bug):
+    return PredictionTask.objects.create(bug=bug)
+
+
+def requeue_stale_tasks():
+    # tasks left RUNNING by a worker that died are picked up again
+    timeout = getattr(settings, "PREDICTION_TASK_TIMEOUT", 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return PredictionTask.objects.filter(
+        status="RUNNING", updated_at__lt=cutoff
+    ).update(status="QUEUED", updated_at=timezone.now())
+
+
+def claim_tasks(limit, now=None):
+    now = now or timezone.now()
+    candidates = PredictionTask.objects.filter(
+        status="QUEUED", run_after__lte=now
+    ).order_by("run_after", "id").values_list("id", flat=True)[:limit]
+
+    claimed = []
+    for task_id in list(candidates):
+        # the conditional update is the lock: only one worker can flip a
+        # task from QUEUED to RUNNING
+        updated = PredictionTask.objects.filter(pk=task_id, status="QUEUED").update(
+            status="RUNNING", attempts=F("attempts") + 1, updated_at=timezone.now()
+        )
+        if updated:
+            claimed.append(task_id)
+    return claimed
+
+
+def run_task(task_id):
+    task = PredictionTask.objects.select_related("bug").get(pk=task_id)
+    bug = task.bug
+    try:
+        # a predictor outage is retried, not answered with the default
+        severity = SEVERITY_MAP.get(get_severity(bug.description, raise_errors=True))
+        if severity is None:
+            raise ValueError("predictor returned an unknown severity")
+    except Exception as e:
+        logger.warning("severity prediction for bug %s failed: %s", bug.pk, e)
+        task.last_error = str(e)
+        if task.attempts >= max_attempts():
+            task.status = "FAILED"
+            set_severity(bug, SEVERITY_MAP[DEFAULT_SEVERITY])
+        else:
+            task.status = "QUEUED"
+            task.run_after = timezone.now() + backoff_delay(task.attempts)
+        task.save()
+        return False
+
+    set_severity(bug, severity)
+    task.status = "DONE"
+    task.last_error = ""
+    task.save()
+    return True
+
+
+def set_severity(bug, severity):
+    # do not overwrite a severity somebody set by hand in the meantime
+    bug.refresh_from_db(fields=["severity"])
+    if bug.severity is None:
+        bug.severity = severity
+        bug.save(update_fields=["severity"])
+
+
+def _run_in_thread(task_id):
+    close_old_connections()
+    try:
+        return run_task(task_id)
+    finally:
+        close_old_connections()
+
+
+def run_pending(limit=50, workers=1, now=None):
+    task_ids = claim_tasks(limit, now=now)
+    if workers <= 1:
+        return [run_task(task_id) for task_id in task_ids]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_in_thread, task_ids))
+
+
+def drain(include_delayed=True):
+    """Run every queued task in the current thread, used by tests."""
+    processed = 0
+    while True:
+        now = None
+        if include_delayed:
+            now = timezone.now() + timedelta(days=365)
+        results = run_pending(limit=100, now=now)
+        if not results:
+            return processed
+        processed += len(results)
+
+
+def backlog():
+    queued = PredictionTask.objects.filter(status="QUEUED")
+    oldest = queued.aggregate(oldest=Min("created_at"))["oldest"]
+    return {
+        "queued": queued.count(),
+        "running": PredictionTask.objects.filter(status="RUNNING").count(),
+        "failed": PredictionTask.objects.filter(status="FAILED").count(),
+        "oldest_age": (timezone.now() - oldest).total_seconds() if oldest else 0,
+    }
@@ -1,3 +1,2219 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import re
+import shutil
+import zlib
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from core import (
+    fragments,
+    logs,
+    prediction,
+    reports,
+    rollups,
+    search,
+    stats,
+    tasks,
+    thumbnails,
+    views,
+)
+from core.classifier import NaiveBayesModel
+from core.forms import AddBugForm, UpdateBugForm
+from core.pagination import CursorPaginator
+from core.models import (
+    EXCERPT_LENGTH,
+    Bug,
+    BugDailyRollup,
+    BugEvent,
+    BugMedia,
+    BugReport,
+    Comments,
+    PredictionTask,
+    Project,
+    ProjectStats,
+    SeverityCorrection,
+    User,
+)
+from core.predictor_client import CircuitBreaker, PredictorClient, PredictorError
+from PIL import Image
+
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+TRAINING_ROWS = [
+    ("app crashes on startup and all data is lost", "BLOCKER"),
+    ("server crash loses user data on every request", "BLOCKER"),
+    ("payment page throws exception and checkout fails", "CRITICAL"),
+    ("login fails with exception for all users", "CRITICAL"),
+    ("search results load slowly on the list page", "MAJOR"),
+    ("export button does nothing on large projects", "MAJOR"),
+    ("button label is misaligned on the settings page", "MINOR"),
+    ("typo in footer text on the about page", "MINOR"),
+    ("tooltip shows the wrong date format", "NORMAL"),
+    ("profile picture upload shows a generic error", "NORMAL"),
+]
+
+
+class ProjectTestCase(TestCase):
+    """A project with its owner, who is logged in."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.create(name="Test Project")
+        cls.owner = User.objects.create_user(
+            username="owner",
+            password="password",
+            email="owner@mail.com",
+            role="O",
+            assigned_to=cls.project,
+            isVerified=True,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+
+class SeverityClassifierTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tmpdir.name, "model.json")
+        prediction.set_model(None)
+        prediction.clear_prediction_cache()
+        cache.clear()
+
+    def tearDown(self):
+        prediction.set_model(None)
+        self.tmpdir.cleanup()
+
+    def test_train_save_and_lazy_load(self):
+        with override_settings(SEVERITY_MODEL_PATH=self.model_path):
+            prediction.train_model(TRAINING_ROWS)
+            self.assertTrue(os.path.exists(self.model_path))
+
+            prediction.set_model(None)
+            self.assertEqual(prediction.get_severity("the app crashes"), "blocker")
+            self.assertEqual(prediction.get_severity("typo in the footer"), "minor")
+
+    def test_scoring_is_fast(self):
+        model = NaiveBayesModel().fit(*zip(*TRAINING_ROWS))
+        model.predict("warm up")
+        start = time.perf_counter()
+        for _ in range(1000):
+            model.predict("checkout fails with an exception on the payment page")
+        self.assertLess((time.perf_counter() - start) / 1000, 0.001)
+
+    def test_without_model_falls_back_to_normal(self):
+        with override_settings(
+            SEVERITY_MODEL_PATH=self.model_path, SEVERITY_REMOTE_FALLBACK=False
+        ):
+            self.assertEqual(prediction.get_severity("anything"), "normal")
+
+
+@override_settings(SEVERITY_PREDICTION_MODE="async", PREDICTION_TASK_MAX_ATTEMPTS=2)
+class AsyncPredictionTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        prediction.set_model(NaiveBayesModel().fit(*zip(*TRAINING_ROWS)))
+        prediction.clear_prediction_cache()
+        cache.clear()
+
+    def tearDown(self):
+        prediction.set_model(None)
+
+    def submit_bug(self):
+        form = AddBugForm(
+            self.owner,
+            data={
+                "title": "Crash",
+                "description": "app crashes on startup and data is lost",
+                "status": "NEW",
+                "priority": "HIGH",
+                "submitted_by": self.owner.pk,
+                "project": self.project.pk,
+                "is_predicted": True,
+            },
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_bug_is_saved_pending_and_filled_in_by_worker(self):
+        bug = self.submit_bug()
+        self.assertIsNone(bug.severity)
+        self.assertEqual(tasks.backlog()["queued"], 1)
+
+        self.assertEqual(tasks.drain(), 1)
+        bug.refresh_from_db()
+        self.assertEqual(bug.severity, "BLOCKER")
+        self.assertEqual(tasks.backlog()["queued"], 0)
+
+    def test_failed_prediction_is_retried_with_backoff(self):
+        bug = self.submit_bug()
+        prediction.set_model(None)
+        with StubPredictorServer(fail_first=100) as stub:
+            client = PredictorClient(
+                stub.url,
+                retries=0,
+                breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60),
+            )
+            prediction.set_client(client)
+            self.addCleanup(prediction.set_client, None)
+            self.addCleanup(client.close)
+            remote = self.settings(
+                SEVERITY_REMOTE_FALLBACK=True, SEVERITY_MODEL_PATH=None
+            )
+            with remote, self.assertLogs("core", "WARNING"):
+                self.assertEqual(tasks.run_pending(), [False])
+                task = PredictionTask.objects.get(bug=bug)
+                self.assertEqual(task.status, "QUEUED")
+                self.assertGreater(task.run_after, task.created_at)
+                # nothing is due until the backoff has passed
+                self.assertEqual(tasks.run_pending(), [])
+
+                # the open breaker fails the retry without asking
+                tasks.drain()
+        task.refresh_from_db()
+        bug.refresh_from_db()
+        self.assertEqual(task.status, "FAILED")
+        self.assertEqual(task.attempts, 2)
+        self.assertEqual(bug.severity, "NORMAL")
+        self.assertEqual(stub.requests, 1)
+
+
+class PredictionCacheTestCase(TestCase):
+    def setUp(self):
+        self.model = NaiveBayesModel(version=1).fit(*zip(*TRAINING_ROWS))
+        prediction.set_model(self.model)
+        prediction.clear_prediction_cache()
+        cache.clear()
+
+    def tearDown(self):
+        prediction.set_model(None)
+
+    def test_normalized_descriptions_share_one_prediction(self):
+        with mock.patch.object(self.model, "predict", return_value="major") as predict:
+            prediction.get_severity("Export button does nothing")
+            prediction.get_severity("  export   button DOES nothing ")
+            self.assertEqual(predict.call_count, 1)
+        self.assertEqual(
+            prediction.cache_info(), {"local_hits": 1, "shared_hits": 0, "misses": 1}
+        )
+
+    def test_shared_cache_is_used_after_local_eviction(self):
+        prediction.get_severity("typo in the footer")
+        prediction._local_cache.clear()
+        prediction.get_severity("typo in the footer")
+        self.assertEqual(prediction.cache_info()["shared_hits"], 1)
+
+    def test_new_model_version_invalidates_entries(self):
+        prediction.get_severity("typo in the footer")
+        prediction.set_model(NaiveBayesModel(version=2).fit(*zip(*TRAINING_ROWS)))
+        prediction.get_severity("typo in the footer")
+        self.assertEqual(prediction.cache_info()["misses"], 2)
+
+
+class StubPredictorServer:
+    """Local stand-in for the remote predictor that can be slow or broken."""
+
+    def __init__(self, answer="major\n", delay=0, fail_first=0, status=500):
+        self.answer = answer
+        self.delay = delay
+        self.fail_first = fail_first
+        self.status = status
+        self.requests = 0
+        self.connections = 0
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                stub.connections += 1
+                super().setup()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests += 1
+                time.sleep(stub.delay)
+                if stub.requests <= stub.fail_first:
+                    status, body = stub.status, b"error"
+                else:
+                    status, body = 200, json.dumps(stub.answer).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up waiting, which is what timeouts are for
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PredictorClientTestCase(TestCase):
+    def test_parses_answer_and_reuses_connection(self):
+        with StubPredictorServer() as stub:
+            client = PredictorClient(stub.url)
+            for _ in range(3):
+                self.assertEqual(client.predict("export is broken"), "major")
+            client.close()
+        self.assertEqual(stub.connections, 1)
+
+    def test_retries_transient_errors(self):
+        with StubPredictorServer(fail_first=2) as stub:
+            client = PredictorClient(stub.url, retries=2, backoff=0.01)
+            self.assertEqual(client.predict("export is broken"), "major")
+            client.close()
+        self.assertEqual(stub.requests, 3)
+
+    def test_hung_upstream_is_time_bounded(self):
+        with StubPredictorServer(delay=2) as stub:
+            client = PredictorClient(stub.url, read_timeout=0.2, retries=1, backoff=0.01)
+            start = time.perf_counter()
+            with self.assertLogs("core.predictor_client", "WARNING"):
+                self.assertRaises(PredictorError, client.predict, "export is broken")
+            self.assertLess(time.perf_counter() - start, 1)
+            client.close()
+
+    def test_open_breaker_falls_back_to_normal_immediately(self):
+        with StubPredictorServer(delay=0.5) as stub:
+            client = PredictorClient(
+                stub.url,
+                read_timeout=0.1,
+                retries=0,
+                breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+            )
+            prediction.set_client(client)
+            prediction.clear_prediction_cache()
+            cache.clear()
+            latencies = []
+            with self.settings(SEVERITY_REMOTE_FALLBACK=True, SEVERITY_MODEL_PATH=None):
+                with self.assertLogs("core.predictor_client", "WARNING"):
+                    for i in range(2):
+                        self.assertEqual(prediction.get_severity(f"bug {i}"), "normal")
+                self.assertEqual(client.breaker.state, "open")
+                for i in range(20):
+                    start = time.perf_counter()
+                    self.assertEqual(prediction.get_severity(f"other bug {i}"), "normal")
+                    latencies.append(time.perf_counter() - start)
+                # callers that can retry are told about the outage instead
+                with self.assertRaises(PredictorError):
+                    prediction.get_severity("another bug", raise_errors=True)
+            prediction.set_client(None)
+            client.close()
+        self.assertEqual(stub.requests, 2)
+        self.assertLess(max(latencies), 0.05)
+
+    def test_failing_predictor_does_not_fail_bug_reports(self):
+        project = Project.objects.create(name="Test Project")
+        user = User.objects.create_user(
+            username="owner",
+            password="password",
+            email="owner@mail.com",
+            role="O",
+            assigned_to=project,
+            isVerified=True,
+        )
+        self.client.force_login(user)
+        with StubPredictorServer(fail_first=100) as stub:
+            client = PredictorClient(
+                stub.url,
+                retries=0,
+                breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60),
+            )
+            prediction.set_client(client)
+            self.addCleanup(prediction.set_client, None)
+            self.addCleanup(client.close)
+            prediction.clear_prediction_cache()
+            cache.clear()
+            with self.settings(SEVERITY_REMOTE_FALLBACK=True, SEVERITY_MODEL_PATH=None):
+                with self.assertLogs("core.predictor_client", "WARNING"):
+                    response = self.client.post(
+                        reverse("add_bug"),
+                        {
+                            "title": "Crash",
+                            "description": "app crashes on startup",
+                            "status": "NEW",
+                            "priority": "HIGH",
+                            "submitted_by": user.pk,
+                            "project": project.pk,
+                            "is_predicted": True,
+                        },
+                    )
+                # the default answer is not cached: the next bug asks again
+                with self.assertLogs("core.predictor_client", "WARNING"):
+                    prediction.get_severity("app crashes on startup")
+
+        self.assertRedirects(response, "/dashboard/bugs/", fetch_redirect_response=False)
+        self.assertEqual(Bug.objects.get().severity, "NORMAL")
+        self.assertEqual(stub.requests, 2)
+        self.assertEqual(client.breaker.failures, 2)
+
+
+class RepredictCommandTestCase(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="Test Project")
+        for i, (description, _) in enumerate(TRAINING_ROWS):
+            Bug.objects.create(
+                title=f"Bug {i}",
+                description=description,
+                project=self.project,
+                priority="LOW",
+                severity="NORMAL",
+            )
+        Bug.objects.create(
+            title="Manual",
+            description="app crashes on startup",
+            project=self.project,
+            priority="LOW",
+            severity="MINOR",
+            is_predicted=False,
+        )
+        prediction.set_model(NaiveBayesModel().fit(*zip(*TRAINING_ROWS)))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmpdir.name, "checkpoint.json")
+
+    def tearDown(self):
+        prediction.set_model(None)
+        self.tmpdir.cleanup()
+
+    def repredict(self, *args):
+        out = StringIO()
+        call_command(
+            "repredict",
+            "--project",
+            str(self.project.id),
+            "--batch-size",
+            "4",
+            "--checkpoint",
+            self.checkpoint,
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_dry_run_reports_changes_without_saving(self):
+        output = self.repredict("--dry-run")
+        self.assertIn("8 severities would change", output)
+        self.assertIn("NORMAL -> BLOCKER: 2", output)
+        self.assertEqual(Bug.objects.filter(severity="NORMAL").count(), 10)
+
+    def test_updates_predicted_bugs_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.repredict()
+        # one bulk UPDATE for each of the two batches of four that changed
+        bug_updates = [q for q in queries if q["sql"].startswith('UPDATE "core_bug"')]
+        self.assertEqual(len(bug_updates), 2)
+        self.assertEqual(Bug.objects.filter(severity="BLOCKER").count(), 2)
+        self.assertEqual(Bug.objects.get(title="Manual").severity, "MINOR")
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_changes_reach_the_backlog_rollup(self):
+        self.repredict()
+        self.assertEqual(BugEvent.objects.filter(kind="CHANGED").count(), 8)
+        rollups.rebuild_project(self.project.id, timezone.localdate())
+        backlog = {
+            row.severity: row.backlog
+            for row in BugDailyRollup.objects.filter(day=timezone.localdate())
+            if row.backlog
+        }
+        expected = Counter(Bug.objects.values_list("severity", flat=True))
+        self.assertEqual(backlog, dict(expected))
+
+    def test_predictor_outage_stops_without_relabelling(self):
+        prediction.set_model(None)
+        prediction.clear_prediction_cache()
+        cache.clear()
+        with StubPredictorServer(fail_first=100) as stub:
+            client = PredictorClient(stub.url, retries=0)
+            prediction.set_client(client)
+            self.addCleanup(prediction.set_client, None)
+            self.addCleanup(client.close)
+            remote = self.settings(
+                SEVERITY_REMOTE_FALLBACK=True, SEVERITY_MODEL_PATH=None
+            )
+            with remote, self.assertLogs("core", "WARNING"):
+                with self.assertRaisesMessage(CommandError, "--resume"):
+                    self.repredict()
+        self.assertEqual(Bug.objects.filter(severity="NORMAL").count(), 10)
+        self.assertFalse(BugEvent.objects.filter(kind="CHANGED").exists())
+
+    def test_resume_skips_bugs_already_processed(self):
+        last = Bug.objects.order_by("id")[4]
+        with open(self.checkpoint, "w") as f:
+            json.dump({str(self.project.id): last.id}, f)
+        output = self.repredict("--resume")
+        self.assertIn("5/5 bugs", output)
+
+
+class OnlineLearningTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            # a Path in a directory that does not exist yet, like the default
+            SEVERITY_MODEL_PATH=Path(self.tmpdir.name) / "ml_models" / "model.json"
+        )
+        self.settings_override.enable()
+        prediction.set_model(None)
+        prediction.train_model(TRAINING_ROWS)
+        prediction.clear_prediction_cache()
+        cache.clear()
+
+        self.bug = Bug.objects.create(
+            title="Flaky",
+            description="websocket reconnect storm after deploy",
+            project=self.project,
+            priority="LOW",
+            severity="NORMAL",
+        )
+
+    def tearDown(self):
+        prediction.set_model(None)
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def test_incremental_update_matches_full_training(self):
+        rows = TRAINING_ROWS + [("websocket reconnect storm", "BLOCKER")]
+        incremental = NaiveBayesModel().fit(*zip(*TRAINING_ROWS))
+        incremental.predict("")
+        incremental.partial_fit(["websocket reconnect storm"], ["BLOCKER"])
+        full = NaiveBayesModel().fit(*zip(*rows))
+        for text, _ in rows:
+            for a, b in zip(incremental.scores(text), full.scores(text)):
+                self.assertAlmostEqual(a, b)
+
+    def test_owner_override_is_learned(self):
+        self.assertNotEqual(prediction.get_severity(self.bug.description), "blocker")
+        form = UpdateBugForm(
+            self.owner,
+            instance=self.bug,
+            data={
+                "title": self.bug.title,
+                "status": "NEW",
+                "priority": "LOW",
+                "severity": "BLOCKER",
+                "is_predicted": True,
+            },
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.bug.refresh_from_db()
+        self.assertFalse(self.bug.is_predicted)
+
+        old_model = prediction.get_model()
+        prediction.apply_corrections()
+        model = prediction.get_model()
+        self.assertIsNot(model, old_model)
+        self.assertEqual(model.version, old_model.version + 1)
+        self.assertEqual(
+            SeverityCorrection.objects.get().model_version, model.version
+        )
+        self.assertEqual(prediction.get_severity(self.bug.description), "blocker")
+
+    def correct(self, description, severity):
+        return SeverityCorrection.objects.create(
+            description=description, predicted_severity="NORMAL", severity=severity
+        )
+
+    def test_no_model_is_made_from_a_few_corrections(self):
+        prediction.set_model(None)
+        os.remove(prediction.model_path())
+        self.correct("typo in footer", "BLOCKER")
+
+        with self.settings(SEVERITY_MIN_CORRECTIONS=2):
+            self.assertIsNone(prediction.apply_corrections())
+            self.assertIsNone(prediction.get_model())
+            self.assertIsNone(SeverityCorrection.objects.get().model_version)
+
+            self.correct("button label is misaligned", "MINOR")
+            model = prediction.apply_corrections()
+        self.assertEqual(model.version, 1)
+        self.assertEqual(
+            set(SeverityCorrection.objects.values_list("model_version", flat=True)),
+            {1},
+        )
+
+    def test_corrections_are_learned_once_on_the_newest_model(self):
+        # another process learned from a correction and saved its model
+        taken = self.correct("websocket reconnect storm", "BLOCKER")
+        self.assertEqual(prediction.claim_corrections(), [taken.pk])
+        newer = prediction.get_model().copy()
+        newer.version += 1
+        newer.save(prediction.model_path())
+        SeverityCorrection.objects.filter(pk=taken.pk).update(
+            model_version=newer.version
+        )
+        self.correct("tooltip flickers", "MINOR")
+
+        model = prediction.apply_corrections()
+
+        self.assertEqual(model.version, newer.version + 1)
+        self.assertEqual(
+            list(
+                SeverityCorrection.objects.order_by("id").values_list(
+                    "model_version", flat=True
+                )
+            ),
+            [newer.version, model.version],
+        )
+
+    def test_corrections_are_kept_when_learning_fails(self):
+        self.correct("websocket reconnect storm", "BLOCKER")
+        # a claim left behind by a learner that died
+        stale = self.correct("tooltip flickers", "MINOR")
+        SeverityCorrection.objects.filter(pk=stale.pk).update(
+            model_version=prediction.LEARNING
+        )
+        with mock.patch.object(NaiveBayesModel, "save", side_effect=OSError):
+            with self.assertRaises(OSError):
+                prediction.apply_corrections()
+        self.assertEqual(
+            set(SeverityCorrection.objects.values_list("model_version", flat=True)),
+            {None},
+        )
+
+        model = prediction.apply_corrections()
+        self.assertEqual(
+            set(SeverityCorrection.objects.values_list("model_version", flat=True)),
+            {model.version},
+        )
+
+    def test_newer_model_on_disk_is_swapped_in(self):
+        current = prediction.get_model()
+        newer = current.copy()
+        newer.version += 1
+        newer.save(prediction.model_path())
+        os.utime(prediction.model_path(), ns=(0, 0))
+
+        for _ in range(100):
+            prediction._next_reload_check = 0
+            if prediction.get_model().version == newer.version:
+                break
+            time.sleep(0.01)
+        self.assertEqual(prediction.get_model().version, newer.version)
+
+
+class BenchmarkPredictorTestCase(TestCase):
+    def test_writes_metrics_for_each_model(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "results.json")
+            call_command(
+                "benchmark_predictor",
+                "--source=faker",
+                "--size=200",
+                "--models=local-nb,majority",
+                f"--output={output}",
+                stdout=StringIO(),
+            )
+            with open(output) as f:
+                results = json.load(f)
+
+        local = results["models"]["local-nb"]
+        self.assertEqual(results["test_size"], 40)
+        self.assertGreater(local["macro_f1"], results["models"]["majority"]["macro_f1"])
+        self.assertEqual(sum(map(sum, local["confusion_matrix"].values())), 40)
+        self.assertIn("p99_ms", local["latency"])
+
+    def test_leaves_the_shared_cache_alone(self):
+        prediction.set_model(NaiveBayesModel().fit(*zip(*TRAINING_ROWS)))
+        self.addCleanup(prediction.set_model, None)
+        cache.set("unrelated", "kept")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "results.json")
+            call_command(
+                "benchmark_predictor",
+                "--source=faker",
+                "--size=50",
+                "--models=get_severity",
+                f"--output={output}",
+                stdout=StringIO(),
+            )
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(cache.get("unrelated"), "kept")
+        cold = results["models"]["get_severity"]["cache"]
+        warm = results["models"]["get_severity_shared_cache"]["cache"]
+        self.assertEqual(cold["shared_hits"], 0)
+        self.assertEqual(warm["misses"], 0)
+        self.assertEqual(warm["shared_hits"], cold["misses"])
+
+
+class DashboardStatsTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for severity, priority in [("MAJOR", "HIGH"), ("MINOR", "LOW"), ("MAJOR", "LOW")]:
+            Bug.objects.create(
+                title="Bug",
+                project=self.project,
+                priority=priority,
+                severity=severity,
+            )
+
+    def aggregate_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard"))
+        return response, [
+            q["sql"]
+            for q in queries
+            if "COUNT(" in q["sql"] or "core_projectstats" in q["sql"]
+        ]
+
+    def test_numbers_come_from_counters(self):
+        response, queries = self.aggregate_queries()
+        # one read of the project counters, one team member count
+        self.assertEqual(len(queries), 2)
+        self.assertFalse([q for q in queries if '"core_bug"' in q])
+        self.assertEqual(response.context["bug_count"], 3)
+        chart = json.loads(response.context["severity_chart"])
+        self.assertEqual(chart["data"]["datasets"][0]["data"], [1, 0, 2, 0, 0])
+        chart = json.loads(response.context["priority_chart"])
+        self.assertEqual(chart["data"]["datasets"][0]["data"], [2, 0, 1])
+
+    def test_warm_cache_needs_no_aggregate_queries(self):
+        self.aggregate_queries()
+        response, queries = self.aggregate_queries()
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context["bug_count"], 3)
+
+    def test_bug_and_user_changes_invalidate(self):
+        self.aggregate_queries()
+        bug = Bug.objects.first()
+        bug.severity = "BLOCKER"
+        bug.save()
+        response, queries = self.aggregate_queries()
+        self.assertEqual(len(queries), 2)
+        chart = json.loads(response.context["severity_chart"])
+        self.assertEqual(chart["data"]["datasets"][0]["data"][4], 1)
+
+        User.objects.create_user(
+            username="member",
+            password="password",
+            email="member@mail.com",
+            role="TM",
+            assigned_to=self.project,
+        )
+        response, queries = self.aggregate_queries()
+        # for_user counts everyone on the project, the owner included
+        self.assertEqual(response.context["tm_count"], 2)
+
+    def test_other_projects_do_not_invalidate(self):
+        self.aggregate_queries()
+        other = Project.objects.create(name="Other Project")
+        Bug.objects.create(title="Elsewhere", project=other, priority="LOW")
+        response, queries = self.aggregate_queries()
+        self.assertEqual(queries, [])
+
+
+class ProjectStatsTestCase(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="Test Project")
+        self.user = User.objects.create_user(
+            username="member", password="password", email="member@mail.com"
+        )
+
+    def counts(self):
+        return stats.project_counts(self.project.id)
+
+    def test_counters_follow_create_update_and_delete(self):
+        bug = Bug.objects.create(
+            title="Bug", project=self.project, priority="LOW", status="NEW"
+        )
+        other = Bug.objects.create(
+            title="Other", project=self.project, priority="LOW", status="NEW"
+        )
+        self.assertEqual(self.counts()[("total", "")], 2)
+        self.assertEqual(self.counts()[("priority", "LOW")], 2)
+
+        bug.priority = "HIGH"
+        bug.assigned_to = self.user
+        bug.save()
+        bug.status = "FIXED"
+        bug.save()
+        counts = self.counts()
+        self.assertEqual(counts[("priority", "LOW")], 1)
+        self.assertEqual(counts[("priority", "HIGH")], 1)
+        self.assertEqual(counts[("status", "FIXED")], 1)
+        self.assertEqual(counts[("assignee", str(self.user.pk))], 1)
+
+        Bug.objects.filter(pk=other.pk).delete()
+        self.assertEqual(self.counts()[("total", "")], 1)
+        self.assertEqual(stats.check_stats(), {})
+
+    def test_edits_from_the_same_loaded_bug_count_from_the_database(self):
+        bug = Bug.objects.create(
+            title="Bug", project=self.project, priority="LOW", status="NEW"
+        )
+        # two requests load the bug, then save one after the other
+        first, second = Bug.objects.get(pk=bug.pk), Bug.objects.get(pk=bug.pk)
+        first.status = "FIXED"
+        first.save()
+        second.status = "OPEN"
+        second.save()
+
+        counts = self.counts()
+        self.assertEqual(counts[("status", "OPEN")], 1)
+        self.assertEqual(counts.get(("status", "FIXED"), 0), 0)
+        self.assertEqual(counts.get(("status", "NEW"), 0), 0)
+        self.assertEqual(stats.check_stats(), {})
+
+    def test_rebuild_and_check_commands(self):
+        Bug.objects.create(title="Bug", project=self.project, priority="LOW")
+        ProjectStats.objects.filter(dimension="total").update(count=5)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_stats", "--check", stdout=StringIO())
+
+        call_command("rebuild_stats", stdout=StringIO())
+        self.assertEqual(self.counts()[("total", "")], 1)
+        call_command("rebuild_stats", "--check", stdout=StringIO())
+
+
+class BugRollupTestCase(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="Test Project")
+        self.today = timezone.localdate()
+
+    def create_bug(self, severity="MAJOR"):
+        return Bug.objects.create(
+            title="Bug",
+            project=self.project,
+            priority="LOW",
+            severity=severity,
+            status="NEW",
+        )
+
+    def move_events(self, days_ago):
+        # pretend the events recorded so far happened `days_ago` days ago
+        BugEvent.objects.filter(project=self.project).update(
+            created_at=timezone.now() - datetime.timedelta(days=days_ago)
+        )
+
+    def rollup(self, day, severity="MAJOR"):
+        return BugDailyRollup.objects.get(
+            project=self.project, day=day, severity=severity
+        )
+
+    def test_events_follow_status_and_severity_changes(self):
+        bug = self.create_bug()
+        bug.title = "Renamed"
+        bug.save()
+        bug.status = "FIXED"
+        bug.save()
+        bug.delete()
+        events = BugEvent.objects.filter(project=self.project).order_by("id")
+        self.assertEqual(
+            [(e.kind, e.old_status, e.new_status) for e in events],
+            [
+                ("CREATED", None, "NEW"),
+                ("CHANGED", "NEW", "FIXED"),
+                ("DELETED", "FIXED", None),
+            ],
+        )
+
+    def test_backlog_is_carried_over_days_without_events(self):
+        first, second = self.create_bug(), self.create_bug("MINOR")
+        self.move_events(3)
+        first.status = "FIXED"
+        first.save()
+        call_command("rollup_bugs", stdout=StringIO())
+
+        start = self.today - datetime.timedelta(days=3)
+        self.assertEqual(self.rollup(start).opened, 1)
+        self.assertEqual(self.rollup(start).backlog, 1)
+        middle = self.today - datetime.timedelta(days=1)
+        self.assertEqual(self.rollup(middle).opened, 0)
+        self.assertEqual(self.rollup(middle).backlog, 1)
+        self.assertEqual(self.rollup(middle, "MINOR").backlog, 1)
+        self.assertEqual(self.rollup(self.today).fixed, 1)
+        self.assertEqual(self.rollup(self.today).backlog, 0)
+
+    def test_only_days_with_new_events_are_recomputed(self):
+        self.create_bug()
+        self.move_events(5)
+        rollups.update_rollups()
+        old_day = self.today - datetime.timedelta(days=5)
+        old_row = self.rollup(old_day)
+
+        self.create_bug()
+        self.assertEqual(rollups.update_rollups(), 1)
+        self.assertEqual(self.rollup(old_day).pk, old_row.pk)
+        self.assertEqual(self.rollup(self.today).opened, 1)
+        self.assertEqual(self.rollup(self.today).backlog, 2)
+        self.assertEqual(rollups.update_rollups(), 0)
+
+        rollups.update_rollups(full=True)
+        self.assertEqual(self.rollup(self.today).backlog, 2)
+
+    def test_events_committed_out_of_id_order_are_counted(self):
+        self.create_bug()
+        # its transaction has not committed yet: the event is not visible
+        late = BugEvent.objects.get()
+        late.delete()
+        self.create_bug()
+        self.assertEqual(rollups.update_rollups(), 1)
+        self.assertEqual(self.rollup(self.today).backlog, 1)
+
+        # it commits after a later event was counted
+        late.save()
+        self.assertEqual(rollups.update_rollups(), 1)
+        self.assertEqual(self.rollup(self.today).opened, 2)
+        self.assertEqual(self.rollup(self.today).backlog, 2)
+
+    def test_trend_reads_rollups_only(self):
+        self.create_bug()
+        rollups.update_rollups()
+        with CaptureQueriesContext(connection) as queries:
+            data = rollups.trend(self.project.id)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"core_bug"', queries[0]["sql"])
+        self.assertEqual(len(data["labels"]), 365)
+        self.assertEqual(data["opened"][-1], 1)
+        self.assertEqual(data["backlog"]["MAJOR"][-1], 1)
+
+
+class BugSearchTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_project = Project.objects.create(name="Other Project")
+
+    def create_bug(self, title, description="", project=None):
+        return Bug.objects.create(
+            title=title,
+            description=description,
+            project=project or self.project,
+            priority="LOW",
+            severity="MINOR",
+        )
+
+    def titles(self, query, bugs=None):
+        bugs = Bug.objects.all() if bugs is None else bugs
+        return [bug.title for bug in search.search(bugs, query)]
+
+    def test_title_matches_rank_first(self):
+        self.create_bug("Export is slow", "the login page crashes sometimes")
+        self.create_bug("Login crashes", "happens on every request")
+        self.create_bug("Unrelated", "nothing to see")
+        self.assertEqual(self.titles("crash login"), ["Login crashes", "Export is slow"])
+
+    def test_index_follows_edits_comments_and_deletes(self):
+        bug = self.create_bug("Broken button")
+        self.assertEqual(self.titles("widget"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Comments.objects.create(
+                by=self.owner, bug=bug, text="the widget is broken too"
+            )
+        self.assertEqual(self.titles("widget"), ["Broken button"])
+
+        bug.title = "Broken toggle"
+        bug.save()
+        self.assertEqual(self.titles("toggle"), ["Broken toggle"])
+        self.assertEqual(self.titles("button"), [])
+
+        bug.delete()
+        self.assertEqual(self.titles("widget"), [])
+
+    def test_comments_of_a_deleted_bug_are_not_reindexed(self):
+        bug = self.create_bug("Broken button")
+        Comments.objects.bulk_create(
+            Comments(by=self.owner, bug=bug, text=f"comment {i}") for i in range(50)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                bug.delete()
+        # the bug is dropped from the index once, not reindexed per comment
+        index_queries = [q for q in queries if "core_bugsearch" in q["sql"]]
+        self.assertEqual(len(index_queries), 1)
+        self.assertEqual(self.titles("comment"), [])
+
+    def test_comments_of_a_bug_are_reindexed_once(self):
+        bug = self.create_bug("Broken button")
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(20):
+                Comments.objects.create(by=self.owner, bug=bug, text=f"widget {i}")
+        self.assertEqual(self.titles("widget"), [])
+        with self.assertNumQueries(5):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.titles("widget"), ["Broken button"])
+
+    def test_mysql_only_requires_words_it_indexes(self):
+        self.create_bug("UI freezes")
+        with mock.patch.object(search.connection, "vendor", "mysql"):
+            self.assertEqual(search.match_expression(["ui", "crash"]), "ui +crash*")
+            self.assertEqual(
+                search.match_expression(["the", "login", "ui"]), "the +login ui*"
+            )
+            # nothing the index could match: searched without it
+            self.assertEqual(self.titles("ui"), ["UI freezes"])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.create_bug("Quote bug", 'crash with "quotes" and NOT operators')
+        self.assertEqual(self.titles('"quotes" NOT) *('), ["Quote bug"])
+        self.assertEqual(self.titles("?!"), [])
+
+    def test_view_respects_for_user(self):
+        self.create_bug("Crash in settings")
+        self.create_bug("Crash elsewhere", project=self.other_project)
+        response = self.client.get(reverse("bugs_list"), {"search": "crash"})
+        self.assertEqual(
+            [bug.title for bug in response.context["bugs"]], ["Crash in settings"]
+        )
+
+    def test_rebuild_index(self):
+        self.create_bug("Login crashes")
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.TABLE}")
+        self.assertEqual(self.titles("login"), [])
+        self.assertEqual(search.rebuild_index(), Bug.objects.count())
+        self.assertEqual(self.titles("login"), ["Login crashes"])
+
+
+class CursorPaginationTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        Bug.objects.bulk_create(
+            Bug(title=f"Bug {i}", project=self.project, priority="LOW") for i in range(25)
+        )
+        # bulk_create skips the signals that keep these up to date
+        stats.rebuild_stats()
+        search.rebuild_index()
+        # several bugs share a date, so the id has to break ties
+        for i, bug in enumerate(Bug.objects.order_by("id")):
+            Bug.objects.filter(pk=bug.pk).update(
+                added_date=datetime.date(2022, 1, 1) + datetime.timedelta(days=i // 4)
+            )
+        self.expected = list(
+            Bug.objects.order_by("-added_date", "-id").values_list("id", flat=True)
+        )
+
+    def test_walks_forward_and_back_without_gaps(self):
+        paginator = CursorPaginator(Bug.objects.all(), 10)
+        pages, page = [], paginator.page()
+        while True:
+            pages.append([bug.id for bug in page])
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertFalse(paginator.page().has_previous())
+
+        page = paginator.page(page.previous_cursor)
+        self.assertEqual([bug.id for bug in page], pages[1])
+        page = paginator.page(page.previous_cursor)
+        self.assertEqual([bug.id for bug in page], pages[0])
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor_starts_over(self):
+        paginator = CursorPaginator(Bug.objects.all(), 10)
+        page = paginator.page("not-a-cursor")
+        self.assertEqual([bug.id for bug in page], self.expected[:10])
+
+    def test_view_pages_without_offset_or_count(self):
+        response = self.client.get(reverse("bugs_list"))
+        self.assertEqual(response.context["approximate_count"], 25)
+        next_url = response.context["next_url"]
+        self.assertIsNone(response.context["previous_url"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("bugs_list") + next_url)
+        bug_queries = [q["sql"] for q in queries if 'FROM "core_bug"' in q["sql"]]
+        self.assertTrue(bug_queries)
+        for sql in bug_queries:
+            self.assertNotIn("OFFSET", sql)
+            self.assertNotIn("COUNT(", sql)
+        self.assertEqual(
+            [bug.id for bug in response.context["bugs"]], self.expected[10:20]
+        )
+        self.assertIsNotNone(response.context["previous_url"])
+
+    def test_search_falls_back_to_pages(self):
+        response = self.client.get(reverse("bugs_list"), {"search": "bug"})
+        self.assertEqual(len(response.context["bugs"]), 10)
+        self.assertIn("page=2", response.context["next_url"])
+        self.assertIn("search=bug", response.context["next_url"])
+
+
+class QueryBudgetTestCase(ProjectTestCase):
+    # queries per request; they must not grow with the number of bugs
+    BUDGETS = {
+        # with a cold row cache; the rows are one more query
+        "bugs_list": 6,
+        "team_members_list": 3,
+        "bug_detail": 5,
+        "dashboard": 5,
+    }
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.members = [
+            User.objects.create_user(
+                username=f"member{i}",
+                password="password",
+                email=f"member{i}@mail.com",
+                role="TM",
+                assigned_to=self.project,
+            )
+            for i in range(12)
+        ]
+        self.bug = Bug.objects.create(
+            title="Detail", project=self.project, priority="LOW", severity="MINOR"
+        )
+        for member in self.members[:5]:
+            Comments.objects.create(by=member, bug=self.bug, text="me too")
+        BugMedia.objects.bulk_create(
+            BugMedia(bug=self.bug, file=f"media/shot{i}.png") for i in range(3)
+        )
+
+    def seed(self, total, batch_size=10000):
+        count = Bug.objects.count()
+        while count < total:
+            size = min(batch_size, total - count)
+            Bug.objects.bulk_create(
+                Bug(
+                    title=f"Bug {count + i}",
+                    description="steps to reproduce",
+                    project=self.project,
+                    priority="LOW",
+                    severity="NORMAL",
+                    assigned_to=self.members[(count + i) % len(self.members)],
+                )
+                for i in range(size)
+            )
+            count += size
+        stats.rebuild_stats()
+
+    def urls(self):
+        return {
+            "bugs_list": reverse("bugs_list"),
+            "team_members_list": reverse("team_members_list"),
+            "bug_detail": reverse("bug_detail", args=[self.bug.pk]),
+            "dashboard": reverse("dashboard"),
+        }
+
+    def test_query_budgets(self):
+        for total in (10, 1000, 100000):
+            self.seed(total)
+            for name, url in self.urls().items():
+                cache.clear()
+                with self.subTest(bugs=total, view=name):
+                    with self.assertNumQueries(self.BUDGETS[name]):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+
+class ExportBugsTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        other = Project.objects.create(name="Other Project")
+        for i in range(5):
+            Bug.objects.create(
+                title=f"Crash {i}" if i % 2 else f"Typo {i}",
+                description='has "quotes", commas\nand newlines',
+                project=self.project,
+                priority="LOW",
+                severity="MINOR",
+                assigned_to=self.owner,
+            )
+        Bug.objects.create(title="Crash elsewhere", project=other, priority="LOW")
+
+    def export(self, **params):
+        response = self.client.get(reverse("export_bugs"), params)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_exports_every_visible_bug(self):
+        with override_settings(BUG_EXPORT_CHUNK_SIZE=2):
+            with CaptureQueriesContext(connection) as queries:
+                response, body = self.export()
+        # keyset batches of two, not one query left to the driver to stream
+        batches = [q["sql"] for q in queries if 'FROM "core_bug"' in q["sql"]]
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all("LIMIT 2" in sql for sql in batches))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(body.decode().splitlines(keepends=True)))
+        self.assertEqual(rows[0][:3], ["id", "title", "description"])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][2], 'has "quotes", commas\nand newlines')
+        self.assertEqual(rows[1][-2], "owner")
+        self.assertNotIn("Crash elsewhere", body.decode())
+
+    def test_jsonl_uses_the_list_filters(self):
+        response, body = self.export(format="jsonl", search="crash")
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(sorted(row["title"] for row in lines), ["Crash 1", "Crash 3"])
+        self.assertEqual(lines[0]["project"], "Test Project")
+
+    def test_gzip(self):
+        response, body = self.export(gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn(".csv.gz", response["Content-Disposition"])
+        text = gzip.decompress(body).decode()
+        self.assertEqual(len(list(csv.reader(text.splitlines(keepends=True)))), 6)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("export_bugs"), {"format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BugReportTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        for i in range(120):
+            Bug.objects.create(
+                title=f"Bug (number {i})",
+                description="crash" if i % 2 else "typo",
+                project=self.project,
+                priority="LOW",
+                severity="MINOR",
+            )
+
+    def pdf_text(self, data):
+        streams = re.findall(rb"stream\n(.*?)\nendstream", data, re.S)
+        return b"".join(zlib.decompress(stream) for stream in streams)
+
+    def test_report_is_rendered_by_the_worker(self):
+        response = self.client.post(reverse("request_report"), {"search": "crash"})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url).json()["status"], "QUEUED")
+
+        with override_settings(BUG_REPORT_CHUNK_SIZE=25):
+            with CaptureQueriesContext(connection) as queries:
+                call_command("report_worker", "--once", stdout=StringIO())
+        # the 60 matches are read in keyset batches
+        batches = [q["sql"] for q in queries if 'FROM "core_bug"' in q["sql"]]
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all("LIMIT 25" in sql for sql in batches))
+        status = self.client.get(status_url).json()
+        self.assertEqual(status["status"], "DONE")
+        self.assertEqual(status["rows"], 60)
+        self.assertGreater(status["pages"], 1)
+
+        response = self.client.get(status["download_url"])
+        data = b"".join(response.streaming_content)
+        self.assertTrue(data.startswith(b"%PDF-1.4"))
+        self.assertTrue(data.rstrip().endswith(b"%%EOF"))
+        text = self.pdf_text(data)
+        self.assertIn(b"Bug \\(number 1\\)", text)
+        self.assertNotIn(b"Bug \\(number 2\\)", text)
+
+        # every xref entry points at the object it names
+        xref = int(re.search(rb"startxref\n(\d+)", data).group(1))
+        entries = re.findall(rb"(\d{10}) 00000 n ", data[xref:])
+        for object_id, offset in enumerate(entries, start=1):
+            self.assertTrue(data[int(offset):].startswith(b"%d 0 obj" % object_id))
+
+    def test_unchanged_data_reuses_the_report(self):
+        first = reports.request_report(self.owner, {"search": "crash"})
+        reports.run_pending_reports()
+        again = reports.request_report(self.owner, {"search": "crash"})
+        self.assertEqual(again.pk, first.pk)
+        self.assertNotEqual(reports.request_report(self.owner, {}).pk, first.pk)
+
+        bug = Bug.objects.filter(project=self.project).first()
+        bug.title = "Renamed"
+        bug.save()
+        changed = reports.request_report(self.owner, {"search": "crash"})
+        self.assertNotEqual(changed.pk, first.pk)
+        self.assertEqual(changed.status, "QUEUED")
+
+    def test_reports_are_private(self):
+        report = reports.request_report(self.owner, {})
+        reports.run_pending_reports()
+        other = User.objects.create_user(
+            username="other",
+            password="password",
+            email="other@mail.com",
+            role="O",
+            assigned_to=self.project,
+            isVerified=True,
+        )
+        self.client.login(username="other", password="password")
+        response = self.client.get(reverse("report_download", args=[report.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BugFacetTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Project.objects.create(name="Other Project")
+        self.member = User.objects.create_user(
+            username="member",
+            password="password",
+            email="member@mail.com",
+            role="TM",
+            assigned_to=self.project,
+            isVerified=True,
+        )
+        for status, priority, assigned_to in [
+            ("NEW", "LOW", self.member),
+            ("NEW", "HIGH", None),
+            ("NEW", "HIGH", self.member),
+            ("FIXED", "LOW", None),
+        ]:
+            Bug.objects.create(
+                title=f"{status} {priority}",
+                project=self.project,
+                status=status,
+                priority=priority,
+                severity="MINOR",
+                assigned_to=assigned_to,
+            )
+        Bug.objects.create(
+            title="Elsewhere",
+            project=self.other,
+            status="NEW",
+            priority="LOW",
+            assigned_to=self.member,
+        )
+
+    def facets(self, response):
+        return {
+            facet["name"]: {
+                option["value"]: option["count"] for option in facet["options"]
+            }
+            for facet in response.context["facets"]
+        }
+
+    def test_unfiltered_counts_come_from_the_counters(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("bugs_list"))
+        self.assertFalse(
+            any("GROUP BY" in query["sql"] for query in queries.captured_queries)
+        )
+        facets = self.facets(response)
+        self.assertEqual(facets["status"], {"NEW": 3, "FIXED": 1})
+        self.assertEqual(facets["assignee"], {str(self.member.pk): 2, "none": 2})
+        self.assertEqual(response.context["approximate_count"], 4)
+
+    def test_counts_ignore_their_own_facet(self):
+        response = self.client.get(reverse("bugs_list"), {"status": "NEW"})
+        facets = self.facets(response)
+        # choosing another status is still offered with its count
+        self.assertEqual(facets["status"], {"NEW": 3, "FIXED": 1})
+        self.assertEqual(facets["priority"], {"LOW": 1, "HIGH": 2})
+        self.assertEqual(response.context["approximate_count"], 3)
+        self.assertEqual(len(response.context["bugs"]), 3)
+
+        response = self.client.get(
+            reverse("bugs_list"), {"status": "NEW", "assignee": "none"}
+        )
+        self.assertEqual([bug.title for bug in response.context["bugs"]], ["NEW HIGH"])
+        self.assertEqual(self.facets(response)["status"], {"NEW": 1, "FIXED": 1})
+
+    def test_filters_apply_to_the_export(self):
+        response = self.client.get(
+            reverse("export_bugs"), {"format": "jsonl", "priority": "HIGH"}
+        )
+        body = b"".join(response.streaming_content).decode()
+        titles = sorted(json.loads(line)["title"] for line in body.splitlines())
+        self.assertEqual(titles, ["NEW HIGH", "NEW HIGH"])
+
+    def test_team_members_only_see_their_project(self):
+        bugs = Bug.objects.for_user(self.member)
+        self.assertEqual(bugs.count(), 2)
+        self.assertFalse(bugs.filter(project=self.other).exists())
+
+    def test_facet_filters_use_the_project_indexes(self):
+        if connection.vendor not in ("sqlite", "mysql"):
+            self.skipTest("no EXPLAIN format to check")
+        bugs = Bug.objects.for_user(self.owner).order_by("-added_date", "-id")
+        self.assertIn(
+            "bug_project_status_idx", bugs.filter(status="NEW")[:11].explain()
+        )
+        self.assertIn(
+            "bug_project_assignee_idx",
+            bugs.filter(assigned_to=self.member)[:11].explain(),
+        )
+
+
+class BugRowCacheTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.bugs = [
+            Bug.objects.create(
+                title=f"Bug {i}",
+                description=f"steps {i}",
+                project=self.project,
+                priority="LOW",
+                severity="MINOR",
+            )
+            for i in range(3)
+        ]
+
+    def row_queries(self, queries):
+        return [
+            query["sql"]
+            for query in queries.captured_queries
+            if '"core_bug"."title"' in query["sql"]
+        ]
+
+    def test_warm_rows_are_not_queried(self):
+        with CaptureQueriesContext(connection) as cold:
+            response = self.client.get(reverse("bugs_list"))
+        self.assertEqual(len(self.row_queries(cold)), 1)
+        self.assertContains(response, "steps 2")
+
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(reverse("bugs_list"))
+        self.assertEqual(self.row_queries(warm), [])
+        self.assertEqual(len(warm), len(cold) - 1)
+        for bug in self.bugs:
+            self.assertContains(response, f"<td>{bug.title}</td>", html=False)
+
+    def test_saving_a_bug_renders_its_row_again(self):
+        self.client.get(reverse("bugs_list"))
+        bug = self.bugs[0]
+        version = bug.row_version
+        bug.title = "Renamed"
+        bug.save()
+        bug.severity = "MAJOR"
+        bug.save(update_fields=["severity"])
+        bug.refresh_from_db()
+        self.assertEqual(bug.row_version, version + 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("bugs_list"))
+        # only the changed row is rendered again
+        self.assertIn(f"IN ({bug.pk})", self.row_queries(queries)[0])
+        self.assertContains(response, "<td>Renamed</td>", html=False)
+        self.assertContains(response, "<td>MAJOR</td>", html=False)
+        self.assertNotContains(response, "Bug 0")
+
+    def test_saves_of_the_same_loaded_bug_get_their_own_versions(self):
+        first = Bug.objects.get(pk=self.bugs[0].pk)
+        second = Bug.objects.get(pk=self.bugs[0].pk)
+        first.title = "First"
+        first.save()
+        second.title = "Second"
+        second.save()
+        self.assertEqual(second.row_version, first.row_version + 1)
+        self.assertEqual(Bug.objects.get(pk=first.pk).row_version, second.row_version)
+
+    def test_bugs_changed_after_the_page_was_read(self):
+        page = list(Bug.objects.order_by("id").only("id", "row_version"))
+        Bug.objects.get(pk=page[0].pk).delete()
+        changed = Bug.objects.get(pk=page[1].pk)
+        changed.title = "Renamed"
+        changed.save()
+
+        rows = fragments.bug_rows(page)
+        self.assertEqual(len(rows), 2)
+        self.assertIn("Renamed", rows[0])
+        # stored under the version that was rendered
+        key = fragments.row_key(changed.pk, changed.row_version)
+        self.assertIn(
+            "Renamed", cache.get(key, version=fragments.ROW_CACHE_VERSION)
+        )
+
+
+class BugDetailTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bug = Bug.objects.create(
+            title="Detail", project=self.project, priority="LOW", severity="MINOR"
+        )
+
+    def add_comments(self, count):
+        Comments.objects.bulk_create(
+            Comments(by=self.owner, bug=self.bug, text=f"comment {i}")
+            for i in range(count)
+        )
+
+    def test_queries_do_not_grow_with_the_comments(self):
+        url = reverse("bug_detail", args=[self.bug.pk])
+        self.add_comments(5)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.add_comments(5000)
+        with self.assertNumQueries(len(few)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["comments"]), views.COMMENTS_PER_PAGE)
+        self.assertContains(response, "comment 4999")
+        self.assertNotContains(response, "<strong>owner:</strong> comment 0<")
+
+    def test_load_more_walks_every_comment(self):
+        self.add_comments(45)
+        response = self.client.get(reverse("bug_detail", args=[self.bug.pk]))
+        texts = [comment.text for comment in response.context["comments"]]
+        url = response.context["more_comments_url"]
+        while url:
+            page = self.client.get(url).json()
+            texts += [comment["text"] for comment in page["comments"]]
+            self.assertTrue(all(c["by"] == "owner" for c in page["comments"]))
+            url = page["next_url"]
+        self.assertEqual(texts, [f"comment {i}" for i in reversed(range(45))])
+
+    def test_comments_are_only_sent_to_users_who_can_see_the_bug(self):
+        self.add_comments(3)
+        url = reverse("bug_comments", args=[self.bug.pk])
+        self.assertEqual(len(self.client.get(url).json()["comments"]), 3)
+
+        other = Project.objects.create(name="Other Project")
+        User.objects.create_user(
+            username="outsider",
+            password="password",
+            email="outsider@mail.com",
+            role="O",
+            assigned_to=other,
+            isVerified=True,
+        )
+        self.client.login(username="outsider", password="password")
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_short_thread_has_no_load_more(self):
+        self.add_comments(3)
+        response = self.client.get(reverse("bug_detail", args=[self.bug.pk]))
+        self.assertIsNone(response.context["more_comments_url"])
+        self.assertNotContains(response, "more-comments")
+
+    def test_post_comment(self):
+        url = reverse("bug_detail", args=[self.bug.pk])
+        response = self.client.post(url, {"text": "reproduced"})
+        self.assertRedirects(response, url)
+        self.assertEqual(self.bug.comments_set.get().text, "reproduced")
+
+        response = self.client.post(url, {"text": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors)
+        self.assertEqual(self.bug.comments_set.count(), 1)
+
+
+class ConditionalGetTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.other = Project.objects.create(name="Other Project")
+        self.bug = Bug.objects.create(
+            title="Detail", project=self.project, priority="LOW", severity="MINOR"
+        )
+
+    def revalidate(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        return response["ETag"]
+
+    def assertNotModified(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # only the session and the user are loaded
+        for query in queries.captured_queries:
+            self.assertNotIn("core_bug", query["sql"])
+            self.assertNotIn("core_comments", query["sql"])
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_changes_with_the_bug_comments_and_media(self):
+        url = reverse("bug_detail", args=[self.bug.pk])
+        etag = self.revalidate(url)
+        self.assertNotModified(url, etag)
+
+        Comments.objects.create(by=self.owner, bug=self.bug, text="me too")
+        self.assertModified(url, etag)
+        etag = self.revalidate(url)
+
+        media = BugMedia.objects.create(bug=self.bug, file="media/shot.png")
+        self.assertModified(url, etag)
+        etag = self.revalidate(url)
+        media.delete()
+        self.assertModified(url, etag)
+        etag = self.revalidate(url)
+
+        self.bug.status = "FIXED"
+        self.bug.save()
+        self.assertModified(url, etag)
+
+    def test_detail_is_not_shared_between_users(self):
+        url = reverse("bug_detail", args=[self.bug.pk])
+        etag = self.revalidate(url)
+        User.objects.create_user(
+            username="other",
+            password="password",
+            email="other@mail.com",
+            role="O",
+            assigned_to=self.project,
+            isVerified=True,
+        )
+        self.client.login(username="other", password="password")
+        self.assertModified(url, etag)
+
+    def test_list_changes_with_the_project_bugs_only(self):
+        url = reverse("bugs_list") + "?status=NEW"
+        etag = self.revalidate(url)
+        self.assertNotModified(url, etag)
+        self.assertModified(reverse("bugs_list"), etag)
+
+        Bug.objects.create(title="Elsewhere", project=self.other, priority="LOW")
+        self.assertNotModified(url, etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comments.objects.create(by=self.owner, bug=self.bug, text="found it")
+        # comments are matched by the search
+        self.assertModified(url, etag)
+
+
+class DescriptionExcerptTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.log = "Traceback\n  line 1\n" + "x" * 1000000
+        self.bug = Bug.objects.create(
+            title="Pasted log", description=self.log, project=self.project, priority="LOW"
+        )
+
+    def test_excerpt_is_kept_on_save(self):
+        self.assertEqual(len(self.bug.description_excerpt), EXCERPT_LENGTH)
+        self.assertTrue(self.bug.description_excerpt.startswith("Traceback line 1 xx"))
+        self.assertTrue(self.bug.description_excerpt.endswith("..."))
+
+        self.bug.description = "short\n\nagain"
+        self.bug.save(update_fields=["description"])
+        self.bug.refresh_from_db()
+        self.assertEqual(self.bug.description_excerpt, "short again")
+
+        # saving without the description loaded leaves the excerpt alone
+        bug = Bug.objects.defer("description").get(pk=self.bug.pk)
+        bug.status = "FIXED"
+        with CaptureQueriesContext(connection) as queries:
+            bug.save()
+        self.assertFalse(
+            any('"description"' in query["sql"] for query in queries.captured_queries)
+        )
+        bug.refresh_from_db()
+        self.assertEqual(bug.description_excerpt, "short again")
+
+    def test_list_never_loads_the_description(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("bugs_list"))
+        self.assertFalse(
+            any('"description"' in query["sql"] for query in queries.captured_queries)
+        )
+        self.assertContains(response, self.bug.description_excerpt)
+        self.assertLess(len(response.content), 100000)
+
+
+class MediaStorageTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(self.media_root)
+            for name in names
+        )
+
+    def stored_name(self, content, extension):
+        digest = hashlib.sha256(content).hexdigest()
+        return os.path.join("media", digest[:2], digest[2:4], digest + extension)
+
+    def submit_bug(self, files):
+        form = AddBugForm(
+            self.owner,
+            data={
+                "title": "Crash",
+                "description": "app crashes on startup",
+                "status": "NEW",
+                "priority": "HIGH",
+                "submitted_by": self.owner.pk,
+                "project": self.project.pk,
+                "is_predicted": False,
+            },
+            files=MultiValueDict({"files": files}),
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_identical_uploads_are_stored_once(self):
+        screenshot = PNG + b"same screenshot"
+        digest = hashlib.sha256(screenshot).hexdigest()
+        with CaptureQueriesContext(connection) as queries:
+            first = self.submit_bug(
+                [
+                    SimpleUploadedFile("before.png", screenshot),
+                    SimpleUploadedFile("app.log", b"Traceback"),
+                ]
+            )
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "core_bugmedia"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        second = self.submit_bug([SimpleUploadedFile("AFTER.PNG", screenshot)])
+
+        self.assertEqual(
+            self.stored_files(),
+            sorted(
+                [
+                    self.stored_name(screenshot, ".png"),
+                    self.stored_name(b"Traceback", ".log.gz"),
+                    self.stored_name(b"Traceback", ".log.gz.idx"),
+                ]
+            ),
+        )
+        media = second.bugmedia_set.get()
+        self.assertEqual(media.digest, digest)
+        self.assertEqual(media.name, "AFTER.PNG")
+        self.assertEqual(media.file.read(), screenshot)
+        self.assertEqual(BugMedia.objects.filter(digest=digest).count(), 2)
+        self.assertEqual(first.bugmedia_set.count(), 2)
+
+    def test_saving_an_upload_directly_sets_the_digest(self):
+        bug = Bug.objects.create(title="Crash", project=self.project, priority="LOW")
+        media = BugMedia.objects.create(
+            bug=bug, file=SimpleUploadedFile("shot.png", PNG + b"pixels")
+        )
+        self.assertEqual(media.digest, hashlib.sha256(PNG + b"pixels").hexdigest())
+        self.assertEqual(media.name, "shot.png")
+        self.assertTrue(media.file.name.endswith(f"{media.digest}.png"))
+
+    def test_clean_media_keeps_referenced_files(self):
+        bug = self.submit_bug(
+            [
+                SimpleUploadedFile("a.png", PNG + b"kept"),
+                SimpleUploadedFile("b.png", PNG + b"gone"),
+            ]
+        )
+        shared = self.submit_bug([SimpleUploadedFile("c.png", PNG + b"kept")])
+        bug.bugmedia_set.all().delete()
+        self.assertEqual(len(self.stored_files()), 2)
+
+        call_command("clean_media", "--min-age", "0", stdout=StringIO())
+        self.assertEqual(
+            self.stored_files(),
+            [os.path.relpath(shared.bugmedia_set.get().file.path, self.media_root)],
+        )
+
+    def test_reused_orphan_is_not_cleaned_before_its_row_commits(self):
+        bug = self.submit_bug([SimpleUploadedFile("a.png", PNG + b"again")])
+        path = bug.bugmedia_set.get().file.path
+        bug.bugmedia_set.all().delete()
+        two_days_ago = time.time() - 48 * 3600
+        os.utime(path, (two_days_ago, two_days_ago))
+
+        # a new upload of the same content, its row not written yet
+        field = BugMedia._meta.get_field("file")
+        field.storage.save("media/b.png", SimpleUploadedFile("b.png", PNG + b"again"))
+        call_command("clean_media", stdout=StringIO())
+
+        self.assertTrue(os.path.exists(path))
+
+
+class AttachmentUploadTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def post(self, *files, client=None):
+        data = {
+            "title": "Crash",
+            "description": "app crashes on startup",
+            "status": "NEW",
+            "priority": "HIGH",
+            "submitted_by": self.owner.pk,
+            "project": self.project.pk,
+            # file parts come last, as in report_bug.html
+            "files": [SimpleUploadedFile(name, content) for name, content in files],
+        }
+        return (client or self.client).post(reverse("add_bug"), data)
+
+    def test_images_and_logs_are_accepted(self):
+        response = self.post(
+            ("shot.PNG", PNG + b"pixels"),
+            ("photo.jpg", b"\xff\xd8\xff\xe0 jpeg"),
+            ("server.log", "ERROR café\n".encode() * 10000),
+        )
+        self.assertRedirects(response, "/dashboard/bugs/", fetch_redirect_response=False)
+        bug = Bug.objects.get()
+        self.assertEqual(
+            sorted(media.name for media in bug.bugmedia_set.all()),
+            ["photo.jpg", "server.log", "shot.PNG"],
+        )
+
+    def test_content_must_match_the_extension(self):
+        for name, content in [
+            ("notes.png", b"just some text"),
+            ("shot.log", PNG + b"\x00\x00binary"),
+            ("tool.exe", b"MZ\x90\x00"),
+            ("long.log", b"text\n" * 20000 + b"\x00\x01\x02"),
+        ]:
+            with self.subTest(name=name):
+                response = self.post(("shot.png", PNG), (name, content))
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, name)
+                self.assertFalse(Bug.objects.exists())
+
+    def test_logs_may_start_like_an_image(self):
+        bmp = BytesIO()
+        Image.new("RGB", (2, 2)).save(bmp, "BMP")
+        response = self.post(
+            ("controller.log", b"BMS controller started\n" * 100),
+            ("loader.log", b"GIF89a loader: ready\n"),
+            ("real.bmp", bmp.getvalue()),
+        )
+        self.assertRedirects(response, "/dashboard/bugs/", fetch_redirect_response=False)
+        self.assertEqual(Bug.objects.get().bugmedia_set.count(), 3)
+
+        response = self.post(("fake.bmp", b"BMS controller started\n"))
+        self.assertContains(response, "fake.bmp: the content is not a bmp file")
+
+    @override_settings(
+        FILE_UPLOAD_HANDLERS=["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
+    )
+    def test_refused_files_are_not_spooled(self):
+        with mock.patch.object(
+            TemporaryFileUploadHandler, "receive_data_chunk"
+        ) as spooled:
+            response = self.post(("notes.png", b"just some text" * 10000))
+        spooled.assert_not_called()
+        self.assertContains(response, "notes.png: the content is not a png file")
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    @override_settings(ATTACHMENT_MAX_FILE_SIZE=1000, ATTACHMENT_MAX_REQUEST_SIZE=5000)
+    def test_size_limits(self):
+        response = self.post(("big.log", b"x" * 1001))
+        self.assertContains(response, "big.log: the upload is larger than 1000")
+        response = self.post(*[(f"{i}.log", b"x" * 900) for i in range(6)])
+        self.assertContains(response, "the request: the upload is larger than")
+        self.assertFalse(Bug.objects.exists())
+
+    def test_csrf_is_still_checked(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username="owner", password="password")
+        response = self.post(("shot.png", PNG), client=client)
+        self.assertEqual(response.status_code, 403)
+
+
+class RunNow:
+    """A stand-in for the thumbnail pool that runs the work straight away."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def png(width, height, color=(200, 30, 30, 128)):
+    out = BytesIO()
+    Image.new("RGBA", (width, height), color).save(out, "PNG")
+    return out.getvalue()
+
+
+class ThumbnailTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        pool = mock.patch.object(thumbnails, "_get_pool", return_value=RunNow())
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        self.bug = Bug.objects.create(
+            title="Crash", project=self.project, priority="LOW", submitted_by=self.owner
+        )
+
+    def attach(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BugMedia.objects.create(
+                bug=self.bug, file=SimpleUploadedFile(name, content)
+            )
+
+    def derivative_size(self, media, kind):
+        name = thumbnails.derivative_name(media.digest, kind)
+        with default_storage.open(name) as f, Image.open(f) as image:
+            return image.format, image.size
+
+    def test_derivatives_are_made_after_the_upload_commits(self):
+        media = self.attach("screen.png", png(2000, 1000))
+
+        self.assertEqual(self.derivative_size(media, "thumb"), ("JPEG", (240, 120)))
+        self.assertEqual(
+            self.derivative_size(media, "preview"), ("JPEG", (1280, 640))
+        )
+        media.refresh_from_db()
+        self.assertEqual((media.width, media.height), (2000, 1000))
+
+    def test_images_stored_before_digests_get_derivatives(self):
+        path = default_storage.path("media/old.png")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(png(600, 300))
+        BugMedia.objects.bulk_create([BugMedia(bug=self.bug, file="media/old.png")])
+        media = BugMedia.objects.get()
+        self.assertFalse(thumbnails.is_image(media))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("digest_media", stdout=StringIO())
+        media.refresh_from_db()
+        with open(path, "rb") as f:
+            self.assertEqual(media.digest, hashlib.sha256(f.read()).hexdigest())
+        self.assertEqual(media.file.name, "media/old.png")
+        self.assertEqual(self.derivative_size(media, "thumb"), ("JPEG", (240, 120)))
+
+    def test_small_images_are_not_enlarged(self):
+        media = self.attach("icon.png", png(100, 50))
+        self.assertEqual(self.derivative_size(media, "preview"), ("JPEG", (100, 50)))
+
+    def test_logs_get_no_derivatives(self):
+        self.attach("app.log", b"Traceback")
+        self.assertFalse(default_storage.exists("derivatives"))
+
+    def test_gallery_shows_sized_thumbnails(self):
+        media = self.attach("screen.png", png(2000, 1000))
+        self.attach("app.log", b"Traceback")
+
+        response = self.client.get(reverse("bug_detail", args=[self.bug.pk]))
+
+        thumb = reverse("media_derivative", args=[media.pk, "thumb"])
+        preview = reverse("media_derivative", args=[media.pk, "preview"])
+        self.assertContains(
+            response,
+            f'<a href="{preview}"><img src="{thumb}" alt="screen.png" '
+            f'loading="lazy" width="240" height="120"></a>',
+            html=True,
+        )
+        self.assertContains(response, ">app.log</a>")
+
+    def test_missing_derivative_is_made_on_request(self):
+        media = self.attach("screen.png", png(600, 300))
+        default_storage.delete(thumbnails.derivative_name(media.digest, "thumb"))
+
+        response = self.client.get(
+            reverse("media_derivative", args=[media.pk, "thumb"])
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        with Image.open(BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (240, 120))
+
+    def test_undecodable_images_are_linked_and_not_retried(self):
+        with self.assertLogs("core.thumbnails", "WARNING"):
+            media = self.attach("broken.png", PNG + b"\x00" * 64)
+        media.refresh_from_db()
+        self.assertEqual(media.width, thumbnails.UNREADABLE)
+
+        with mock.patch.object(thumbnails, "generate") as generate:
+            response = self.client.get(
+                reverse("media_derivative", args=[media.pk, "thumb"])
+            )
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(reverse("bug_detail", args=[self.bug.pk]))
+        generate.assert_not_called()
+        self.assertNotContains(response, "<img")
+        self.assertContains(response, ">broken.png</a>")
+
+    def test_derivative_view_refuses_other_attachments(self):
+        log = self.attach("app.log", b"Traceback")
+        image = self.attach("screen.png", png(60, 30))
+        for pk, kind in [(log.pk, "thumb"), (image.pk, "original"), (0, "thumb")]:
+            response = self.client.get(reverse("media_derivative", args=[pk, kind]))
+            self.assertEqual(response.status_code, 404)
+
+        other = Project.objects.create(name="Other Project")
+        outsider = User.objects.create_user(
+            username="outsider",
+            password="password",
+            email="outsider@mail.com",
+            role="O",
+            assigned_to=other,
+            isVerified=True,
+        )
+        self.client.force_login(outsider)
+        response = self.client.get(
+            reverse("media_derivative", args=[image.pk, "thumb"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class LogAttachmentTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # many small blocks
+        block_size = mock.patch.object(logs, "BLOCK_SIZE", 100)
+        block_size.start()
+        self.addCleanup(block_size.stop)
+
+        self.bug = Bug.objects.create(
+            title="Crash", project=self.project, priority="LOW", submitted_by=self.owner
+        )
+        self.content = b"".join(
+            b"line %d %s\n" % (i, b"ERROR" if i % 100 == 0 else b"ok")
+            for i in range(1, 1001)
+        )
+
+    def attach(self, content):
+        return BugMedia.objects.create(
+            bug=self.bug, file=SimpleUploadedFile("app.log", content)
+        )
+
+    def view(self, media, **params):
+        response = self.client.get(reverse("media_log", args=[media.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_logs_are_stored_compressed_in_blocks(self):
+        media = self.attach(self.content)
+
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(media.digest, digest)
+        self.assertTrue(media.file.name.endswith(f"/{digest}.log.gz"))
+        with default_storage.open(media.file.name) as f:
+            self.assertEqual(gzip.decompress(f.read()), self.content)
+        index = logs.load_index(default_storage, media.file.name)
+        self.assertEqual(index["lines"], 1000)
+        self.assertGreater(len(index["blocks"]), 10)
+
+    def test_line_range_reads_only_its_blocks(self):
+        media = self.attach(self.content)
+        blocks = logs.load_index(default_storage, media.file.name)["blocks"]
+
+        with mock.patch.object(
+            logs.zlib, "decompress", wraps=zlib.decompress
+        ) as decompress:
+            content = self.view(media, start=500, lines=3)
+
+        self.assertEqual(content, b"line 500 ERROR\nline 501 ok\nline 502 ok\n")
+        self.assertLessEqual(decompress.call_count, 2)
+        self.assertLess(decompress.call_count, len(blocks))
+
+    def test_grep_numbers_matching_lines(self):
+        media = self.attach(self.content)
+
+        self.assertEqual(
+            self.view(media, grep="ERROR", start=250, lines=2),
+            b"300:line 300 ERROR\n400:line 400 ERROR\n",
+        )
+        self.assertEqual(self.view(media, grep="missing"), b"")
+
+    def test_missing_index_is_rebuilt(self):
+        media = self.attach(self.content + b"no newline")
+        index = logs.load_index(default_storage, media.file.name)
+        default_storage.delete(logs.index_name(media.file.name))
+
+        self.assertEqual(logs.load_index(default_storage, media.file.name), index)
+        self.assertEqual(index["lines"], 1001)
+        self.assertEqual(self.view(media, start=1001), b"no newline")
+
+    def test_uncompressed_logs_are_still_read(self):
+        name = default_storage.save("media/legacy.log", ContentFile(self.content))
+        media = BugMedia.objects.create(bug=self.bug, file=name)
+
+        self.assertEqual(self.view(media, start=2, lines=1), b"line 2 ok\n")
+        self.assertEqual(
+            self.view(media, grep="ERROR", lines=1), b"100:line 100 ERROR\n"
+        )
+
+    def test_log_view_refuses_other_attachments(self):
+        image = BugMedia.objects.create(
+            bug=self.bug, file=SimpleUploadedFile("screen.png", PNG)
+        )
+        response = self.client.get(reverse("media_log", args=[image.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        media = self.attach(self.content)
+        response = self.client.get(
+            reverse("media_log", args=[media.pk]), {"start": "first"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        other = Project.objects.create(name="Other Project")
+        outsider = User.objects.create_user(
+            username="outsider",
+            password="password",
+            email="outsider@mail.com",
+            role="O",
+            assigned_to=other,
+            isVerified=True,
+        )
+        self.client.force_login(outsider)
+        response = self.client.get(reverse("media_log", args=[media.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ProtectedMediaTestCase(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.bug = Bug.objects.create(
+            title="Crash", project=self.project, priority="LOW", submitted_by=self.owner
+        )
+        self.content = PNG + bytes(range(256))
+        self.media = BugMedia.objects.create(
+            bug=self.bug, file=SimpleUploadedFile("screen.png", self.content)
+        )
+        self.url = reverse("media_file", args=[self.media.pk])
+
+    def test_attachment_is_sent_with_etag(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Content-Length"], str(len(self.content)))
+        self.assertEqual(response["ETag"], f'"{self.media.digest}"')
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        size = len(self.content)
+        for header, first, last in [
+            ("bytes=8-11", 8, 11),
+            ("bytes=260-", 260, size - 1),
+            ("bytes=-4", size - 4, size - 1),
+            ("bytes=0-100000", 0, size - 1),
+        ]:
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(
+                b"".join(response.streaming_content), self.content[first : last + 1]
+            )
+            self.assertEqual(response["Content-Range"], f"bytes {first}-{last}/{size}")
+            self.assertEqual(response["Content-Length"], str(last - first + 1))
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{size}")
+
+        # the file changed since the client got its first part
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=8-11", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_front_end_server_sends_the_file(self):
+        with self.settings(MEDIA_SERVER="x-accel-redirect"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected/" + self.media.file.name
+        )
+
+        with self.settings(MEDIA_SERVER="x-sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], self.media.file.path)
+        self.assertEqual(response["Content-Type"], "image/png")
+
+    def test_missing_file_is_not_found(self):
+        os.remove(self.media.file.path)
+        for mode in ["django", "x-accel-redirect", "x-sendfile"]:
+            with self.settings(MEDIA_SERVER=mode):
+                self.assertEqual(self.client.get(self.url).status_code, 404, mode)
+
+    def test_logs_are_downloaded_compressed(self):
+        media = BugMedia.objects.create(
+            bug=self.bug, file=SimpleUploadedFile("app.log", b"Traceback\n")
+        )
+
+        response = self.client.get(reverse("media_file", args=[media.pk]))
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="app.log.gz"'
+        )
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)), b"Traceback\n"
+        )
+
+    def test_media_is_only_sent_to_users_who_can_see_the_bug(self):
+        # no longer served straight from MEDIA_ROOT
+        response = self.client.get("/uploads/" + self.media.file.name)
+        self.assertEqual(response.status_code, 404)
+
+        other = Project.objects.create(name="Other Project")
+        outsider = User.objects.create_user(
+            username="outsider",
+            password="password",
+            email="outsider@mail.com",
+            role="O",
+            assigned_to=other,
+            isVerified=True,
+        )
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,183 @@
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .models import BugMedia
+from .versions import bug_detail_version_name, bump_versions
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: attachments are then only linked
+    Image = None
+    DECODE_ERRORS = (OSError,)
+else:
+    # UnidentifiedImageError is an OSError, as are truncated files
+    DECODE_ERRORS = (OSError, Image.DecompressionBombError)
+
+logger = logging.getLogger(__name__)
+
+# Smaller copies of image attachments for the detail page: a thumbnail for
+# the gallery and a preview to open instead of the original. They are stored
+# under the digest of the source, so identical uploads share them, and are
+# made in the background after the upload commits, or on first request if
+# they are missing.
+
+# kind -> (bounding box, JPEG quality)
+DERIVATIVES = {
+    "thumb": ((240, 240), 70),
+    "preview": ((1280, 1280), 82),
+}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp"}
+# EXIF orientations that turn the image by 90 degrees
+ORIENTATION_TAG = 0x0112
+ROTATED = {5, 6, 7, 8}
+# width and height of an attachment that looked like an image but could not
+# be decoded; its derivatives are not tried again
+UNREADABLE = 0
+
+_pool = None
+
+
+def enabled():
+    return Image is not None
+
+
+def is_image(media):
+    extension = os.path.splitext(media.file.name)[1].lower()
+    return (
+        bool(media.digest)
+        and extension in IMAGE_EXTENSIONS
+        and media.width != UNREADABLE
+    )
+
+
+def derivative_name(digest, kind):
+    return f"derivatives/{kind}/{digest[:2]}/{digest}.jpg"
+
+
+def fit(width, height, kind):
+    """The size of the `kind` derivative of a width x height image."""
+    (box_width, box_height), _ = DERIVATIVES[kind]
+    scale = min(box_width / width, box_height / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _write(name, image, quality):
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, "JPEG", quality=quality, optimize=True, progressive=True)
+        # readers never see a half-written file
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _decode(source_name):
+    """The image `source_name` upright and in RGB, and its original size."""
+    storage = BugMedia._meta.get_field("file").storage
+    with storage.open(source_name) as f, Image.open(f) as image:
+        size = image.size
+        if image.getexif().get(ORIENTATION_TAG) in ROTATED:
+            size = size[::-1]
+        # JPEGs can be decoded at a fraction of their size, which is much
+        # faster for large photos
+        largest_box, _ = DERIVATIVES["preview"]
+        image.draft("RGB", largest_box)
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+    return image, size
+
+
+def _record_size(digest, size):
+    media = BugMedia.objects.filter(digest=digest)
+    media.update(width=size[0], height=size[1])
+    # the detail pages now know the size of the thumbnails
+    bug_ids = set(media.values_list("bug_id", flat=True))
+    bump_versions([bug_detail_version_name(bug_id) for bug_id in bug_ids])
+
+
+def generate(source_name, digest):
+    """Write every derivative of the image `source_name` and record its size.
+
+    Returns None, and marks the attachments UNREADABLE, if the image cannot
+    be decoded.
+    """
+    try:
+        image, size = _decode(source_name)
+    except DECODE_ERRORS as e:
+        logger.warning("cannot decode image %s: %s", source_name, e)
+        _record_size(digest, (UNREADABLE, UNREADABLE))
+        return None
+    for kind, (box, quality) in DERIVATIVES.items():
+        derivative = image.copy()
+        derivative.thumbnail(box, Image.LANCZOS)
+        _write(derivative_name(digest, kind), derivative, quality)
+    _record_size(digest, size)
+    return size
+
+
+def ensure_derivative(media, kind):
+    """The name of a derivative of `media`, generating it if it is missing.
+
+    None if the image cannot be decoded.
+    """
+    name = derivative_name(media.digest, kind)
+    if not default_storage.exists(name):
+        if generate(media.file.name, media.digest) is None:
+            return None
+    return name
+
+
+def _generate_in_background(source_name, digest):
+    close_old_connections()
+    try:
+        if not all(
+            default_storage.exists(derivative_name(digest, kind))
+            for kind in DERIVATIVES
+        ):
+            generate(source_name, digest)
+    except Exception:
+        logger.exception("could not make derivatives of %s", source_name)
+    finally:
+        close_old_connections()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, "THUMBNAIL_WORKERS", 2),
+            thread_name_prefix="thumbnails",
+        )
+    return _pool
+
+
+def schedule(media_list):
+    """Make the derivatives of new image attachments once they are committed."""
+    if not enabled():
+        return
+    sources = {media.digest: media.file.name for media in media_list if is_image(media)}
+    if sources:
+        transaction.on_commit(
+            lambda: [
+                _get_pool().submit(_generate_in_background, name, digest)
+                for digest, name in sources.items()
+            ]
+        )
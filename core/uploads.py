@@ -0,0 +1,143 @@
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.template.defaultfilters import filesizeformat
+
+# Bug attachments are checked by content, not by name: the first bytes of an
+# upload must be an image signature or readable text, and the extension must
+# agree with it. AttachmentUploadHandler does this while the request body is
+# read, so a rejected upload is dropped before it is buffered or spooled.
+
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+]
+# "BM" alone is common at the start of text; a BMP also has one of these DIB
+# header sizes at offset 14
+BMP_HEADER_SIZES = {12, 16, 40, 52, 56, 64, 108, 124}
+EXTENSION_TYPES = {
+    "png": "png",
+    "jpg": "jpeg",
+    "jpeg": "jpeg",
+    "gif": "gif",
+    "bmp": "bmp",
+    "log": "text",
+}
+# how much of the start of a file is looked at to tell text from binary
+SNIFF_BYTES = 1024
+
+
+def max_file_size():
+    return getattr(settings, "ATTACHMENT_MAX_FILE_SIZE", 10 * 1024 * 1024)
+
+
+def max_request_size():
+    return getattr(settings, "ATTACHMENT_MAX_REQUEST_SIZE", 25 * 1024 * 1024)
+
+
+def is_text(data):
+    if b"\x00" in data:
+        return False
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # a character cut in two at the end of the sample is fine
+        return e.start >= len(data) - 3 and e.reason == "unexpected end of data"
+    return True
+
+
+def is_bmp(head):
+    return len(head) >= 18 and int.from_bytes(head[14:18], "little") in BMP_HEADER_SIZES
+
+
+def detect_type(head):
+    """The type of a file starting with `head`, or None if it is not allowed."""
+    for signature, kind in SIGNATURES:
+        if head.startswith(signature):
+            if kind == "bmp" and not is_bmp(head):
+                continue
+            return kind
+    if is_text(head[:SNIFF_BYTES]):
+        return "text"
+    return None
+
+
+def type_error(name, head):
+    """Why a file called `name` starting with `head` is refused, or None."""
+    extension = os.path.splitext(name)[1].lower().lstrip(".")
+    expected = EXTENSION_TYPES.get(extension)
+    if expected is None:
+        allowed = ", ".join(EXTENSION_TYPES)
+        return f"{name}: file type not supported. Allowed types: {allowed}"
+    if expected == "text":
+        # a log may well start like an image signature ("GIF89a loader...")
+        matches = is_text(head[:SNIFF_BYTES])
+    else:
+        matches = detect_type(head) == expected
+    if not matches:
+        return f"{name}: the content is not a {extension} file"
+    return None
+
+
+def size_error(name, limit):
+    return f"{name}: the upload is larger than {filesizeformat(limit)}"
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """Refuse attachments by content and size while they are uploaded.
+
+    Put it first in request.upload_handlers: a refused file is never passed
+    on to the handlers that buffer or spool it. The upload is then stopped
+    without reading the rest of the body, and the reason is left in
+    request.upload_errors for the view to show.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_file_size = max_file_size()
+        self.max_request_size = max_request_size()
+        self.received = 0
+        if request is not None:
+            request.upload_errors = []
+
+    def refuse(self, error):
+        if self.request is not None:
+            self.request.upload_errors.append(error)
+        raise StopUpload(connection_reset=True)
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        self.request_length = content_length
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.request_length > self.max_request_size:
+            # known from the headers, before any file data is read
+            self.refuse(size_error("the request", self.max_request_size))
+        self.file_size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file_size += len(raw_data)
+        self.received += len(raw_data)
+        if self.file_size > self.max_file_size:
+            self.refuse(size_error(self.file_name, self.max_file_size))
+        if self.received > self.max_request_size:
+            self.refuse(size_error("the request", self.max_request_size))
+        if start == 0:
+            error = type_error(self.file_name, raw_data)
+            if error:
+                self.refuse(error)
+            extension = os.path.splitext(self.file_name)[1].lower().lstrip(".")
+            self.is_text = EXTENSION_TYPES[extension] == "text"
+        elif self.is_text and b"\x00" in raw_data:
+            # a log that turns into binary further down
+            self.refuse(f"{self.file_name}: the content is not a log file")
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
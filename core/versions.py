@@ -0,0 +1,86 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Version stamps kept in the cache. Cached data is stored under a key that
+# includes the stamps it depends on, so bumping a stamp invalidates it.
+# A missing stamp starts from the clock, so an evicted stamp never comes
+# back with a value an old entry was stored under.
+
+
+def _key(name):
+    return f"version:{name}"
+
+
+def get_versions(names):
+    keys = [_key(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for name, key in zip(names, keys):
+        version = found.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def get_version(name):
+    return get_versions([name])[0]
+
+
+def _bump(names):
+    for name in names:
+        try:
+            cache.incr(_key(name))
+        except ValueError:
+            cache.set(_key(name), time.time_ns(), None)
+
+
+def bump_versions(names):
+    names = list(names)
+    _bump(names)
+    # bump again once the change is visible to other connections, in case
+    # one of them cached data read before the commit under the new stamp
+    transaction.on_commit(lambda: _bump(names))
+
+
+def bug_version_names(bug, old_values=None):
+    """Stamps touched by a change to `bug`, before and after the change."""
+    names = {"bugs:all"}
+    if bug.pk is not None:
+        names.add(bug_detail_version_name(bug.pk))
+    if old_values is None:
+        old_values = getattr(bug, "_loaded_values", {})
+    for field in ("project_id", "assigned_to_id", "submitted_by_id"):
+        for value in (getattr(bug, field), old_values.get(field)):
+            if value is None:
+                continue
+            scope = "project" if field == "project_id" else "user"
+            names.add(f"bugs:{scope}{value}")
+    return names
+
+
+def bug_detail_version_name(bug_id):
+    """Stamp of everything the detail page of a bug shows."""
+    return f"bug:{bug_id}"
+
+
+def member_version_names(user):
+    names = {"members:all"}
+    loaded = getattr(user, "_loaded_values", {})
+    for value in (user.assigned_to_id, loaded.get("assigned_to_id")):
+        if value is not None:
+            names.add(f"members:project{value}")
+    return names
+
+
+def scope_version_names(user):
+    """Stamps covering everything for_user() shows `user` about bugs and members."""
+    if user.is_superuser:
+        return ["bugs:all", "members:all"]
+    members = f"members:project{user.assigned_to_id}"
+    if user.role == "O":
+        return [f"bugs:project{user.assigned_to_id}", members]
+    return [f"bugs:user{user.pk}", members]
@@ -1,5 +1,9 @@
+import hashlib
 import json
+import os
+from urllib.parse import urlencode
 
+from django.conf import settings
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -14,20 +18,62 @@ from django.views.generic import DetailView
 from .models import Bug
 
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count
-from django.shortcuts import redirect, render
-from django.urls import reverse_lazy
+from django.core.files.storage import default_storage
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.formats import date_format
+from django.views import View
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition
 from django.views.generic import FormView, TemplateView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView, FormMixin
 from django.views.generic.list import ListView
-from django.db.models import Prefetch
 from core.forms import (
     AddBugForm,
     TeamMemberForm,
     UpdateBugForm,
     ProjectOwnerRegistrationForm,
 )
-from core.models import SEVERITY_CHOICES, SEVERITY_MAP, Bug, User, BugMedia
+from core.dashboard import get_dashboard_stats
+from core.rollups import trend
+from core.pagination import CursorPaginationMixin, CursorPaginator
+from core.export import FORMATS, export_stream
+from core.fragments import bug_rows
+from core.filters import (
+    facet_counts,
+    facet_options,
+    filter_bugs,
+    filter_params,
+    is_searching,
+)
+from core.reports import request_report
+from core.stats import project_counts
+from core import logs, serving, thumbnails
+from core.uploads import AttachmentUploadHandler
+from core.versions import (
+    bug_detail_version_name,
+    get_versions,
+    scope_version_names,
+)
+from core.models import (
+    PRIORITY_CHOICES,
+    SEVERITY_CHOICES,
+    SEVERITY_MAP,
+    Bug,
+    BugReport,
+    User,
+    BugMedia,
+)
 
 
 def isAdmin(user):
@@ -89,10 +135,18 @@ class GenericDashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context["priority_chart"] = get_priority_chart(self.request.user)
-        context["severity_chart"] = get_severity_chart(self.request.user)
-        context["bug_count"] = Bug.objects.for_user(self.request.user).count()
-        context["tm_count"] = User.objects.for_user(self.request.user).count()
+        stats = get_dashboard_stats(self.request.user)
+        context["priority_chart"] = get_priority_chart(stats)
+        context["severity_chart"] = get_severity_chart(stats)
+        context["bug_count"] = stats["bug_count"]
+        context["tm_count"] = stats["tm_count"]
+
+        user = self.request.user
+        if user.is_superuser or user.role == "O":
+            # read from the daily rollups, which are only kept per project
+            data = trend(None if user.is_superuser else user.assigned_to_id)
+            context["trend_chart"] = get_trend_chart(data)
+            context["backlog_chart"] = get_backlog_chart(data)
 
         return context
 
@@ -114,16 +168,22 @@ class ProjectOwnerRegistrationView(CreateView):
     success_url = "/login"
 
 
-class TeamMembersListView(LoginRequiredMixin, ListView):
+class TeamMembersListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     queryset = User.objects.filter(role="TM")
     context_object_name = "members"
     model = User
     template_name = "team_members.html"
     paginate_by = 10
+    cursor_ordering = ("-date_joined", "-id")
 
     def get_queryset(self):
         search_item = self.request.GET.get("search")
-        team_members = User.objects.for_user(self.request.user)
+        # only what team_members.html renders, and the pagination key
+        team_members = (
+            User.objects.for_user(self.request.user)
+            .select_related("assigned_to")
+            .only("id", "date_joined", "full_name", "role", "assigned_to__name")
+        )
         if search_item:
             team_members = team_members.filter(full_name__icontains=search_item)
 
@@ -166,11 +226,25 @@ class DeleteTeamMemberView(OnlyProjectOwnerAccessibleMixin, DeleteView):
     success_url = "/dashboard/members"
 
 
+# the CSRF check reads request.POST, which must wait until the upload
+# handler is installed: it is done by csrf_protect inside dispatch instead
+@method_decorator(csrf_exempt, name="dispatch")
 class AddBugView(LoginRequiredMixin, CreateView):
     form_class = AddBugForm
     template_name = "report_bug.html"
     success_url = "/dashboard/bugs/"
 
+    def dispatch(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, AttachmentUploadHandler(request))
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # attachments refused while the body was read never reach the form
+        for error in getattr(self.request, "upload_errors", []):
+            form.add_error(None, error)
+        return form
+
     def get_initial(self):
         return {"submitted_by": self.request.user, "assigned_to": None}
 
@@ -180,23 +254,142 @@ class AddBugView(LoginRequiredMixin, CreateView):
         return kwargs
 
 
-class BugsListView(LoginRequiredMixin, ListView):
+def page_etag(request, names):
+    """ETag of a page that only changes when one of the stamps `names` does.
+
+    It also depends on who is looking, on the query string and on the CSRF
+    cookie the page's forms were rendered for.
+    """
+    # the secret the CSRF cookie is set to, creating it now if the request
+    # has none, so the response that sets it gets the same ETag as the next
+    get_token(request)
+    key = [
+        request.get_full_path(),
+        request.user.pk,
+        request.META["CSRF_COOKIE"],
+        get_versions(names),
+    ]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+
+def bug_list_etag(request, *args, **kwargs):
+    return page_etag(request, scope_version_names(request.user))
+
+
+def bug_detail_etag(request, pk, *args, **kwargs):
+    if not str(pk).isdigit():
+        return None
+    return page_etag(request, [bug_detail_version_name(pk)])
+
+
+# browsers must revalidate, and shared caches must not keep per-user pages
+revalidate = cache_control(private=True, no_cache=True)
+
+
+class BugsListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     context_object_name = "bugs"
     model = Bug
     template_name = "bugs.html"
     paginate_by = 10
 
+    @method_decorator([revalidate, condition(etag_func=bug_list_etag)])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def use_cursor(self):
+        # search results are ordered by relevance, not by a key
+        return not is_searching(self.request.GET)
+
     def get_queryset(self):
-        search_item = self.request.GET.get("search")
+        # the rows come from the row cache; the page only needs the key to
+        # look them up and the ordering key for the cursors
+        bugs = Bug.objects.for_user(self.request.user).only(
+            "id", "row_version", "added_date"
+        )
+        return filter_bugs(bugs, self.request.GET)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        params = self.request.GET
+        counts = None
+        if user.is_superuser or user.role == "O":
+            # unfiltered lists are counted from the counters, not the bug table
+            counts = project_counts(None if user.is_superuser else user.assigned_to_id)
+        facets, total = facet_counts(Bug.objects.for_user(user), params, counts)
+        context["facets"] = facet_options(facets, params)
+        context["approximate_count"] = total
+        context["filter_query"] = urlencode(filter_params(params), doseq=True)
+        context["bug_rows"] = bug_rows(context["bugs"])
+        return context
 
-        bug_media = Prefetch("bugmedia_set", queryset=BugMedia.objects.all())
 
-        bugs = Bug.objects.for_user(self.request.user).prefetch_related(bug_media)
+class ExportBugsView(LoginRequiredMixin, View):
+    """Stream every bug on the (filtered) list as CSV or JSON lines."""
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get("format", "csv")
+        if fmt not in FORMATS:
+            return HttpResponseBadRequest(
+                "format must be one of: " + ", ".join(FORMATS)
+            )
+        compress = request.GET.get("gzip") == "1"
+
+        bugs = filter_bugs(Bug.objects.for_user(request.user), request.GET)
+        filename = f"bugs-{timezone.localdate():%Y-%m-%d}.{fmt}"
+        if compress:
+            filename += ".gz"
+        response = StreamingHttpResponse(
+            export_stream(bugs, fmt, compress),
+            content_type="application/gzip" if compress else FORMATS[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
-        if search_item:
-            bugs = bugs.filter(title__icontains=search_item)
 
-        return bugs
+def report_status(report):
+    status = {
+        "id": report.pk,
+        "status": report.status,
+        "rows": report.rows,
+        "pages": report.pages,
+        "status_url": reverse("report_status", args=[report.pk]),
+        "error": report.last_error,
+    }
+    if report.status == "DONE":
+        status["download_url"] = reverse("report_download", args=[report.pk])
+    return status
+
+
+class RequestReportView(LoginRequiredMixin, View):
+    """Queue a PDF report of the (filtered) bug list; poll its status_url."""
+
+    def post(self, request, *args, **kwargs):
+        report = request_report(request.user, request.POST)
+        return JsonResponse(
+            report_status(report), status=200 if report.status == "DONE" else 202
+        )
+
+
+class ReportStatusView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        report = get_object_or_404(BugReport, pk=pk, requested_by=request.user)
+        return JsonResponse(report_status(report))
+
+
+class ReportDownloadView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        report = get_object_or_404(BugReport, pk=pk, requested_by=request.user)
+        if report.status != "DONE":
+            raise Http404("the report is not ready")
+        return serving.serve_file(
+            request,
+            report.file.storage,
+            report.file.name,
+            "application/pdf",
+            filename=f"bugs-{report.created_at:%Y-%m-%d}.pdf",
+            as_attachment=True,
+        )
 
 
 class UpdateBug(LoginRequiredMixin, UpdateView):
@@ -227,62 +420,194 @@ from .models import Bug, BugMedia, Comments
 from .forms import CommentForm
 
 
+COMMENTS_PER_PAGE = 20
+
+
+def comments_page(bug_id, cursor=None):
+    """A page of a bug's comments, newest first, with their authors."""
+    comments = (
+        Comments.objects.filter(bug_id=bug_id)
+        .select_related("by")
+        .only("id", "text", "date_added", "by__username")
+    )
+    return CursorPaginator(comments, COMMENTS_PER_PAGE, ordering=("-id",)).page(
+        cursor
+    )
+
+
+def comments_url(bug_id, page):
+    if not page.has_next():
+        return None
+    url = reverse("bug_comments", args=[bug_id])
+    return url + "?" + urlencode({"cursor": page.next_cursor})
+
+
 class BugDetailView(FormMixin, DetailView):
-    model = Bug
     template_name = "bug_detail.html"
     form_class = CommentForm
     http_method_names = ["get", "post"]
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    @method_decorator([revalidate, condition(etag_func=bug_detail_etag)])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
-        # Get all media files associated with the bug
-        media_files = BugMedia.objects.filter(bug=self.object)
-        comments = Comments.objects.filter(bug=self.object)
+    def get_queryset(self):
+        bugs = Bug.objects.select_related("assigned_to", "submitted_by", "project")
+        if self.request.method == "GET":
+            bugs = bugs.prefetch_related("bugmedia_set")
+        return bugs
 
-        # Add media files and comments to the context
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # only the newest comments; the page fetches older ones on demand
+        comments = comments_page(self.object.pk)
+        media_files = list(self.object.bugmedia_set.all())
+        for media in media_files:
+            media.is_image = thumbnails.enabled() and thumbnails.is_image(media)
+            media.is_log = is_log(media)
+            if media.is_image and media.width:
+                # so the gallery does not reflow as thumbnails load
+                media.thumb_size = thumbnails.fit(media.width, media.height, "thumb")
         context["media_files"] = media_files
         context["comments"] = comments
-        context["form"] = self.get_form()
-
+        context["more_comments_url"] = comments_url(self.object.pk, comments)
         return context
 
     def post(self, request, *args, **kwargs):
-        form = CommentForm(request.POST)
-
+        self.object = self.get_object()
+        form = self.get_form()
         if form.is_valid():
-            # Save the comment
             comment = form.save(commit=False)
             comment.by = request.user
-            comment.bug = self.get_object()
+            comment.bug = self.object
             comment.save()
+            return redirect(self.get_success_url())
+        return self.form_invalid(form)
+
+    def get_success_url(self):
+        return self.request.path
+
+
+class BugCommentsView(LoginRequiredMixin, View):
+    """Older comments of a bug as JSON, for the detail page's "load more"."""
+
+    def get(self, request, pk, *args, **kwargs):
+        bug = get_object_or_404(Bug.objects.for_user(request.user), pk=pk)
+        page = comments_page(bug.pk, request.GET.get("cursor"))
+        return JsonResponse(
+            {
+                "comments": [
+                    {
+                        "id": comment.pk,
+                        "by": str(comment.by),
+                        "text": comment.text,
+                        "date_added": date_format(
+                            timezone.localtime(comment.date_added), "DATETIME_FORMAT"
+                        ),
+                    }
+                    for comment in page
+                ],
+                "next_url": comments_url(bug.pk, page),
+            }
+        )
+
+
+LOG_LINES = 500
+
+
+def is_log(media):
+    return media.file.name.endswith((".log", ".log.gz"))
+
 
-            # Redirect to the bug detail page
-            return redirect(f"/dashboard/bugs/{self.get_object().pk}")
+def log_view_limit():
+    return getattr(settings, "LOG_VIEW_MAX_LINES", 5000)
+
+
+class MediaLogView(LoginRequiredMixin, View):
+    """Lines of a log attachment as plain text, without reading all of it.
+
+    ?start=N&lines=M gives M lines from line N. ?grep=text gives the lines
+    from `start` that contain the text, prefixed with their numbers as by
+    grep -n; after the last match of a full page, continue from its number.
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        media = get_object_or_404(
+            BugMedia.objects.filter(bug__in=Bug.objects.for_user(request.user)),
+            pk=pk,
+        )
+        if not is_log(media):
+            raise Http404("the attachment is not a log")
+        try:
+            start = max(int(request.GET.get("start", 1)), 1)
+            count = int(request.GET.get("lines", LOG_LINES))
+        except ValueError:
+            return HttpResponseBadRequest("start and lines must be numbers")
+        count = min(max(count, 1), log_view_limit())
+        pattern = request.GET.get("grep", "")
+
+        storage, name = media.file.storage, media.file.name
+        if pattern:
+            matches = logs.grep(storage, name, pattern.encode(), start, count)
+            content = (b"%d:%s" % (number, line) for number, line in matches)
         else:
-            # If the form is not valid, render the bug detail page with the form and errors
-            return self.render_to_response(self.get_context_data(comment_form=form))
+            lines = logs.line_range(storage, name, start, count)
+            content = (line for _, line in lines)
+        return StreamingHttpResponse(
+            content, content_type="text/plain; charset=utf-8"
+        )
 
-    # def form_valid(self, form):
-    #     # Add the current user as the commenter and the current bug as the bug being commented on
-    #     comment = form.save(commit=False)
-    #     comment.by = self.request.user
-    #     comment.bug = self.object
-    #     comment.save()
 
-    #     return super().form_valid(form)
+class MediaFileView(LoginRequiredMixin, View):
+    """An attachment, to users who can see its bug."""
 
-    def get_success_url(self):
-        return self.request.path
+    @method_decorator(cache_control(private=True, max_age=60 * 60 * 24 * 30))
+    def get(self, request, pk, *args, **kwargs):
+        media = get_object_or_404(
+            BugMedia.objects.filter(bug__in=Bug.objects.for_user(request.user)),
+            pk=pk,
+        )
+        name = media.name or os.path.basename(media.file.name)
+        content_type = None
+        if logs.is_compressed(media.file.name):
+            # sent as stored, so the download keeps its compression
+            name, content_type = name + ".gz", "application/gzip"
+        return serving.serve_file(
+            request,
+            media.file.storage,
+            media.file.name,
+            content_type,
+            filename=name,
+            as_attachment=not thumbnails.is_image(media),
+        )
+
+
+class MediaDerivativeView(LoginRequiredMixin, View):
+    """The thumbnail or preview of an image attachment, made if it is missing."""
+
+    @method_decorator(cache_control(private=True, max_age=60 * 60 * 24 * 30))
+    def get(self, request, pk, kind, *args, **kwargs):
+        if kind not in thumbnails.DERIVATIVES or not thumbnails.enabled():
+            raise Http404("no such derivative")
+        media = get_object_or_404(
+            BugMedia.objects.filter(bug__in=Bug.objects.for_user(request.user)),
+            pk=pk,
+        )
+        if not thumbnails.is_image(media):
+            raise Http404("the attachment is not an image")
+        name = thumbnails.ensure_derivative(media, kind)
+        if name is None:
+            raise Http404("the image cannot be decoded")
+        # named by the digest of the source, so it never changes
+        return serving.serve_file(request, default_storage, name, "image/jpeg")
 
 
 # viesew for displaying charts in the dashboard
 
 
-def get_priority_chart(user):
-    chart1_data = Bug.objects.values("priority").annotate(count=Count("id"))
-    labels = [str(d["priority"]) for d in chart1_data]
-    counts = [d["count"] for d in chart1_data]
+def get_priority_chart(stats):
+    labels = [choice[1] for choice in PRIORITY_CHOICES]
+    counts = [stats[f"priority_{choice[0]}"] for choice in PRIORITY_CHOICES]
     chart1_config = {
         "type": "bar",
         "data": {
@@ -303,7 +628,7 @@ def get_priority_chart(user):
     return json.dumps(chart1_config)
 
 
-def get_severity_chart(user):
+def get_severity_chart(stats):
     SEVERITY_COLORS = {
         "MINOR": "rgba(255, 193, 207, 0.2)",
         "NORMAL": "rgba(207, 232, 255, 0.2)",
@@ -320,12 +645,7 @@ def get_severity_chart(user):
         "BLOCKER": "rgba(236, 193, 255, 1)",
     }
 
-    counts = []
-    # get data for all severities and add them to counts
-    for sev in SEVERITY_CHOICES:
-        counts.append(
-            Bug.objects.filter(severity=sev[1], project=user.assigned_to).count()
-        )
+    counts = [stats[f"severity_{choice[0]}"] for choice in SEVERITY_CHOICES]
 
     labels = [choice[1] for choice in SEVERITY_CHOICES]
 
@@ -372,6 +692,61 @@ def get_severity_chart(user):
     return json.dumps(chart1_config)
 
 
+def get_trend_chart(data):
+    chart_config = {
+        "type": "line",
+        "data": {
+            "labels": data["labels"],
+            "datasets": [
+                {
+                    "label": "Opened",
+                    "data": data["opened"],
+                    "borderColor": "rgba(255, 99, 132, 1)",
+                    "fill": False,
+                },
+                {
+                    "label": "Fixed",
+                    "data": data["fixed"],
+                    "borderColor": "rgba(75, 192, 192, 1)",
+                    "fill": False,
+                },
+            ],
+        },
+        "options": {"scales": {"yAxes": [{"ticks": {"beginAtZero": True}}]}},
+    }
+
+    return json.dumps(chart_config)
+
+
+def get_backlog_chart(data):
+    SEVERITY_BORDER_COLORS = {
+        "MINOR": "rgba(255, 193, 207, 1)",
+        "NORMAL": "rgba(207, 232, 255, 1)",
+        "MAJOR": "rgba(255, 226, 193, 1)",
+        "CRITICAL": "rgba(193, 255, 221, 1)",
+        "BLOCKER": "rgba(236, 193, 255, 1)",
+    }
+
+    datasets = [
+        {
+            "label": severity,
+            "data": counts,
+            "borderColor": SEVERITY_BORDER_COLORS.get(
+                severity, "rgba(160, 160, 160, 1)"
+            ),
+            "fill": False,
+        }
+        for severity, counts in sorted(data["backlog"].items())
+    ]
+    chart_config = {
+        "type": "line",
+        "data": {"labels": data["labels"], "datasets": datasets},
+        "options": {"scales": {"yAxes": [{"ticks": {"beginAtZero": True}}]}},
+    }
+
+    return json.dumps(chart_config)
+
+
 # views for authentication and authorizations
 
 